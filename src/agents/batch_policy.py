@@ -0,0 +1,99 @@
+# batch_policy.py
+"""
+Batched agent programs: one policy evaluation per step for many environments.
+
+An agent program maps one percept to one action, so driving n environments
+costs n Python calls per step. An agent may additionally carry a
+batch_program(percepts, active=None) attribute that decides for n
+environments at once:
+  - percepts is an (n, 3) integer array with one row (x, y, status) per
+    environment, status being CLEAN or DIRTY;
+  - active is an optional boolean mask of the rows whose environment is still
+    running (the others may be ignored);
+  - the result is an array of n action codes, indices into ACTIONS.
+Row i always belongs to the same environment, so batch programs can keep
+per-row state (as the model-based agent does). Randomized batch programs draw
+from a NumPy generator seeded from `random` on first use, so batched runs are
+reproducible under random.seed but follow different random streams than the
+scalar programs. Status-coded PolicyTables (see berkeley_ai.agents) are
+batched by table_batch_program; batch_program_for adapts agents without a
+batch program by calling their scalar programs row by row.
+"""
+
+import random
+
+import numpy as np
+
+from src.berkeley_ai.agents import PolicyTable, status_code
+
+ACTIONS = ('NoOp', 'Suck', 'Left', 'Right', 'Up', 'Down')
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+CLEAN, DIRTY = 0, 1
+SUCK = ACTION_CODES['Suck']
+
+
+def encode_percepts(percepts):
+    """(n, 3) int64 array of (x, y, status) rows for a list of (location, status) percepts."""
+    rows = [(location[0], location[1], DIRTY if status == 'Dirty' else CLEAN) for location, status in percepts]
+    return np.array(rows, dtype=np.int64).reshape(len(rows), 3)
+
+
+def decode_actions(codes):
+    """Action names for an array of action codes."""
+    return [ACTIONS[code] for code in np.asarray(codes).tolist()]
+
+
+def table_batch_program(policy):
+    """
+    Batch program of a PolicyTable keyed by status_code: every row draws
+    uniformly from the actions its status maps to (a single action is a
+    one-element choice).
+    """
+    if policy.code is not status_code or not {'Clean', 'Dirty'} <= set(policy.table):
+        raise ValueError("Only PolicyTables with status_code and both statuses can be batched.")
+    options = []
+    for status in ('Clean', 'Dirty'):  # indexed by CLEAN, DIRTY
+        choice = policy.table[status]
+        options.append(np.array([ACTION_CODES[action] for action in (choice if isinstance(choice, tuple) else (choice,))]))
+    generator = []
+
+    def batch_program(percepts, active=None):
+        if not generator:
+            generator.append(np.random.default_rng(random.getrandbits(64)))
+        status = np.asarray(percepts)[:, 2]
+        codes = np.zeros(len(status), dtype=np.int64)
+        for code, choices in enumerate(options):
+            rows = status == code
+            codes[rows] = choices[generator[0].integers(len(choices), size=int(rows.sum()))]
+        return codes
+
+    return batch_program
+
+
+def suck_or_random_move(moves):
+    """Batch program of the reflex agents: Suck on dirty rows, otherwise a uniformly random choice among moves."""
+    return table_batch_program(PolicyTable({'Dirty': 'Suck', 'Clean': tuple(moves)}, status_code))
+
+
+def batch_program_for(agents):
+    """
+    A batch program deciding for len(agents) environments, row i being agents[i]'s:
+    the first agent's own batch_program if it has one (the agents are then bodies
+    only), otherwise a row-by-row adapter over the agents' scalar programs.
+    Scalar programs must return primitive actions (no MacroAction).
+    """
+    batch_program = getattr(agents[0], 'batch_program', None)
+    if callable(batch_program):
+        return batch_program
+
+    def adapter(percepts, active=None):
+        codes = np.zeros(len(agents), dtype=np.int64)
+        for i, (x, y, status) in enumerate(np.asarray(percepts).tolist()):
+            if active is None or active[i]:
+                action = agents[i].program(((x, y), 'Dirty' if status == DIRTY else 'Clean'))
+                if action not in ACTION_CODES:
+                    raise ValueError("{!r} has no batch action code.".format(action))
+                codes[i] = ACTION_CODES[action]
+        return codes
+
+    return adapter
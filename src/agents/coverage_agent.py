@@ -0,0 +1,204 @@
+# coverage_agent.py
+"""
+This module implements a full-knowledge coverage (tour) agent.
+Unlike the agents of Exercise 2.14, it is given the whole layout and dirt set
+when it is placed in a ModifiedVacuumEnvironment (through the environment's
+bind_environment hook), so it serves as a strong, cheap reference in agent
+comparisons rather than as a solution to the partially observable task.
+
+The agent visits the reachable dirty cells in the order of a nearest-neighbour
+tour improved by 2-opt. Path lengths and paths come from BFS rows computed
+only for the start and the dirty cells (their wavefronts grown together, see
+distance_oracle.bfs_rows), not from an all-pairs table of the whole layout.
+Routes are cached in memory keyed by (layout hash, start, dirt set), so
+repeated trials on a fixed layout reuse them instantly; given a cache_dir they
+are also saved to disk (opt-in, as nothing deletes those files).
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from src.berkeley_ai.agents import Agent
+from src.berkeley_ai.utils import Cache
+from src.environment.distance_oracle import DistanceOracle, bfs_rows, layout_of, layout_hash
+from src.agents.occupancy_grid import MOVES
+
+ROUTE_CACHE_SIZE = 4096
+STEPS = ('Right', 'Left', 'Down', 'Up')
+
+# In-process route cache: plan key -> tuple of movement actions.
+_ROUTES = Cache('coverage_agent.routes', maxsize=ROUTE_CACHE_SIZE)
+
+
+def tour_length(distances, order):
+    """Length of the open path start -> order[0] -> order[1] -> ... (start is row/column 0)."""
+    stops = [0] + list(order)
+    return int(sum(distances[a, b] for a, b in zip(stops, stops[1:])))
+
+
+def nearest_neighbour_tour(distances):
+    """Greedy open tour from node 0 over all other nodes."""
+    remaining = set(range(1, len(distances)))
+    order = []
+    current = 0
+    while remaining:
+        current = min(remaining, key=lambda node: (distances[current, node], node))
+        order.append(current)
+        remaining.remove(current)
+    return order
+
+
+def two_opt(distances, order):
+    """
+    Improve an open tour (fixed start at node 0, free end) by reversing segments
+    while that shortens it. For each segment start the gains of every segment end
+    are evaluated at once with NumPy.
+    """
+    path = np.array([0] + list(order))
+    m = len(path)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, m - 1):
+            # Reversing path[i:j+1] replaces edges (i-1, i) and (j, j+1) by (i-1, j) and (i, j+1).
+            a, b = path[i - 1], path[i]
+            ends = path[i + 1:]
+            after = np.append(path[i + 2:], -1)
+            removed = distances[a, b] + np.where(after >= 0, distances[ends, after], 0)
+            added = distances[a, ends] + np.where(after >= 0, distances[b, after], 0)
+            gain = removed - added
+            j = int(np.argmax(gain))
+            if gain[j] > 0:
+                j += i + 1
+                path[i:j + 1] = path[i:j + 1][::-1].copy()
+                improved = True
+    return [int(node) for node in path[1:]]
+
+
+def plan_key(layout_key, start, dirt):
+    digest = hashlib.sha1("{}|{}|{}".format(layout_key, start, sorted(dirt)).encode())
+    return digest.hexdigest()[:20]
+
+
+def passable_mask(width, height, walls):
+    """(height, width) boolean mask of the cells that are not walls."""
+    passable = np.ones((height, width), dtype=bool)
+    for x, y in walls:
+        passable[y, x] = False
+    return passable
+
+
+def dirt_rows(passable, start, dirt):
+    """
+    The start and the dirty cells reachable from it, with their BFS rows.
+    Returns (nodes, rows): nodes[0] is start, and rows[i] holds the distances
+    from nodes[i] to every cell index (y * width + x).
+    """
+    width = passable.shape[1]
+    candidates = [start] + [location for location in sorted(dirt) if location != start]
+    rows = bfs_rows(passable, np.array([y * width + x for x, y in candidates]))
+    unreachable = np.iinfo(rows.dtype).max
+    keep = [i for i, (x, y) in enumerate(candidates) if i == 0 or rows[0, y * width + x] != unreachable]
+    return [candidates[i] for i in keep], rows[keep]
+
+
+def plan_tour(nodes, rows, width):
+    """Visiting order (indices into nodes, start excluded) of a nearest-neighbour + 2-opt tour."""
+    index = np.array([y * width + x for x, y in nodes])
+    distances = rows[:, index].astype(np.int64)
+    return two_opt(distances, nearest_neighbour_tour(distances)) if len(nodes) > 1 else []
+
+
+def route_actions(rows, width, nodes, order):
+    """Movement actions that follow shortest paths from nodes[0] through the nodes of order."""
+    n = rows.shape[1]
+    x, y = nodes[0]
+    current = y * width + x
+    actions = []
+    for node in order:
+        row = rows[node]
+        # Descend the stop's distance row one step at a time.
+        while row[current] > 0:
+            column = current % width
+            steps = (1 if column < width - 1 else None, -1 if column > 0 else None,
+                     width if current + width < n else None, -width if current >= width else None)
+            for action, step in zip(STEPS, steps):
+                if step is not None and row[current + step] == row[current] - 1:
+                    current += step
+                    actions.append(action)
+                    break
+    return actions
+
+
+def plan_route(layout, start, dirt, cache_dir=None):
+    """
+    Movement actions of the cleaning tour over the dirt from start (an open
+    cell) in a layout (width, height, walls), from the in-process cache, the
+    disk cache (with a cache_dir) or a fresh computation.
+    """
+    width, height, walls = layout
+    key = plan_key(layout_hash(width, height, walls), start, dirt)
+    route = _ROUTES.get(key)
+    if route is not None:
+        return route
+    path = os.path.join(cache_dir, "routes", key + ".npy") if cache_dir else None
+    if path and os.path.exists(path):
+        route = tuple(str(action) for action in np.load(path))
+    else:
+        nodes, rows = dirt_rows(passable_mask(width, height, walls), start, dirt)
+        route = tuple(route_actions(rows, width, nodes, plan_tour(nodes, rows, width)))
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            DistanceOracle.save(path, np.array(route, dtype='<U5'))
+    _ROUTES[key] = route
+    return route
+
+
+def CoverageAgent(cache_dir=None):
+    """
+    A full-knowledge agent that follows a precomputed cleaning tour.
+    It sucks whenever its cell is dirty and otherwise takes the next move of its
+    route; once the route is exhausted (or if it was never given a map) it does NoOp.
+    """
+    model = {'route': [], 'next': 0}
+
+    def bind_environment(env):
+        """Plan the route for env's layout and dirt from the agent's current location."""
+        layout = layout_of(env)
+        passable = passable_mask(*layout)
+        start = tuple(agent.location)
+        prefix = []
+        if not passable[start[1], start[0]]:
+            # Placed on an obstacle: step out to the first open neighbour.
+            x, y = start
+            for action in STEPS:
+                dx, dy = MOVES[action]
+                neighbour = (x + dx, y + dy)
+                if env.is_valid_location(neighbour) and passable[neighbour[1], neighbour[0]]:
+                    prefix, start = [action], neighbour
+                    break
+            else:
+                model['route'], model['next'] = [], 0
+                return
+        model['route'] = prefix + list(plan_route(layout, start, env.dirt_locations, cache_dir))
+        model['next'] = 0
+
+    def program(percept):
+        location, status = percept
+        if status == 'Dirty':
+            return 'Suck'
+        if model['next'] < len(model['route']):
+            model['next'] += 1
+            return model['route'][model['next'] - 1]
+        return 'NoOp'
+
+    def state_key():
+        """Hashable summary of the agent's internal state (for cycle detection)."""
+        return (model['next'],)
+
+    agent = Agent(program)
+    agent.bind_environment = bind_environment
+    agent.state_key = state_key
+    return agent
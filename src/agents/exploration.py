@@ -0,0 +1,150 @@
+# exploration.py
+"""
+Exploration planners for the rational vacuum agent.
+
+A planner works on the agent's OccupancyGrid and proposes the action sequence
+that leads into unexplored space. The agent tells it about every changed cell
+(cell_changed), asks for the current plan (plan), reports which planned action
+it takes (advance) and drops the plan when something unexpected happens
+(invalidate). Available planners:
+  - BfsPlanner ('bfs'): a fresh BFS over the known map on every decision.
+  - FrontierExplorer ('incremental'): maintains the frontier set (free cells
+    bordering unknown cells) incrementally and caches the current plan,
+    replanning only when a percept invalidates it.
+"""
+
+from collections import deque
+
+from src.agents.occupancy_grid import FREE, OBSTACLE, UNKNOWN, DIRTY, MOVES
+
+# Search order of the agent's BFS, and the action for each displacement.
+ORDER = ('Right', 'Left', 'Down', 'Up')
+ACTIONS = {delta: action for action, delta in MOVES.items()}
+
+
+def step(location, action):
+    """Location reached from location by a successful move action."""
+    dx, dy = MOVES[action]
+    return (location[0] + dx, location[1] + dy)
+
+
+class BfsPlanner:
+    """Stateless planner: BFS from the current location on every decision."""
+
+    def __init__(self, grid):
+        self.grid = grid
+
+    def cell_changed(self, location):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def plan(self, location):
+        """Return the shortest action list into unexplored space, or None."""
+        return self.grid.bfs_to_unknown(location)
+
+    def advance(self, location, action):
+        pass
+
+
+class FrontierExplorer:
+    """
+    Incremental exploration engine.
+
+    The frontier set is updated locally whenever a cell changes (the cell and its
+    four neighbours are re-checked), so it never needs a full-map scan. The plan
+    toward a frontier cell is cached and followed one action per decision; it is
+    recomputed only when it becomes invalid:
+      - the agent is not where the last planned move should have taken it (bump);
+      - dirt was discovered (the agent cleaned and may now be off course);
+      - the target stopped being a frontier cell (or, for planners with
+        targets_dirt set, a cell known to be dirty), or the next planned move
+        runs into a known obstacle.
+    A BFS therefore runs once per plan rather than once per step, and not at all
+    when the frontier is empty (unless the planner also targets dirt), so the
+    cost per decision is amortised constant.
+    search() returns the plan together with its target cell.
+    """
+
+    targets_dirt = False  # whether search() may also lead to known-dirty cells
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.frontier = set()
+        self.actions = deque()
+        self.target = None     # cell the cached plan leads to (a frontier cell, or dirt)
+        self.expected = None   # where the last planned move should have taken the agent
+        self.replans = 0
+
+    def is_frontier(self, location):
+        x, y = location
+        state = self.grid.state
+        return state(location) == FREE and any(
+            state(cell) == UNKNOWN for cell in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)))
+
+    def cell_changed(self, location):
+        """Re-check frontier membership of location and its neighbours."""
+        x, y = location
+        for cell in (location, (x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            if self.is_frontier(cell):
+                self.frontier.add(cell)
+            else:
+                self.frontier.discard(cell)
+
+    def exit_action(self, location):
+        """First action (in search order) that steps from a frontier cell into unknown space."""
+        x, y = location
+        for action in ORDER:
+            dx, dy = MOVES[action]
+            if self.grid.state((x + dx, y + dy)) == UNKNOWN:
+                return action
+        return None
+
+    def invalidate(self):
+        """Drop the cached plan (e.g. after dirt is discovered)."""
+        self.actions.clear()
+        self.target = None
+        self.expected = None
+
+    def is_target(self, location):
+        """Whether location is still worth reaching: a frontier cell, or known dirt if the planner targets it."""
+        return location in self.frontier or (self.targets_dirt and self.grid.status(location) == DIRTY)
+
+    def is_valid(self, location):
+        return (bool(self.actions) and location == self.expected and self.is_target(self.target)
+                and self.grid.state(step(location, self.actions[0])) != OBSTACLE)
+
+    def search(self, location):
+        """
+        (action list from location into unexplored space, frontier cell it
+        passes last), or None (overridden by subclasses).
+        """
+        path = self.grid.bfs_to_unknown(location)
+        if path is None:
+            return None
+        target = location
+        for action in path[:-1]:
+            target = step(target, action)
+        return path, target
+
+    def plan(self, location):
+        """Return the remaining cached plan (replanning if it is no longer valid), or None.
+        The returned deque is the cache itself; consume it only through advance()."""
+        if not self.is_valid(location):
+            self.invalidate()
+            if not self.frontier and not self.targets_dirt:
+                return None
+            found = self.search(location)
+            if found is None:
+                return None
+            path, self.target = found
+            self.replans += 1
+            self.actions.extend(path)
+            self.expected = location
+        return self.actions
+
+    def advance(self, location, action):
+        """The agent takes the first planned action."""
+        self.actions.popleft()
+        self.expected = step(location, action)
@@ -0,0 +1,240 @@
+# hierarchical_planner.py
+"""
+Hierarchical exploration planning (in the style of HPA*) for large maps.
+
+A flat BFS toward the nearest unexplored cell visits most of the known map
+when that cell is far away. HierarchicalPlanner instead splits the known map
+into square clusters (cluster_size x cluster_size world cells) and keeps an
+abstract graph over them:
+  - Entrances: along every border between two clusters, each contiguous run of
+    free cell pairs contributes one transition (its middle pair), linking an
+    entrance cell on each side at cost 1.
+  - Intra-cluster edges: BFS distances between the entrances of a cluster, and
+    from each entrance to the nearest frontier cell inside the cluster.
+Only clusters touched by a percept since the last plan are recomputed, so
+exploration updates the graph incrementally. A plan is a Dijkstra search over
+entrances from the agent's cluster to the nearest cluster-local frontier cell,
+refined into primitive actions with BFS restricted to one cluster at a time;
+its cost depends on the number of clusters crossed, not on the map size.
+Paths are shortest on the abstract graph, which may make them slightly longer
+than a flat BFS would.
+"""
+
+import heapq
+import math
+from collections import deque
+
+from src.agents.occupancy_grid import FREE, MOVES
+from src.agents.exploration import FrontierExplorer, ORDER, ACTIONS
+
+
+class HierarchicalPlanner(FrontierExplorer):
+    """
+    FrontierExplorer whose replanning searches the abstract cluster graph
+    instead of running a BFS over the whole known map.
+    """
+
+    def __init__(self, grid, cluster_size=16):
+        super().__init__(grid)
+        self.size = cluster_size
+        self.dirty = set()     # clusters changed since the graph was last refreshed
+        self.borders = {}      # (cluster, 'v' | 'h') -> [(cell, cell)] transitions to the right / below
+        self.links = {}        # entrance cell -> set of entrance cells across a border
+        self.edges = {}        # cluster -> {entrance: {entrance: distance}}
+        self.goals = {}        # cluster -> {entrance: distance to the nearest frontier cell}
+
+    def cluster_of(self, location):
+        return (location[0] // self.size, location[1] // self.size)
+
+    def cell_changed(self, location):
+        super().cell_changed(location)
+        # The frontier status of the neighbours may change too, possibly in another cluster.
+        x, y = location
+        for cell in (location, (x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            self.dirty.add(self.cluster_of(cell))
+
+    # --------------------------------------------------
+    # Cluster-local search
+    # --------------------------------------------------
+
+    def local_bfs(self, start, cluster):
+        """BFS over the FREE cells of cluster from start. Returns (parent, distance) dicts."""
+        state = self.grid.state
+        size = self.size
+        x0, y0 = cluster[0] * size, cluster[1] * size
+        parent = {start: None}
+        distance = {start: 0}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            x, y = cell
+            for action in ORDER:
+                dx, dy = MOVES[action]
+                adjacent = (x + dx, y + dy)
+                if (adjacent not in parent and x0 <= adjacent[0] < x0 + size and
+                        y0 <= adjacent[1] < y0 + size and state(adjacent) == FREE):
+                    parent[adjacent] = cell
+                    distance[adjacent] = distance[cell] + 1
+                    queue.append(adjacent)
+        return parent, distance
+
+    def nearest_frontier(self, distance):
+        """(distance, cell) of the closest frontier cell among the reached cells, or None."""
+        frontier = self.frontier
+        reached = [(d, cell) for cell, d in distance.items() if cell in frontier]
+        return min(reached) if reached else None
+
+    @staticmethod
+    def path_to(parent, end):
+        """Action list from the BFS root to end."""
+        actions = []
+        while parent[end] is not None:
+            previous = parent[end]
+            actions.append(ACTIONS[(end[0] - previous[0], end[1] - previous[1])])
+            end = previous
+        actions.reverse()
+        return actions
+
+    # --------------------------------------------------
+    # Abstract graph maintenance
+    # --------------------------------------------------
+
+    def border_cells(self, key):
+        """Pairs of facing cells along a border, in order."""
+        (cx, cy), orientation = key
+        size = self.size
+        for i in range(size):
+            if orientation == 'v':
+                a = (cx * size + size - 1, cy * size + i)
+                yield a, (a[0] + 1, a[1])
+            else:
+                a = (cx * size + i, cy * size + size - 1)
+                yield a, (a[0], a[1] + 1)
+
+    def transitions(self, key):
+        """One transition (the middle pair) per contiguous run of free pairs on a border."""
+        state = self.grid.state
+        result = []
+        run = []
+        for a, b in self.border_cells(key):
+            if state(a) == FREE and state(b) == FREE:
+                run.append((a, b))
+            elif run:
+                result.append(run[len(run) // 2])
+                run = []
+        if run:
+            result.append(run[len(run) // 2])
+        return result
+
+    def cluster_borders(self, cluster):
+        """(border key, cluster on the other side) for the four borders of cluster."""
+        cx, cy = cluster
+        return [(((cx, cy), 'v'), (cx + 1, cy)), (((cx, cy), 'h'), (cx, cy + 1)),
+                (((cx - 1, cy), 'v'), (cx - 1, cy)), (((cx, cy - 1), 'h'), (cx, cy - 1))]
+
+    def entrances(self, cluster):
+        """Entrance cells of cluster, in a deterministic order."""
+        cells = []
+        for key, _ in self.cluster_borders(cluster):
+            for a, b in self.borders.get(key, ()):
+                cells.append(a if self.cluster_of(a) == cluster else b)
+        return list(dict.fromkeys(cells))
+
+    def refresh(self):
+        """Recompute the borders of changed clusters and the edges of every affected cluster."""
+        stale = set()
+        for cluster in self.dirty:
+            stale.add(cluster)
+            for key, other in self.cluster_borders(cluster):
+                new = self.transitions(key)
+                old = self.borders.get(key, [])
+                if new == old:
+                    continue
+                for a, b in old:
+                    self.links[a].discard(b)
+                    self.links[b].discard(a)
+                for a, b in new:
+                    self.links.setdefault(a, set()).add(b)
+                    self.links.setdefault(b, set()).add(a)
+                self.borders[key] = new
+                stale.add(other)
+        self.dirty.clear()
+        for cluster in stale:
+            edges = {}
+            goals = {}
+            entrances = self.entrances(cluster)
+            for entrance in entrances:
+                _, distance = self.local_bfs(entrance, cluster)
+                edges[entrance] = {other: distance[other] for other in entrances
+                                   if other != entrance and other in distance}
+                nearest = self.nearest_frontier(distance)
+                if nearest is not None:
+                    goals[entrance] = nearest[0]
+            self.edges[cluster] = edges
+            self.goals[cluster] = goals
+
+    # --------------------------------------------------
+    # Planning
+    # --------------------------------------------------
+
+    def search(self, location):
+        """
+        Dijkstra over the abstract graph from location to the nearest frontier cell,
+        refined into an action list that ends by stepping into unknown space.
+        Returns (actions, frontier cell), or None if no frontier cell is reachable.
+        """
+        self.refresh()
+        start = self.cluster_of(location)
+        start_parent, start_distance = self.local_bfs(location, start)
+        cost = {location: 0}
+        previous = {location: None}
+        heap = [(0, 0, location)]   # (cost, 1 for a goal entry, cell)
+        while heap:
+            g, is_goal, cell = heapq.heappop(heap)
+            if is_goal:
+                return self.refine(cell, previous, location, start_parent, start_distance)
+            if g > cost[cell]:
+                continue
+            if cell == location:
+                edges = {entrance: start_distance[entrance] for entrance in self.entrances(start)
+                         if entrance in start_distance and entrance != location}
+                nearest = self.nearest_frontier(start_distance)
+                goal = nearest[0] if nearest is not None else None
+            else:
+                cluster = self.cluster_of(cell)
+                edges = self.edges[cluster].get(cell, {})
+                goal = self.goals[cluster].get(cell)
+            if goal is not None:
+                heapq.heappush(heap, (g + goal + 1, 1, cell))
+            for other, d in list(edges.items()) + [(other, 1) for other in self.links.get(cell, ())]:
+                if g + d < cost.get(other, math.inf):
+                    cost[other] = g + d
+                    previous[other] = cell
+                    heapq.heappush(heap, (g + d, 0, other))
+        return None
+
+    def refine(self, end, previous, location, start_parent, start_distance):
+        """Turn the abstract path ending at entrance end into (primitive actions, frontier cell)."""
+        chain = []
+        while end is not None:
+            chain.append(end)
+            end = previous[end]
+        chain.reverse()
+        actions = []
+        for a, b in zip(chain, chain[1:]):
+            if self.cluster_of(a) != self.cluster_of(b):
+                actions.append(ACTIONS[(b[0] - a[0], b[1] - a[1])])
+            elif a == location:
+                actions.extend(self.path_to(start_parent, b))
+            else:
+                parent, _ = self.local_bfs(a, self.cluster_of(a))
+                actions.extend(self.path_to(parent, b))
+        last = chain[-1]
+        if last == location:
+            parent, distance = start_parent, start_distance
+        else:
+            parent, distance = self.local_bfs(last, self.cluster_of(last))
+        _, frontier = self.nearest_frontier(distance)
+        actions.extend(self.path_to(parent, frontier))
+        actions.append(self.exit_action(frontier))
+        return actions, frontier
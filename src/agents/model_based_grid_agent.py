@@ -6,10 +6,14 @@ This agent maintains a very simple internal model (a dictionary of cell statuses
 and uses it to decide actions. When the current cell is dirty, it cleans; otherwise,
 it selects a movement action from the four possible directions.
 While simple, this adaptation supports four-direction movement and can be extended further.
+Its batch_program (see batch_policy.py) keeps one model per environment as a
+(environments, height, width) array of statuses (-1 while unknown).
 """
 
 import random
+import numpy as np
 from src.berkeley_ai.agents import Agent
+from src.agents.batch_policy import suck_or_random_move
 
 def ModelBasedGridAgent():
     model = {}  # Internal model: maps location to status (e.g., 'Dirty' or 'Clean')
@@ -22,4 +26,26 @@ def ModelBasedGridAgent():
         # Here, a more sophisticated agent might use the model to plan a path.
         # For now, we randomly choose one of the four directions.
         return random.choice(['Left', 'Right', 'Up', 'Down'])
-    return Agent(program)
+
+    choose = suck_or_random_move(['Left', 'Right', 'Up', 'Down'])
+    batch_model = {'status': np.full((0, 0, 0), -1, dtype=np.int8)}
+
+    def batch_program(percepts, active=None):
+        percepts = np.asarray(percepts)
+        status = batch_model['status']
+        rows = np.arange(len(percepts)) if active is None else np.flatnonzero(active)
+        x, y = percepts[rows, 0], percepts[rows, 1]
+        # Grow the model to cover every perceived location.
+        shape = (len(percepts), max(status.shape[1], int(y.max(initial=-1)) + 1),
+                 max(status.shape[2], int(x.max(initial=-1)) + 1))
+        if shape != status.shape:
+            grown = np.full(shape, -1, dtype=np.int8)
+            grown[:status.shape[0], :status.shape[1], :status.shape[2]] = status[:shape[0]]
+            status = batch_model['status'] = grown
+        status[rows, y, x] = percepts[rows, 2]
+        return choose(percepts, active)
+
+    agent = Agent(program)
+    agent.batch_program = batch_program
+    agent.batch_model = batch_model
+    return agent
@@ -4,51 +4,62 @@ This module implements a BFS-based rational vacuum agent.
 This agent is designed for Exercise 2.14, where the environment is unknown 
 and the agent must use state (an internal model) and planning to perform effectively.
 It extends the base Agent class (from src.berkeley_ai.agents.py) without modifying the base code.
+The world model is a compact, growable occupancy grid (see occupancy_grid.py).
 """
 
 import random
-from collections import deque
 from src.berkeley_ai.agents import Agent
+from src.environment.environment import MacroAction
+from src.agents.occupancy_grid import OccupancyGrid, UNKNOWN, FREE, OBSTACLE, MOVES
+from src.agents.exploration import BfsPlanner, FrontierExplorer
+from src.agents.hierarchical_planner import HierarchicalPlanner
+from src.agents.wavefront_planner import WavefrontPlanner
 
-def RationalVacuumAgent():
+# Exploration planners selectable by name (see exploration.py).
+PLANNERS = {
+    'bfs': BfsPlanner,
+    'incremental': FrontierExplorer,
+    'hierarchical': HierarchicalPlanner,
+    'wavefront': WavefrontPlanner,
+}
+
+def RationalVacuumAgent(macro=False, planner='bfs'):
     """A rational agent for the partially observable vacuum environment.
     This agent uses a model-based approach with systematic exploration and BFS for planning.
+    If macro is True, a multi-step BFS path is handed to the environment as a single
+    MacroAction (stopping on a bump or dirt) instead of being replanned every step.
+    planner selects the exploration planner from PLANNERS: 'bfs' searches the known map
+    on every decision, 'incremental' keeps a frontier set and caches its plan, and
+    'hierarchical' additionally plans long trips on an abstract graph of map clusters,
+    and 'wavefront' replans with a vectorized NumPy distance field.
     """
+    if planner not in PLANNERS:
+        raise ValueError("planner must be one of {}.".format(sorted(PLANNERS)))
     # Initialize the model of the environment
     model = {
-        'locations': set(),   # Set of known locations
-        'dirt_status': {},    # Map of location to status
-        'known_map': {},      # Map of known locations and their status ('explorable', 'obstacle', 'unknown')
+        'grid': None,         # OccupancyGrid of cell states and dirt status, created on the first percept
+        'planner': None,      # Exploration planner over the grid
         'current_location': None,
         'last_action': None,
-        'backtrack_path': []  # Stack for backtracking (if needed)
+        'macro': None         # MacroAction returned last, settled on the next percept
     }
 
     def update_model(model, action, percept):
         """Update the agent's model based on action and percept."""
         location, status = percept
+        grid = model['grid']
 
-        if model['current_location'] is not None and action in ['Right', 'Left', 'Up', 'Down']:
+        if model['current_location'] is not None and action in MOVES:
             x, y = model['current_location']
-            expected_location = None
-            if action == 'Right':
-                expected_location = (x+1, y)
-            elif action == 'Left':
-                expected_location = (x-1, y)
-            elif action == 'Up':
-                expected_location = (x, y-1)
-            elif action == 'Down':
-                expected_location = (x, y+1)
-            if expected_location and expected_location != location:
-                model['known_map'][expected_location] = 'obstacle'
+            dx, dy = MOVES[action]
+            expected_location = (x + dx, y + dy)
+            if expected_location != location and grid.set_state(expected_location, OBSTACLE):
+                model['planner'].cell_changed(expected_location)
         model['current_location'] = location
-        model['locations'].add(location)
-        model['known_map'][location] = 'explorable'
-        model['dirt_status'][location] = status
-        x, y = location
-        for adjacent in [(x+1, y), (x-1, y), (x, y+1), (x, y-1)]:
-            if adjacent not in model['known_map']:
-                model['known_map'][adjacent] = 'unknown'
+        # Unvisited neighbours are UNKNOWN by default, so they need no explicit entry.
+        if grid.set_state(location, FREE):
+            model['planner'].cell_changed(location)
+        grid.set_status(location, status)
         model['last_action'] = action
         return model
 
@@ -57,57 +68,62 @@ def RationalVacuumAgent():
         x, y = model['current_location']
         for action, adjacent in [('Right', (x+1, y)), ('Left', (x-1, y)),
                                  ('Down', (x, y+1)), ('Up', (x, y-1))]:
-            if adjacent in model['known_map'] and model['known_map'][adjacent] == 'unknown':
+            if model['grid'].state(adjacent) == UNKNOWN:
                 return action, adjacent
         return None, None
 
-    def get_next_action_bfs(model):
-        """Use BFS to find the shortest path to an unexplored area."""
-        start = model['current_location']
-        queue = deque([(start, [])])  # (location, path)
-        visited = {start}
-        while queue:
-            current, path = queue.popleft()
-            x, y = current
-            for direction, adjacent in [('Right', (x+1, y)), ('Left', (x-1, y)),
-                                          ('Down', (x, y+1)), ('Up', (x, y-1))]:
-                if adjacent in model['known_map'] and model['known_map'][adjacent] == 'unknown':
-                    return path[0] if path else direction
-                if (adjacent not in visited and adjacent in model['known_map'] and 
-                    model['known_map'][adjacent] == 'explorable'):
-                    new_path = path + [get_direction(current, adjacent)]
-                    queue.append((adjacent, new_path))
-                    visited.add(adjacent)
-        return random.choice(['Right', 'Left', 'Up', 'Down'])
-
-    def get_direction(from_loc, to_loc):
-        """Determine the direction from from_loc to to_loc."""
-        fx, fy = from_loc
-        tx, ty = to_loc
-        if tx > fx:
-            return 'Right'
-        elif tx < fx:
-            return 'Left'
-        elif ty > fy:
-            return 'Down'
-        elif ty < fy:
-            return 'Up'
-        return 'NoOp'
+    def settle_macro(model, location):
+        """Prepare update_model for the outcome of the last MacroAction: if it stopped
+        on a bump, infer the obstacle from the bumping action; otherwise the agent
+        simply is where the percept says."""
+        macro = model['macro']
+        model['macro'] = None
+        if macro.bumped:
+            model['current_location'] = location
+            model['last_action'] = macro.actions[macro.executed - 1]
+        else:
+            model['last_action'] = None
 
     def program(percept):
         nonlocal model
         if model['current_location'] is None:
             model['current_location'] = percept[0]
+            model['grid'] = OccupancyGrid(center=percept[0])
+            model['planner'] = PLANNERS[planner](model['grid'])
+        if model['macro'] is not None:
+            settle_macro(model, percept[0])
         model = update_model(model, model['last_action'], percept)
         location, status = percept
         if status == 'Dirty':
+            model['planner'].invalidate()
             return 'Suck'
         action, _ = get_unexplored_adjacent(model)
         if action:
+            model['planner'].invalidate()
             model['last_action'] = action
             return action
-        action = get_next_action_bfs(model)
+        plan = model['planner'].plan(location)
+        if macro and plan and len(plan) > 1:
+            # Commit to the whole path; the environment stops it on a bump or dirt.
+            model['macro'] = MacroAction(plan)
+            model['planner'].invalidate()
+            return model['macro']
+        if plan:
+            action = plan[0]
+            model['planner'].advance(location, action)
+        else:
+            action = random.choice(['Right', 'Left', 'Up', 'Down'])
         model['last_action'] = action
         return action
 
-    return Agent(program)  # Use the base Agent class from src.berkeley_ai.agents.py
+    def state_key():
+        """Hashable summary of the agent's internal state (for cycle detection).
+        The grid version changes whenever any cell state or dirt status changes."""
+        pending = model['macro']
+        pending = None if pending is None else (pending.bumped, pending.actions[pending.executed - 1] if pending.bumped else None)
+        version = model['grid'].version if model['grid'] is not None else 0
+        return (version, model['current_location'], model['last_action'], pending)
+
+    agent = Agent(program)  # Use the base Agent class from src.berkeley_ai.agents.py
+    agent.state_key = state_key
+    return agent
@@ -0,0 +1,165 @@
+# occupancy_grid.py
+"""
+A compact, growable occupancy-grid world model for exploring agents.
+
+The agent does not know the extent of its world (Exercise 2.14), so the grid
+starts small around the first location and grows (doubling) whenever a cell
+outside it is touched; an origin offset maps world coordinates, which may be
+negative, to flat indices. Cell states and dirt status are stored as single
+bytes in two bytearrays instead of dicts keyed by coordinate tuples.
+
+The grid keeps a margin of at least one unknown cell around every free cell,
+so a free cell's four neighbours are always index +1, -1, +width and -width,
+with no bounds or row-wrap checks during search.
+"""
+
+from collections import deque
+
+# Cell states.
+UNKNOWN, FREE, OBSTACLE = 0, 1, 2
+# Dirt status of a cell.
+NO_INFO, CLEAN, DIRTY = 0, 1, 2
+
+STATUS_CODES = {'Clean': CLEAN, 'Dirty': DIRTY}
+
+# Displacement of each movement action.
+MOVES = {'Right': (1, 0), 'Left': (-1, 0), 'Up': (0, -1), 'Down': (0, 1)}
+
+
+class OccupancyGrid:
+    """
+    Cell states (UNKNOWN, FREE, OBSTACLE) and dirt status over a growable grid.
+    version is bumped on every change, so (version, ...) can serve as a cheap
+    hashable summary of the whole model.
+    """
+
+    def __init__(self, center=(0, 0), size=16):
+        cx, cy = center
+        self.width = self.height = size
+        self.x0 = cx - size // 2
+        self.y0 = cy - size // 2
+        self.cells = bytearray(size * size)
+        self.dirt = bytearray(size * size)
+        self.version = 0
+
+    # --------------------------------------------------
+    # Coordinates
+    # --------------------------------------------------
+
+    def contains(self, location):
+        x, y = location
+        return 0 <= x - self.x0 < self.width and 0 <= y - self.y0 < self.height
+
+    def index(self, location):
+        """Flat index of an in-grid location."""
+        x, y = location
+        return (y - self.y0) * self.width + (x - self.x0)
+
+    def location(self, index):
+        """World location of a flat index."""
+        y, x = divmod(index, self.width)
+        return (x + self.x0, y + self.y0)
+
+    def ensure(self, location, margin=1):
+        """Grow the grid (doubling) until location and its margin lie inside it."""
+        x, y = location
+        if (self.x0 + margin <= x < self.x0 + self.width - margin and
+                self.y0 + margin <= y < self.y0 + self.height - margin):
+            return
+        x0, width = self._grow(self.x0, self.width, x, margin)
+        y0, height = self._grow(self.y0, self.height, y, margin)
+        cells = bytearray(width * height)
+        dirt = bytearray(width * height)
+        for row in range(self.height):
+            old = row * self.width
+            new = (row + self.y0 - y0) * width + (self.x0 - x0)
+            cells[new:new + self.width] = self.cells[old:old + self.width]
+            dirt[new:new + self.width] = self.dirt[old:old + self.width]
+        self.cells, self.dirt = cells, dirt
+        self.width, self.height, self.x0, self.y0 = width, height, x0, y0
+
+    @staticmethod
+    def _grow(origin, size, value, margin):
+        """New (origin, size) along one axis so that value +/- margin fits.
+        The size at least doubles when growing, with the extra room split
+        between both sides, so repeated growth is amortised."""
+        low = min(origin, value - margin)
+        high = max(origin + size, value + margin + 1)
+        if low == origin and high == origin + size:
+            return origin, size
+        new_size = max(2 * size, high - low)
+        return low - (new_size - (high - low)) // 2, new_size
+
+    # --------------------------------------------------
+    # State access
+    # --------------------------------------------------
+
+    def state(self, location):
+        """Cell state of location (UNKNOWN outside the grid)."""
+        return self.cells[self.index(location)] if self.contains(location) else UNKNOWN
+
+    def set_state(self, location, state):
+        """Set the cell state of location, growing the grid as needed.
+        Returns True if the state changed."""
+        self.ensure(location, margin=1 if state == FREE else 0)
+        i = self.index(location)
+        if self.cells[i] == state:
+            return False
+        self.cells[i] = state
+        self.version += 1
+        return True
+
+    def set_status(self, location, status):
+        """Record the perceived 'Clean'/'Dirty' status of location."""
+        self.ensure(location, margin=0)
+        i = self.index(location)
+        code = STATUS_CODES[status]
+        if self.dirt[i] != code:
+            self.dirt[i] = code
+            self.version += 1
+
+    def status(self, location):
+        return self.dirt[self.index(location)] if self.contains(location) else NO_INFO
+
+    # --------------------------------------------------
+    # Search
+    # --------------------------------------------------
+
+    def neighbours(self):
+        """(direction, index offset) pairs in the agent's search order."""
+        return (('Right', 1), ('Left', -1), ('Down', self.width), ('Up', -self.width))
+
+    def path_actions(self, parent, end, start):
+        """Rebuild the action list from start to end by following parent pointers."""
+        names = {1: 'Right', -1: 'Left', self.width: 'Down', -self.width: 'Up'}
+        actions = []
+        while end != start:
+            previous = parent[end]
+            actions.append(names[end - previous])
+            end = previous
+        actions.reverse()
+        return actions
+
+    def bfs_to_unknown(self, start):
+        """
+        Breadth-first search over FREE cells from start for the nearest UNKNOWN cell.
+        Returns the action list that ends by stepping into it, or None.
+        The queue holds flat indices and a parent-pointer dict replaces per-node
+        path copies, so the search is linear in the number of cells visited.
+        """
+        cells = self.cells
+        neighbours = self.neighbours()
+        source = self.index(start)
+        parent = {source: source}
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            for direction, offset in neighbours:
+                adjacent = current + offset
+                state = cells[adjacent]
+                if state == UNKNOWN:
+                    return self.path_actions(parent, current, source) + [direction]
+                if state == FREE and adjacent not in parent:
+                    parent[adjacent] = current
+                    queue.append(adjacent)
+        return None
@@ -5,16 +5,19 @@ A wrapper for a randomized reflex agent adapted for a grid environment.
 If the cell is dirty, it cleans; otherwise, it randomly chooses from four directions
 (with an additional "NoOp" option if needed).
 This adaptation allows full exploration of a 2D grid.
+Its program is a declarative PolicyTable, and its batch_program (see batch_policy.py)
+applies the same policy to many environments at once.
 """
 
-import random
-from src.berkeley_ai.agents import Agent
+from src.berkeley_ai.agents import Agent, PolicyTable, status_code
+from src.agents.batch_policy import table_batch_program
 
 def RandomGridAgent():
-    def program(percept):
-        location, status = percept
-        if status == 'Dirty':
-            return 'Suck'
-        # Random choice among four directions and an optional NoOp.
-        return random.choice(['Left', 'Right', 'Up', 'Down', 'NoOp'])
-    return Agent(program)
+    # Suck when dirty; otherwise a random choice among four directions and an optional NoOp.
+    # As a PolicyTable the environment can apply it inline without calling the agent.
+    program = PolicyTable({'Dirty': 'Suck', 'Clean': ('Left', 'Right', 'Up', 'Down', 'NoOp')}, status_code)
+    agent = Agent(program)
+    agent.policy_table = program
+    agent.state_key = lambda: ()  # Stateless; randomness is tracked by the environment.
+    agent.batch_program = table_batch_program(program)  # Same policy for many environments.
+    return agent
@@ -5,17 +5,19 @@ A wrapper for the simple reflex agent adapted to a grid environment.
 This agent uses four-directional movement (Left, Right, Up, Down) when the cell is clean,
 and performs the "Suck" action when dirt is detected.
 This extension addresses Exercise 2.14 by enabling exploration in all directions.
+Its program is a declarative PolicyTable, and its batch_program (see batch_policy.py)
+applies the same policy to many environments at once.
 """
 
-import random
-from src.berkeley_ai.agents import Agent
+from src.berkeley_ai.agents import Agent, PolicyTable, status_code
+from src.agents.batch_policy import table_batch_program
 
 def ReflexGridAgent():
-    def program(percept):
-        # percept is assumed to be a tuple: (location, status)
-        location, status = percept
-        if status == 'Dirty':
-            return 'Suck'
-        # Randomly choose one of the four directions for exploration.
-        return random.choice(['Left', 'Right', 'Up', 'Down'])
-    return Agent(program)
+    # Suck when dirty; otherwise randomly choose one of the four directions for exploration.
+    # As a PolicyTable the environment can apply it inline without calling the agent.
+    program = PolicyTable({'Dirty': 'Suck', 'Clean': ('Left', 'Right', 'Up', 'Down')}, status_code)
+    agent = Agent(program)
+    agent.policy_table = program
+    agent.state_key = lambda: ()  # Stateless; randomness is tracked by the environment.
+    agent.batch_program = table_batch_program(program)  # Same policy for many environments.
+    return agent
@@ -0,0 +1,149 @@
+# wavefront_planner.py
+"""
+Wavefront (distance-field) exploration planning with NumPy.
+
+Instead of a per-cell Python BFS, WavefrontPlanner views the occupancy grid's
+bytearray as a 2-D array and computes the BFS distance from the agent over
+the known-free mask with array operations: the wavefront is a vector of cell
+indices grown by one step per iteration, and frontier detection is a
+4-neighbour dilation of the unknown mask with shifted boolean slices.
+Targets are frontier cells (free cells next to unknown space) and cells known
+to be dirty. The planner picks either the nearest target (stopping the wave
+as soon as it reaches one) or, with gain_weight > 0, the target maximising
+gain_weight * unknown neighbours - distance over the full field. The path is
+extracted by descending the distance field from the target back to the agent;
+only a frontier target gets a final step into unknown space, so search()
+returns the target cell with the path. Dirty targets keep the planner useful
+after the frontier is exhausted; a search that found no target is not repeated
+until the grid changes.
+"""
+
+import numpy as np
+
+from src.agents.occupancy_grid import FREE, UNKNOWN, DIRTY, MOVES
+from src.agents.exploration import FrontierExplorer, ORDER
+
+
+def shifted_any(mask):
+    """Cells with at least one 4-neighbour set in mask (no wrap-around)."""
+    out = np.zeros_like(mask)
+    out[1:] |= mask[:-1]
+    out[:-1] |= mask[1:]
+    out[:, 1:] |= mask[:, :-1]
+    out[:, :-1] |= mask[:, 1:]
+    return out
+
+
+def neighbour_count(mask):
+    """Number of 4-neighbours set in mask, per cell."""
+    padded = np.pad(mask, 1).astype(np.int32)
+    return padded[:-2, 1:-1] + padded[2:, 1:-1] + padded[1:-1, :-2] + padded[1:-1, 2:]
+
+
+def distance_field(free, start, targets=None):
+    """
+    BFS distances from start (row, column) over the boolean free mask; -1 marks
+    unreached cells. The wave is an array of flat indices, expanded one step per
+    iteration with array operations, so each step costs time proportional to the
+    wave rather than to the map. Free cells must not touch the array edge (the
+    OccupancyGrid margin guarantees this), so flat offsets never wrap a row.
+    If a targets mask is given the wave stops at the first distance at which it
+    reaches a target cell.
+    """
+    height, width = free.shape
+    free = free.ravel()
+    targets = None if targets is None else targets.ravel()
+    distance = np.full(height * width, -1, dtype=np.int32)
+    source = start[0] * width + start[1]
+    distance[source] = 0
+    wave = np.array([source])
+    offsets = np.array([1, -1, width, -width])
+    d = 0
+    while len(wave):
+        if targets is not None and targets[wave].any():
+            break
+        adjacent = (wave[:, None] + offsets).ravel()
+        adjacent = adjacent[free[adjacent] & (distance[adjacent] < 0)]
+        wave = np.unique(adjacent)
+        d += 1
+        distance[wave] = d
+    return distance.reshape(height, width)
+
+
+class WavefrontPlanner(FrontierExplorer):
+    """FrontierExplorer whose replanning uses a vectorized distance field."""
+
+    targets_dirt = True
+
+    def __init__(self, grid, gain_weight=0.0):
+        super().__init__(grid)
+        self.gain_weight = gain_weight
+        self.exhausted = None  # grid version at which the last search found no target
+
+    def arrays(self):
+        """Cell-state and dirt arrays of the grid, indexed [y - y0, x - x0].
+        They are views of the grid's bytearrays, valid until it next grows."""
+        shape = (self.grid.height, self.grid.width)
+        cells = np.frombuffer(self.grid.cells, dtype=np.uint8).reshape(shape)
+        dirt = np.frombuffer(self.grid.dirt, dtype=np.uint8).reshape(shape)
+        return cells, dirt
+
+    def search(self, location):
+        """(action list to the chosen target, stepping into unknown space for a frontier
+        cell; target cell), or None if no target is reachable."""
+        grid = self.grid
+        if self.exhausted == (grid.version, location):
+            return None
+        found = self.find(location)
+        self.exhausted = (grid.version, location) if found is None else None
+        return found
+
+    def find(self, location):
+        """search() without the memo of unsuccessful searches."""
+        grid = self.grid
+        cells, dirt = self.arrays()
+        free = cells == FREE
+        unknown = cells == UNKNOWN
+        frontier = free & shifted_any(unknown)
+        start = (location[1] - grid.y0, location[0] - grid.x0)
+        dirty = free & (dirt == DIRTY)
+        dirty[start] = False
+        targets = frontier | dirty
+        if not targets.any():
+            return None
+        if self.gain_weight > 0:
+            distance = distance_field(free, start)
+            reached = targets & (distance >= 0)
+            if not reached.any():
+                return None
+            utility = np.where(reached, self.gain_weight * neighbour_count(unknown) - distance, -np.inf)
+            target = np.unravel_index(np.argmax(utility), utility.shape)
+        else:
+            distance = distance_field(free, start, targets)
+            reached = np.flatnonzero(targets & (distance >= 0))
+            if len(reached) == 0:
+                return None
+            target = np.unravel_index(reached[0], distance.shape)
+        actions = self.descend(distance, target)
+        cell = (int(target[1]) + grid.x0, int(target[0]) + grid.y0)
+        if frontier[target]:
+            actions.append(self.exit_action(cell))
+        return actions, cell
+
+    @staticmethod
+    def descend(distance, target):
+        """Follow the distance field downhill from target to the start; returns the actions
+        from the start to target."""
+        row, col = int(target[0]), int(target[1])
+        actions = []
+        d = distance[row, col]
+        while d > 0:
+            for action in ORDER:
+                dx, dy = MOVES[action]
+                if distance[row - dy, col - dx] == d - 1:
+                    actions.append(action)
+                    row, col = row - dy, col - dx
+                    break
+            d -= 1
+        actions.reverse()
+        return actions
@@ -26,20 +26,20 @@ EnvToolbar ## contains buttons for controlling EnvGUI
 EnvCanvas ## Canvas to display the environment of an EnvGUI
 """
 
-# TODO
-# Speed control in GUI does not have any effect -- fix it.
-
 from src.berkeley_ai.utils import distance_squared, turn_heading
 from statistics import mean
 from ipythonblocks import BlockGrid
 from IPython.display import HTML, display, clear_output
-from time import sleep
+from time import sleep, perf_counter
 
+import ast
 import random
 import copy
 import collections
 import numbers
 
+import numpy as np
+
 
 # ______________________________________________________________________________
 
@@ -115,24 +115,146 @@ def TraceAgent(agent):
 # ______________________________________________________________________________
 
 
+class PerceptTable:
+    """A table of {percept_sequence: action} pairs stored as a trie of percepts.
+    Node 0 stands for the empty sequence and child(node, percept) extends a
+    sequence by one percept, so a table-driven program can follow its percept
+    history with a cursor instead of hashing the whole history at every step.
+    A table can be saved to and loaded from a compact .npz file, provided its
+    percepts and actions are Python literals (tuples, strings, numbers...)."""
+
+    def __init__(self, table=None):
+        self.children = [{}]  # node -> {percept: child node}
+        self.actions = [None]  # node -> action for the sequence ending at node
+        for sequence, action in (table or {}).items():
+            if isinstance(sequence, tuple):
+                self.add(sequence, action)
+
+    def add(self, sequence, action):
+        """Set the action for a percept sequence."""
+        node = 0
+        for percept in sequence:
+            child = self.children[node].get(percept)
+            if child is None:
+                child = self.children[node][percept] = len(self.children)
+                self.children.append({})
+                self.actions.append(None)
+            node = child
+        self.actions[node] = action
+
+    def child(self, node, percept):
+        """The node for node's sequence followed by percept, or None if no sequence in the table starts that way."""
+        return self.children[node].get(percept)
+
+    def get(self, sequence, default=None):
+        """The action for a percept sequence, like dict.get on the original table."""
+        node = 0
+        for percept in sequence:
+            node = self.children[node].get(percept)
+            if node is None:
+                return default
+        action = self.actions[node]
+        return default if action is None else action
+
+    def __len__(self):
+        """Number of trie nodes (sequences and their prefixes, plus the empty one)."""
+        return len(self.children)
+
+    def save(self, file):
+        """Write the table as arrays of parent node, percept id and action id per node."""
+        percepts, actions = {}, {}
+
+        def intern(value, ids):
+            text = repr(value)
+            if text not in ids:
+                try:
+                    literal = ast.literal_eval(text) == value
+                except (ValueError, SyntaxError):
+                    literal = False
+                if not literal:
+                    raise ValueError("{!r} is not a Python literal".format(value))
+                ids[text] = len(ids)
+            return ids[text]
+
+        n = len(self.children)
+        parent = np.zeros(n, dtype=np.int32)
+        symbol = np.zeros(n, dtype=np.int32)
+        for node, children in enumerate(self.children):
+            for percept, child in children.items():
+                parent[child] = node
+                symbol[child] = intern(percept, percepts)
+        action = np.array([-1 if a is None else intern(a, actions) for a in self.actions], dtype=np.int32)
+        np.savez_compressed(file, parent=parent, symbol=symbol, action=action,
+                            percepts=np.array(list(percepts), dtype=str), actions=np.array(list(actions), dtype=str))
+
+    @classmethod
+    def load(cls, file):
+        """Read a table written by save."""
+        data = np.load(file)
+        percepts = [ast.literal_eval(text) for text in data['percepts']]
+        actions = [ast.literal_eval(text) for text in data['actions']]
+        table = cls()
+        n = len(data['parent'])
+        table.children = [{} for _ in range(n)]
+        table.actions = [None if a < 0 else actions[a] for a in data['action'].tolist()]
+        # Every node is created after its parent, so parents always have smaller ids.
+        for node, (parent, symbol) in enumerate(zip(data['parent'].tolist(), data['symbol'].tolist())):
+            if node:
+                table.children[parent][percepts[symbol]] = node
+        return table
+
+
 def TableDrivenAgentProgram(table):
     """
     [Figure 2.7]
     This agent selects an action based on the percept sequence.
     It is practical only for tiny domains.
     To customize it, provide as table a dictionary of all
-    {percept_sequence:action} pairs.
+    {percept_sequence:action} pairs, or a PerceptTable.
+    The table is indexed as a trie when the program is created; the program
+    keeps a cursor into it, so each step costs O(1) however long the history.
     """
-    percepts = []
+    if not isinstance(table, PerceptTable):
+        table = PerceptTable(table)
 
     def program(percept):
-        percepts.append(percept)
-        action = table.get(tuple(percepts))
-        return action
+        if program.node is not None:
+            program.node = table.child(program.node, percept)
+        return None if program.node is None else table.actions[program.node]
 
+    program.node = 0
     return program
 
 
+def status_code(percept):
+    """Percept code of agents that decide from the status alone: 'Dirty' or 'Clean'."""
+    return 'Dirty' if percept[1] == 'Dirty' else 'Clean'
+
+
+class PolicyTable:
+    """A declarative agent program for agents that decide from the current percept alone.
+    table maps a percept code, code(percept) (the percept itself by default), to
+    an action, or to a tuple of actions meaning random.choice over that tuple;
+    codes missing from the table give None. Calling the table is the program,
+    so it behaves exactly like the equivalent closure (same random draws);
+    decide is the lookup itself, which an environment may use directly.
+    >>> program = PolicyTable({'Dirty': 'Suck', 'Clean': ('Left', 'Right')}, status_code)
+    >>> program(((0, 0), 'Dirty'))
+    'Suck'
+    """
+
+    def __init__(self, table, code=None):
+        self.table = table
+        self.code = code
+
+    def decide(self, percept):
+        """The action for percept."""
+        choice = self.table.get(percept if self.code is None else self.code(percept))
+        return random.choice(choice) if isinstance(choice, tuple) else choice
+
+    __call__ = decide
+
+
 def RandomAgentProgram(actions):
     """An agent that chooses an action at random, ignoring all percepts.
     >>> list = ['Right', 'Left', 'Suck', 'NoOp']
@@ -154,11 +276,13 @@ def SimpleReflexAgentProgram(rules, interpret_input):
     """
     [Figure 2.10]
     This agent takes action based solely on the percept.
+    The rules are compiled into a RuleIndex when the program is created.
     """
+    index = compile_rules(rules)
 
     def program(percept):
         state = interpret_input(percept)
-        rule = rule_match(state, rules)
+        rule = index.match(state)
         action = rule.action
         return action
 
@@ -169,11 +293,13 @@ def ModelBasedReflexAgentProgram(rules, update_state, model):
     """
     [Figure 2.12]
     This agent takes action based on the percept and state.
+    The rules are compiled into a RuleIndex when the program is created.
     """
+    index = compile_rules(rules)
 
     def program(percept):
         program.state = update_state(program.state, program.action, percept, model)
-        rule = rule_match(program.state, rules)
+        rule = index.match(program.state)
         action = rule.action
         return action
 
@@ -188,6 +314,91 @@ def rule_match(state, rules):
             return rule
 
 
+def state_field(state, field):
+    """A field of an interpreted state: a key of a mapping, an index of a tuple or an attribute."""
+    if isinstance(state, collections.abc.Mapping) or (isinstance(field, int) and isinstance(state, tuple)):
+        return state[field]
+    return getattr(state, field)
+
+
+class Rule:
+    """A condition-action rule. The condition is a set of field == value tests
+    on the interpreted state (see state_field), optionally combined with an
+    opaque predicate(state).
+    >>> rule = Rule('Suck', status='Dirty')
+    >>> rule.matches({'location': (0, 0), 'status': 'Dirty'})
+    True
+    """
+
+    def __init__(self, action, predicate=None, **conditions):
+        self.action = action
+        self.predicate = predicate
+        self.conditions = conditions
+
+    def matches(self, state):
+        try:
+            if any(state_field(state, field) != value for field, value in self.conditions.items()):
+                return False
+        except (KeyError, IndexError, AttributeError):
+            return False
+        return self.predicate is None or bool(self.predicate(state))
+
+    def __repr__(self):
+        tests = ['{}={!r}'.format(field, value) for field, value in self.conditions.items()]
+        if self.predicate is not None:
+            tests.append('predicate')
+        return 'Rule({!r}, {})'.format(self.action, ', '.join(tests))
+
+
+class RuleIndex:
+    """Rules compiled for first-match lookup.
+    Rules with only equality conditions on hashable values are grouped by the
+    fields they test; each group is a dict from field values to the position of
+    the first rule with those values, so matching costs one lookup per group.
+    Other rules (predicates, unhashable values, or objects with only a matches
+    method) are tried in order, and only while they come before the best
+    indexed match, so the result is always the same as rule_match."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.groups = {}  # tuple of fields -> {tuple of values: first rule position}
+        self.opaque = []  # positions of rules that are tested one by one
+        for position, rule in enumerate(self.rules):
+            conditions = getattr(rule, 'conditions', None)
+            if (isinstance(rule, Rule) and rule.predicate is None and
+                    all(isinstance(value, collections.abc.Hashable) for value in conditions.values())):
+                fields = tuple(sorted(conditions, key=repr))
+                try:
+                    self.groups.setdefault(fields, {}).setdefault(tuple(conditions[f] for f in fields), position)
+                    continue
+                except TypeError:  # e.g. a tuple holding a list
+                    pass
+            self.opaque.append(position)
+
+    def match(self, state):
+        """Find the first rule that matches state (None if there is none)."""
+        best = len(self.rules)
+        for fields, table in self.groups.items():
+            try:
+                position = table.get(tuple(state_field(state, field) for field in fields), best)
+            except (KeyError, IndexError, AttributeError, TypeError):
+                continue
+            if position < best:
+                best = position
+        for position in self.opaque:
+            if position >= best:
+                break
+            if self.rules[position].matches(state):
+                best = position
+                break
+        return self.rules[best] if best < len(self.rules) else None
+
+
+def compile_rules(rules):
+    """Compile a list of rules into a RuleIndex (a RuleIndex is returned unchanged)."""
+    return rules if isinstance(rules, RuleIndex) else RuleIndex(rules)
+
+
 # ______________________________________________________________________________
 
 
@@ -240,16 +451,13 @@ def ReflexVacuumAgent():
     True
     """
 
-    def program(percept):
-        location, status = percept
-        if status == 'Dirty':
-            return 'Suck'
-        elif location == loc_A:
-            return 'Right'
-        elif location == loc_B:
-            return 'Left'
-
-    return Agent(program)
+    # Suck if dirty, else move Right from loc_A and Left from loc_B (None elsewhere).
+    program = PolicyTable({'Dirty': 'Suck', loc_A: 'Right', loc_B: 'Left'},
+                          lambda percept: 'Dirty' if percept[1] == 'Dirty' else percept[0])
+    agent = Agent(program)
+    agent.policy_table = program
+    agent.state_key = lambda: ()  # Stateless: the percept alone decides the action.
+    return agent
 
 
 def ModelBasedVacuumAgent():
@@ -614,11 +822,15 @@ class Wall(Obstacle):
 
 
 class GraphicEnvironment(XYEnvironment):
-    def __init__(self, width=10, height=10, boundary=True, color={}, display=False):
+    background = (200, 200, 200)
+
+    def __init__(self, width=10, height=10, boundary=True, color={}, display=False, delay=1, fps=None):
         """Define all the usual XYEnvironment characteristics,
-        but initialise a BlockGrid for GUI too."""
+        but initialise a BlockGrid for GUI too.
+        delay is the speed control: seconds to pause before each rendered frame.
+        If fps is set, run() steps at full speed and renders at most fps frames per second."""
         super().__init__(width, height)
-        self.grid = BlockGrid(width, height, fill=(200, 200, 200))
+        self.grid = BlockGrid(width, height, fill=self.background)
         if display:
             self.grid.show()
             self.visible = True
@@ -626,49 +838,57 @@ class GraphicEnvironment(XYEnvironment):
             self.visible = False
         self.bounded = boundary
         self.colors = color
+        self.delay = delay
+        self.fps = fps
+        self.painted = {}  # (x, y) -> color currently painted on the grid
 
     def get_world(self):
         """Returns all the items in the world in a format
         understandable by the ipythonblocks BlockGrid."""
-        result = []
-        x_start, y_start = (0, 0)
-        x_end, y_end = self.width, self.height
-        for x in range(x_start, x_end):
-            row = []
-            for y in range(y_start, y_end):
-                row.append(self.list_things_at((x, y)))
-            result.append(row)
+        result = [[[] for y in range(self.height)] for x in range(self.width)]
+        # One pass over the things instead of a list_things_at scan per cell.
+        for thing in self.things:
+            if thing.location is None:
+                continue
+            x, y = thing.location
+            if 0 <= x < self.width and 0 <= y < self.height:
+                result[x][y].append(thing)
         return result
 
-    """
-    def run(self, steps=1000, delay=1):
-        "" "Run the Environment for given number of time steps,
-        but update the GUI too." ""
-        for step in range(steps):
-            sleep(delay)
-            if self.visible:
-                self.reveal()
-            if self.is_done():
-                if self.visible:
-                    self.reveal()
-                return
-            self.step()
-        if self.visible:
-            self.reveal()
-    """
+    def set_speed(self, delay=None, fps=None):
+        """Change the speed control used by run() and update()."""
+        self.delay = delay if delay is not None else self.delay
+        self.fps = fps
 
-    def run(self, steps=1000, delay=1):
+    def run(self, steps=1000, delay=None, fps=None):
         """Run the Environment for given number of time steps,
-        but update the GUI too."""
-        for step in range(steps):
+        but update the GUI too. delay and fps default to the speed
+        control set on the environment. With fps, frames that would
+        come sooner than 1/fps seconds after the previous one are skipped
+        while the simulation keeps stepping; the final state is always shown."""
+        fps = fps if fps is not None else self.fps
+        if not fps:
+            for step in range(steps):
+                self.update(delay)
+                if self.is_done():
+                    break
+                self.step()
             self.update(delay)
+            return
+        interval = 1 / fps
+        last_frame = None
+        for step in range(steps):
+            now = perf_counter()
+            if last_frame is None or now - last_frame >= interval:
+                self.reveal()
+                last_frame = now
             if self.is_done():
                 break
             self.step()
-        self.update(delay)
+        self.reveal()
 
-    def update(self, delay=1):
-        sleep(delay)
+    def update(self, delay=None):
+        sleep(self.delay if delay is None else delay)
         self.reveal()
 
     def reveal(self):
@@ -678,17 +898,26 @@ class GraphicEnvironment(XYEnvironment):
         # wait for the world to update and
         # apply changes to the same grid instead
         # of making a new one.
-        clear_output(1)
+        clear_output(wait=True)
         self.grid.show()
         self.visible = True
 
     def draw_world(self):
-        self.grid[:] = (200, 200, 200)
-        world = self.get_world()
-        for x in range(0, len(world)):
-            for y in range(0, len(world[x])):
-                if len(world[x][y]):
-                    self.grid[y, x] = self.colors[world[x][y][-1].__class__.__name__]
+        """Repaint only the cells whose color changed since the last frame."""
+        top = {}
+        for thing in self.things:
+            if thing.location is None:
+                continue
+            x, y = thing.location
+            if 0 <= x < self.width and 0 <= y < self.height:
+                top[(x, y)] = thing
+        colors = {location: self.colors[thing.__class__.__name__] for location, thing in top.items()}
+        for (x, y) in self.painted.keys() - colors.keys():
+            self.grid[y, x] = self.background
+        for (x, y), color in colors.items():
+            if self.painted.get((x, y)) != color:
+                self.grid[y, x] = color
+        self.painted = colors
 
     def conceal(self):
         """Hide the BlockGrid for this world"""
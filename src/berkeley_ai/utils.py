@@ -8,6 +8,9 @@ import heapq
 import operator
 import os.path
 import random
+import sys
+import time
+import weakref
 from itertools import chain, combinations
 from statistics import mean
 
@@ -405,10 +408,139 @@ class injection:
         globals().update(self.old)
 
 
-def memoize(fn, slot=None, maxsize=32):
+# Registry of live caches by name, for inspecting or resetting them between experiments.
+CACHES = weakref.WeakValueDictionary()
+
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+_MISSING = object()
+
+
+def sizeof(value):
+    """Approximate memory size of a cached value: nbytes for arrays, else sys.getsizeof."""
+    nbytes = getattr(value, 'nbytes', None)
+    return nbytes if isinstance(nbytes, int) else sys.getsizeof(value)
+
+
+class Cache:
+    """A bounded mapping that counts hits, misses and evictions.
+    Entries are evicted least recently used first once there are more than
+    maxsize of them (None for no limit) or their total sizeof() exceeds
+    max_bytes (None for no limit); with ttl set, an entry expires ttl seconds
+    after it was stored. The cache registers itself in CACHES under name."""
+
+    def __init__(self, name=None, maxsize=128, ttl=None, max_bytes=None, clock=time.monotonic):
+        name = name or 'cache'
+        unique, n = name, 1
+        while unique in CACHES:
+            n += 1
+            unique = '{}#{}'.format(name, n)
+        self.name = unique
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.data = collections.OrderedDict()  # key -> (value, expiry time or None, size)
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        CACHES[self.name] = self
+
+    def get(self, key, default=None):
+        """Return the value stored for key (counting a hit), or default (counting a miss)."""
+        entry = self.data.get(key)
+        if entry is not None:
+            if entry[1] is not None and self.clock() >= entry[1]:
+                self._discard(key)
+                self.expirations += 1
+            else:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        self.misses += 1
+        return default
+
+    def __setitem__(self, key, value):
+        if key in self.data:
+            self._discard(key)
+        if self.maxsize == 0:
+            return
+        size = sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expiry = self.clock() + self.ttl if self.ttl is not None else None
+        self.data[key] = (value, expiry, size)
+        self.bytes += size
+        while ((self.maxsize is not None and len(self.data) > self.maxsize) or
+               (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            self._discard(next(iter(self.data)))
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        """Whether key has a live entry (not counted as a hit or miss)."""
+        entry = self.data.get(key)
+        return entry is not None and (entry[1] is None or self.clock() < entry[1])
+
+    def __len__(self):
+        return len(self.data)
+
+    def _discard(self, key):
+        self.bytes -= self.data.pop(key)[2]
+
+    def clear(self):
+        """Drop every entry, keeping the counters."""
+        self.data.clear()
+        self.bytes = 0
+
+    def reset(self):
+        """Drop every entry and zero the counters."""
+        self.clear()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self):
+        """Counters and occupancy as a dict."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'size': len(self.data), 'bytes': self.bytes,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+def cache_stats():
+    """Stats of every live registered cache, by name."""
+    return {name: cache.stats() for name, cache in sorted(CACHES.items())}
+
+
+def reset_caches(clear=True):
+    """Zero the counters of every registered cache, also dropping their entries if clear."""
+    for cache in list(CACHES.values()):
+        if clear:
+            cache.reset()
+        else:
+            cache.hits = cache.misses = cache.evictions = cache.expirations = 0
+
+
+def dump_caches():
+    """Print a table of the stats of every registered cache."""
+    stats = cache_stats()
+    if not stats:
+        return
+    columns = ['hits', 'misses', 'evictions', 'expirations', 'size', 'bytes']
+    print_table([[name] + [values[c] for c in columns] + ['{:.1%}'.format(values['hit_rate'])]
+                 for name, values in stats.items()],
+                header=['cache'] + columns + ['hit_rate'])
+
+
+def memoize(fn, slot=None, maxsize=32, ttl=None, max_bytes=None, cache_name=None):
     """Memoize fn: make it remember the computed value for any argument list.
     If slot is specified, store result in that slot of first argument.
-    If slot is false, use lru_cache for caching the values."""
+    If slot is false, use a Cache (LRU with maxsize entries, optional ttl and
+    max_bytes) registered as cache_name (default: fn's qualified name). The cache is
+    available as memoized_fn.cache; cache_info() and cache_clear() work as with lru_cache."""
     if slot:
         def memoized_fn(obj, *args):
             if hasattr(obj, slot):
@@ -418,9 +550,19 @@ def memoize(fn, slot=None, maxsize=32):
                 setattr(obj, slot, val)
                 return val
     else:
-        @functools.lru_cache(maxsize=maxsize)
+        cache = Cache(cache_name or getattr(fn, '__qualname__', None) or name(fn), maxsize, ttl, max_bytes)
+
+        @functools.wraps(fn)
         def memoized_fn(*args):
-            return fn(*args)
+            val = cache.get(args, _MISSING)
+            if val is _MISSING:
+                val = fn(*args)
+                cache[args] = val
+            return val
+
+        memoized_fn.cache = cache
+        memoized_fn.cache_info = lambda: CacheInfo(cache.hits, cache.misses, maxsize, len(cache))
+        memoized_fn.cache_clear = cache.reset
 
     return memoized_fn
 
@@ -716,7 +858,7 @@ class hashabledict(dict):
 # ______________________________________________________________________________
 # Queues: Stack, FIFOQueue, PriorityQueue
 # Stack and FIFOQueue are implemented as list and collection.deque
-# PriorityQueue is implemented here
+# PriorityQueue and IndexedPriorityQueue are implemented here
 
 
 class PriorityQueue:
@@ -777,6 +919,131 @@ class PriorityQueue:
         heapq.heapify(self.heap)
 
 
+class IndexedPriorityQueue:
+    """A PriorityQueue backed by an indexed binary heap.
+    It has the same API as PriorityQueue, but keeps a dict from each item to
+    its position in the heap, so membership and lookup are O(1) and deletion
+    and priority changes are O(log n) instead of linear scans.
+    Items must be hashable and are kept at most once: appending an item that is
+    already present (or an equal one) replaces it and moves it to its new
+    priority, which is the decrease-key operation of Dijkstra and A*.
+    Items with equal priority are popped in insertion order."""
+
+    def __init__(self, order='min', f=lambda x: x):
+        self.heap = []      # [priority, insertion count, item] entries
+        self.position = {}  # item -> index of its entry in self.heap
+        self.count = 0
+        if order == 'min':
+            self.f = f
+        elif order == 'max':  # now item with max f(x)
+            self.f = lambda x: -f(x)  # will be popped first
+        else:
+            raise ValueError("Order must be either 'min' or 'max'.")
+
+    def append(self, item):
+        """Insert item at its correct position, or move it there if already present."""
+        priority = self.f(item)
+        if item in self.position:
+            i = self.position.pop(item)
+            old = self.heap[i][0]
+            self.heap[i][0] = priority
+            self.heap[i][2] = item
+            self.position[item] = i
+            if priority < old:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+        else:
+            self.heap.append([priority, self.count, item])
+            self.count += 1
+            self.position[item] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+
+    def extend(self, items):
+        """Insert each item in items at its correct position."""
+        for item in items:
+            self.append(item)
+
+    def decrease_key(self, item):
+        """Move an item whose f value has changed to its new position (O(log n))."""
+        if item not in self.position:
+            raise KeyError(str(item) + " is not in the priority queue")
+        self.append(item)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order."""
+        if not self.heap:
+            raise Exception('Trying to pop from empty PriorityQueue.')
+        item = self.heap[0][2]
+        self._remove(0)
+        return item
+
+    def __len__(self):
+        """Return current capacity of PriorityQueue."""
+        return len(self.heap)
+
+    def __contains__(self, key):
+        """Return True if the key is in PriorityQueue."""
+        return key in self.position
+
+    def __getitem__(self, key):
+        """Returns the value associated with key in PriorityQueue.
+        Raises KeyError if key is not present."""
+        try:
+            return self.heap[self.position[key]][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete key."""
+        try:
+            i = self.position[key]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        self._remove(i)
+
+    def _remove(self, i):
+        """Remove the entry at index i by moving the last entry into its place."""
+        heap = self.heap
+        del self.position[heap[i][2]]
+        last = heap.pop()
+        if i < len(heap):
+            heap[i] = last
+            self.position[last[2]] = i
+            self._sift_up(i)
+            self._sift_down(self.position[last[2]])
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.position[heap[i][2]] = i
+        self.position[heap[j][2]] = j
+
+    def _sift_up(self, i):
+        heap = self.heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[i][:2] < heap[parent][:2]:
+                self._swap(i, parent)
+                i = parent
+            else:
+                break
+
+    def _sift_down(self, i):
+        heap = self.heap
+        n = len(heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and heap[child][:2] < heap[smallest][:2]:
+                    smallest = child
+            if smallest == i:
+                break
+            self._swap(i, smallest)
+            i = smallest
+
+
 # ______________________________________________________________________________
 # Useful Shorthands
 
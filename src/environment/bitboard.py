@@ -0,0 +1,159 @@
+# bitboard.py
+"""
+Bitboard representation of small vacuum worlds (at most 64 cells, e.g. the
+5x5 default and 8x8 layouts).
+
+Cell (x, y) is bit y * width + x of a Python int, so walls, dirt and visited
+cells are each a single integer mask:
+  - a move is a shift (by 1 for Left/Right, by width for Up/Down) masked at the
+    grid edges, and a shift that leaves the grid gives 0;
+  - is_clean is a zero test and coverage a popcount;
+  - reachability is a flood fill that dilates a mask with the four shifts;
+  - (position, dirt) is a pair of ints, a compact O(1) hashable search state.
+Bitboard holds the geometry, and BitboardWorld plays a ModifiedVacuumEnvironment
+episode on masks with the same scoring and termination rules.
+"""
+
+from src.berkeley_ai.agents import Wall
+
+MAX_CELLS = 64
+MOVES = ('Right', 'Left', 'Down', 'Up')
+
+
+def popcount(mask):
+    """Number of set bits."""
+    return bin(mask).count('1')
+
+
+class Bitboard:
+    """Bitmask geometry of a width x height grid."""
+
+    def __init__(self, width, height):
+        if width * height > MAX_CELLS:
+            raise ValueError("A bitboard holds at most {} cells.".format(MAX_CELLS))
+        self.width = width
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        self.left_edge = sum(1 << (y * width) for y in range(height))
+        self.right_edge = self.left_edge << (width - 1)
+
+    def bit(self, location):
+        return 1 << (location[1] * self.width + location[0])
+
+    def location(self, bit):
+        index = bit.bit_length() - 1
+        return (index % self.width, index // self.width)
+
+    def mask(self, locations):
+        """Mask of the in-bounds locations."""
+        mask = 0
+        for x, y in locations:
+            if 0 <= x < self.width and 0 <= y < self.height:
+                mask |= 1 << (y * self.width + x)
+        return mask
+
+    def cells(self, mask):
+        """Locations of the set bits, in index order."""
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(self.location(low))
+            mask ^= low
+        return cells
+
+    def shift(self, mask, action):
+        """Cells reached from mask by one move (cells that would leave the grid are dropped)."""
+        if action == 'Right':
+            return (mask & ~self.right_edge) << 1
+        if action == 'Left':
+            return (mask & ~self.left_edge) >> 1
+        if action == 'Down':
+            return (mask << self.width) & self.full
+        if action == 'Up':
+            return mask >> self.width
+        return mask
+
+    def neighbours(self, mask):
+        """Cells one move away from any cell of mask."""
+        return (((mask & ~self.right_edge) << 1) | ((mask & ~self.left_edge) >> 1) |
+                ((mask << self.width) & self.full) | (mask >> self.width))
+
+    def flood_fill(self, start, open_cells):
+        """Mask of the cells reachable from the start mask through open_cells (start included)."""
+        reached = frontier = start
+        while frontier:
+            frontier = self.neighbours(frontier) & open_cells & ~reached
+            reached |= frontier
+        return reached
+
+
+class BitboardWorld:
+    """
+    A ModifiedVacuumEnvironment episode on bitmasks: moves and bumps cost 1,
+    sucking dirt earns 100, NoOp and sucking a clean cell are free.
+    """
+
+    def __init__(self, board, walls, dirt, location):
+        self.board = board
+        self.open = board.full & ~walls
+        self.dirt = dirt
+        self.position = board.bit(location)
+        self.visited = self.position
+        self.reachable = board.flood_fill(self.position, self.open)
+        self.performance = 0
+        self.steps_taken = 0
+
+    @classmethod
+    def from_env(cls, env, start):
+        """The world of env (layout and current dirt) with the agent at start."""
+        board = Bitboard(env.width, env.height)
+        walls = board.mask(thing.location for thing in env.things if isinstance(thing, Wall))
+        return cls(board, walls, board.mask(env.dirt_locations), start)
+
+    @property
+    def location(self):
+        return self.board.location(self.position)
+
+    def percept(self):
+        return (self.location, 'Dirty' if self.position & self.dirt else 'Clean')
+
+    def execute_action(self, action):
+        """Apply action; returns True if it was a move that bumped."""
+        if action == 'Suck':
+            if self.position & self.dirt:
+                self.dirt &= ~self.position
+                self.performance += 100
+            return False
+        if action == 'NoOp':
+            return False
+        target = self.board.shift(self.position, action)
+        self.performance -= 1
+        if target & self.open:
+            self.position = target
+            self.visited |= target
+            return False
+        return True
+
+    def is_clean(self):
+        return self.dirt == 0
+
+    def is_reachable_clean(self):
+        return self.dirt & self.reachable == 0
+
+    def coverage(self):
+        """Number of distinct cells visited."""
+        return popcount(self.visited)
+
+    def key(self):
+        """Hashable search state: (position bit, dirt mask)."""
+        return (self.position, self.dirt)
+
+    def run(self, program, steps=1000, until='clean'):
+        """Run an agent program as ModifiedVacuumEnvironment.run would (primitive actions only)."""
+        if until not in ('clean', 'reachable'):
+            raise ValueError("until must be either 'clean' or 'reachable'.")
+        finished = self.is_clean if until == 'clean' else self.is_reachable_clean
+        while self.steps_taken < steps and not finished():
+            self.execute_action(program(self.percept()))
+            self.steps_taken += 1
+        return self.performance
@@ -0,0 +1,331 @@
+# distance_oracle.py
+"""
+Per-layout shortest-path distance oracle for fully known vacuum worlds.
+
+Trials on a fixed layout (e.g. create_worst_case_environment or an imported
+floor plan) and every full-knowledge planner would otherwise recompute the
+same shortest paths. A DistanceOracle is computed once per layout and keyed by
+a hash of the layout (width, height and wall cells):
+  - Small maps (at most ALL_PAIRS_LIMIT cells) get an all-pairs table: a
+    cells x cells uint16 matrix from simultaneous BFS wavefronts, so a distance
+    query is a single array lookup.
+  - Larger maps get ALT landmark tables: BFS distances from a few far-apart
+    landmarks (landmarks x cells; uint16, or uint32 above 65534 cells). They give
+    an O(landmarks) lower bound by the triangle inequality, which guides an A*
+    search for exact distances.
+By default the tables are built in memory only, which suits one-off random
+layouts. Persisting is opt-in: given a cache_dir (DEFAULT_CACHE_DIR is a shared
+location under the system temp dir), the tables are saved there as .npy files
+and loaded with mmap_mode='r', so trials and worker processes on the same fixed
+layout share one read-only copy through the page cache. Nothing ever deletes
+those files, so only pass a cache_dir for layouts that are reused. An
+in-process registry avoids rebuilding tables; the registry and each oracle's
+A* distance cache are utils.Cache instances, so their hit rates show up in
+utils.cache_stats().
+Cells are numbered y * width + x; walls and unreachable pairs hold the
+largest value of the table's dtype and give math.inf in queries.
+"""
+
+import hashlib
+import heapq
+import math
+import os
+import tempfile
+
+import numpy as np
+
+from src.berkeley_ai.agents import Wall
+from src.berkeley_ai.utils import Cache
+
+ALL_PAIRS_LIMIT = 2048
+LANDMARKS = 8
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "vacuum_distance_oracle")
+ORACLE_CACHE_SIZE = 32
+ASTAR_CACHE_SIZE = 100000
+
+# In-process registry: (layout hash, all_pairs_limit, landmarks) -> DistanceOracle (least recently used layouts are dropped).
+_ORACLES = Cache('distance_oracle.layouts', maxsize=ORACLE_CACHE_SIZE)
+
+
+def layout_of(env):
+    """(width, height, sorted wall cells) of an environment."""
+    walls = sorted({tuple(thing.location) for thing in env.things
+                    if isinstance(thing, Wall) and 0 <= thing.location[0] < env.width
+                    and 0 <= thing.location[1] < env.height})
+    return env.width, env.height, walls
+
+
+def layout_hash(width, height, walls):
+    """Stable hex digest identifying a layout."""
+    digest = hashlib.sha1("{}x{}:".format(width, height).encode())
+    digest.update(np.array(sorted(walls), dtype=np.int32).tobytes())
+    return digest.hexdigest()[:20]
+
+
+def distance_dtype(cells):
+    """Smallest unsigned dtype that holds every distance of a map plus the unreachable marker."""
+    return np.uint16 if cells < np.iinfo(np.uint16).max else np.uint32
+
+
+def bfs_rows(passable, sources):
+    """
+    BFS distances from each source (one row per source) over the 2-D boolean
+    passable mask, computed by growing all wavefronts together: every step
+    dilates a (sources, height, width) boolean stack with shifted slices.
+    """
+    height, width = passable.shape
+    n = height * width
+    k = len(sources)
+    dtype = distance_dtype(n)
+    distance = np.full((k, height, width), np.iinfo(dtype).max, dtype=dtype)
+    wave = np.zeros((k, height, width), dtype=bool)
+    rows, cols = np.divmod(sources, width)
+    wave[np.arange(k), rows, cols] = passable[rows, cols]
+    seen = wave.copy()
+    distance[seen] = 0
+    grown = np.empty_like(wave)
+    d = 0
+    while wave.any():
+        d += 1
+        grown[:] = False
+        grown[:, 1:] |= wave[:, :-1]
+        grown[:, :-1] |= wave[:, 1:]
+        grown[:, :, 1:] |= wave[:, :, :-1]
+        grown[:, :, :-1] |= wave[:, :, 1:]
+        grown &= passable
+        grown &= ~seen
+        seen |= grown
+        distance[grown] = d
+        wave, grown = grown, wave
+    return distance.reshape(k, n)
+
+
+def bfs_row(passable, neighbours, source):
+    """
+    BFS distances from a single source. The wavefront is an array of cell
+    indices, so each step costs time proportional to the wave, not the map.
+    """
+    n = len(passable)
+    dtype = distance_dtype(n)
+    unreachable = np.iinfo(dtype).max
+    distance = np.full(n + 1, unreachable, dtype=dtype)
+    distance[n] = 0  # the "no neighbour" slot is never entered
+    if not passable[source]:
+        return distance[:n]
+    distance[source] = 0
+    open_cells = np.append(passable, False)
+    wave = np.array([source])
+    d = 0
+    while len(wave):
+        d += 1
+        adjacent = np.concatenate([neighbours_d[wave] for neighbours_d in neighbours])
+        adjacent = adjacent[open_cells[adjacent] & (distance[adjacent] == unreachable)]
+        wave = np.unique(adjacent)
+        distance[wave] = d
+    return distance[:n]
+
+
+class DistanceOracle:
+    """
+    Shortest-path distances over a known layout (four-directional moves, walls
+    and the grid boundary block movement).
+    """
+
+    def __init__(self, width, height, walls, cache_dir=None, all_pairs_limit=ALL_PAIRS_LIMIT,
+                 landmarks=LANDMARKS):
+        self.width = width
+        self.height = height
+        self.key = layout_hash(width, height, walls)
+        n = width * height
+        self.passable = np.ones(n, dtype=bool)
+        for x, y in walls:
+            self.passable[y * width + x] = False
+        index = np.arange(n)
+        x, y = index % width, index // width
+        self.neighbours = [np.where(x < width - 1, index + 1, n), np.where(x > 0, index - 1, n),
+                           np.where(y < height - 1, index + width, n), np.where(y > 0, index - width, n)]
+        self.unreachable = np.iinfo(distance_dtype(n)).max
+        self.table = None       # all-pairs matrix (small maps)
+        self.landmarks = None   # landmark cell indices (large maps)
+        self.landmark_table = None
+        if cache_dir is None:
+            self.build(n <= all_pairs_limit, landmarks)
+        else:
+            self.load_or_build(cache_dir, n <= all_pairs_limit, landmarks)
+        # (source, target) -> distance found by A* (only queried without an all-pairs table)
+        self.cache = Cache('distance_oracle.astar.' + self.key, maxsize=ASTAR_CACHE_SIZE) if self.table is None else None
+
+    def build(self, all_pairs, landmarks):
+        """Compute the tables for this layout in memory."""
+        if all_pairs:
+            self.table = self.all_pairs_table()
+        else:
+            self.landmarks, self.landmark_table = self.select_landmarks(landmarks)
+
+    def load_or_build(self, cache_dir, all_pairs, landmarks):
+        """Memory-map the cached tables for this layout, computing and saving them first if needed."""
+        os.makedirs(cache_dir, exist_ok=True)
+        prefix = os.path.join(cache_dir, self.key)
+        if all_pairs:
+            path = prefix + ".pairs.npy"
+            if not os.path.exists(path):
+                self.save(path, self.all_pairs_table())
+            self.table = np.load(path, mmap_mode='r')
+        else:
+            path = prefix + ".alt{}.npy".format(landmarks)
+            ids_path = prefix + ".alt{}.landmarks.npy".format(landmarks)
+            if not (os.path.exists(path) and os.path.exists(ids_path)):
+                ids, rows = self.select_landmarks(landmarks)
+                self.save(path, rows)
+                self.save(ids_path, ids)
+            self.landmarks = np.load(ids_path)
+            self.landmark_table = np.load(path, mmap_mode='r')
+
+    def all_pairs_table(self):
+        """cells x cells distance matrix, from BFS wavefronts in blocks of 256 sources."""
+        n = len(self.passable)
+        mask = self.passable.reshape(self.height, self.width)
+        return np.concatenate([bfs_rows(mask, np.arange(start, min(start + 256, n)))
+                               for start in range(0, n, 256)])
+
+    @staticmethod
+    def save(path, array):
+        """Write atomically, so concurrent processes never read a partial file."""
+        temporary = "{}.{}.tmp.npy".format(path[:-4], os.getpid())
+        np.save(temporary, array)
+        os.replace(temporary, path)
+
+    def select_landmarks(self, count):
+        """Farthest-point landmarks: returns (landmark indices, landmarks x cells distances)."""
+        n = len(self.passable)
+        open_cells = np.flatnonzero(self.passable)
+        chosen, rows = [], []
+        if len(open_cells):
+            first = bfs_row(self.passable, self.neighbours, open_cells[0])
+            reached = first != self.unreachable
+            closest = np.where(reached, first, -1).astype(np.int64)
+            for _ in range(min(count, int(reached.sum()))):
+                landmark = int(np.argmax(closest))
+                row = bfs_row(self.passable, self.neighbours, landmark)
+                chosen.append(landmark)
+                rows.append(row)
+                closest = np.where(reached, np.minimum(closest, row), -1)
+        rows = np.array(rows, dtype=distance_dtype(n)).reshape(len(rows), n)
+        return np.array(chosen, dtype=np.int64), rows
+
+    # --------------------------------------------------
+    # Queries
+    # --------------------------------------------------
+
+    def index(self, location):
+        return location[1] * self.width + location[0]
+
+    def location(self, index):
+        return (index % self.width, index // self.width)
+
+    def heuristic(self, target):
+        """
+        Lower-bound function h(cell) on the distance from a cell index to target:
+        the larger of the Manhattan distance and the ALT bound
+        max |d(L, cell) - d(L, target)| over the landmarks L that reach both.
+        Each evaluation costs O(landmarks), so A* only pays for the cells it reaches.
+        """
+        width, unreachable = self.width, self.unreachable
+        tx, ty = self.location(target)
+        landmarks = []
+        if self.landmark_table is not None:
+            to_target = self.landmark_table[:, target].tolist()
+            landmarks = [(row, d) for row, d in zip(self.landmark_table, to_target) if d != unreachable]
+
+        def h(cell):
+            bound = abs(cell % width - tx) + abs(cell // width - ty)
+            for row, d in landmarks:
+                d_cell = int(row[cell])
+                if d_cell != unreachable and abs(d_cell - d) > bound:
+                    bound = abs(d_cell - d)
+            return bound
+
+        return h
+
+    def distance(self, a, b):
+        """Shortest-path length between locations a and b (math.inf if unreachable)."""
+        i, j = self.index(a), self.index(b)
+        if self.table is not None:
+            d = self.table[i, j]
+            return math.inf if d == self.unreachable else int(d)
+        d = self.cache.get((i, j))
+        if d is None:
+            path = self.astar(i, j)
+            d = self.cache[(i, j)] = self.cache[(j, i)] = math.inf if path is None else len(path) - 1
+        return d
+
+    def distances_from(self, a):
+        """Array of distances from location a to every cell index (self.unreachable where unreachable)."""
+        i = self.index(a)
+        if self.table is not None:
+            return self.table[i]
+        return bfs_row(self.passable, self.neighbours, i)
+
+    def astar(self, source, target):
+        """A* over cell indices with the ALT heuristic; returns the index path or None."""
+        if not (self.passable[source] and self.passable[target]):
+            return None
+        width, n = self.width, len(self.passable)
+        passable = self.passable
+        h = self.heuristic(target)
+        cost = {source: 0}
+        parent = {source: None}
+        # Ties on f are broken toward larger g, so open areas are crossed without fanning out.
+        heap = [(h(source), 0, source)]
+        while heap:
+            _, negative_g, current = heapq.heappop(heap)
+            if current == target:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = parent[current]
+                return path[::-1]
+            if -negative_g > cost[current]:
+                continue
+            g = cost[current] + 1
+            x = current % width
+            for nxt in (current + 1 if x < width - 1 else -1, current - 1 if x > 0 else -1,
+                        current + width, current - width):
+                if 0 <= nxt < n and passable[nxt] and g < cost.get(nxt, math.inf):
+                    cost[nxt] = g
+                    parent[nxt] = current
+                    heapq.heappush(heap, (g + h(nxt), -g, nxt))
+        return None
+
+    def path(self, a, b):
+        """Shortest list of locations from a to b (inclusive), or None if unreachable."""
+        i, j = self.index(a), self.index(b)
+        if self.table is None:
+            path = self.astar(i, j)
+            return None if path is None else [self.location(c) for c in path]
+        d = self.table[i, j]
+        if d == self.unreachable:
+            return None
+        # Descend the target's distance column one step at a time.
+        path = [i]
+        column = self.table[:, j]
+        while d > 0:
+            i = next(int(adjacent[i]) for adjacent in self.neighbours
+                     if adjacent[i] != len(self.passable) and column[adjacent[i]] == d - 1)
+            path.append(i)
+            d -= 1
+        return [self.location(c) for c in path]
+
+
+def oracle_for_layout(width, height, walls, cache_dir=None, all_pairs_limit=ALL_PAIRS_LIMIT, landmarks=LANDMARKS):
+    """Return the DistanceOracle of a layout and table settings, reusing the in-process registry."""
+    key = (layout_hash(width, height, walls), all_pairs_limit, landmarks)
+    oracle = _ORACLES.get(key)
+    if oracle is None:
+        oracle = _ORACLES[key] = DistanceOracle(width, height, walls, cache_dir, all_pairs_limit, landmarks)
+    return oracle
+
+
+def oracle_for(env, cache_dir=None, **kwargs):
+    """Return the DistanceOracle of an environment's current layout."""
+    return oracle_for_layout(*layout_of(env), cache_dir=cache_dir, **kwargs)
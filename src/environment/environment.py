@@ -4,11 +4,38 @@ This module implements a ModifiedVacuumEnvironment.
 It is designed to meet the requirements of Exercise 2.11 (the standard vacuum-cleaner world)
 and Exercise 2.14 (the modified vacuum environment with unknown boundaries, obstacles, and dirt configuration).
 Users can modify the environment by explicitly adding dirt and obstacles.
+Agents may also return a MacroAction (a whole action sequence with abort
+conditions), which the environment executes in a tight loop without calling
+back into the agent program.
 """
 
-from src.berkeley_ai.agents import XYEnvironment, Dirt, Wall
+from src.berkeley_ai.agents import XYEnvironment, Dirt, Wall, PolicyTable
+from src.environment.bitboard import Bitboard, MAX_CELLS
+from collections import deque
 import random
 
+class MacroAction:
+    """
+    A sequence of primitive actions handed to the environment in one decision.
+    The environment executes the actions in order, scoring each one exactly as a
+    single step, and stops early:
+      - on a bump, if stop_on_bump (the bumping action still counts and is scored);
+      - on arriving at a dirty cell, if stop_on_dirty;
+      - when the run's step budget or termination condition is reached.
+    After execution, executed holds the number of primitive actions carried out
+    and bumped tells whether the last one bumped; the agent can read both on its
+    next percept.
+    """
+    def __init__(self, actions, stop_on_bump=True, stop_on_dirty=True):
+        self.actions = list(actions)
+        self.stop_on_bump = stop_on_bump
+        self.stop_on_dirty = stop_on_dirty
+        self.executed = 0
+        self.bumped = False
+
+    def __repr__(self):
+        return 'MacroAction({})'.format(self.actions)
+
 class ModifiedVacuumEnvironment(XYEnvironment):
     """
     A modified vacuum environment with configurable grid size.
@@ -18,6 +45,24 @@ class ModifiedVacuumEnvironment(XYEnvironment):
     def __init__(self, width=5, height=5):
         super().__init__(width, height)
         self.dirt_locations = set()
+        self.reachable_cache = {}   # start location -> frozenset of reachable cells
+        self.reachable = frozenset()  # cells reachable by the agents in the current run
+        self.reachable_dirt = set()   # dirt still left inside self.reachable
+        self.unreachable_dirt = set()  # dirt the agents can never get to
+        self.cleaned = 0
+        self.steps_taken = 0
+        self.cycle = None  # (first step, length, reward per cycle) of a fast-forwarded cycle
+        self.finished = self.is_clean  # termination test of the current run
+
+    def add_thing(self, thing, location=None, exclude_duplicate_class_items=False):
+        """
+        Add a thing to the environment. Full-knowledge agents (those with a
+        bind_environment attribute, such as the coverage agent) are then handed
+        the environment so they can plan on the known layout and dirt.
+        """
+        super().add_thing(thing, location, exclude_duplicate_class_items)
+        if thing in self.agents and hasattr(thing, 'bind_environment'):
+            thing.bind_environment(self)
 
     def add_dirt(self, location):
         """
@@ -27,6 +72,8 @@ class ModifiedVacuumEnvironment(XYEnvironment):
         if not self.some_things_at(location, Wall):
             self.add_thing(Dirt(), location)
             self.dirt_locations.add(location)
+            if location in self.reachable:
+                self.reachable_dirt.add(location)
 
     def add_obstacle(self, location):
         """
@@ -35,6 +82,7 @@ class ModifiedVacuumEnvironment(XYEnvironment):
         """
         if location not in self.dirt_locations:
             self.add_thing(Wall(), location)
+            self.reachable_cache.clear()
 
     def percept(self, agent):
         """
@@ -70,6 +118,8 @@ class ModifiedVacuumEnvironment(XYEnvironment):
                 for dirt in dirt_list:
                     self.delete_thing(dirt)
                 self.dirt_locations.discard(agent.location)
+                self.reachable_dirt.discard(agent.location)
+                self.cleaned += 1
                 agent.performance += 100  # Reward for cleaning
             return
         elif action == 'NoOp':
@@ -95,11 +145,168 @@ class ModifiedVacuumEnvironment(XYEnvironment):
         """
         return len(self.dirt_locations) == 0
 
-    def run(self, steps=1000):
+    def reachable_cells(self, start):
+        """
+        Return the frozenset of cells reachable from start by four-directional moves
+        through in-bounds cells without a Wall. The start cell itself is always
+        included (an agent placed on a wall can still move off it).
+        Computed once per layout and start (by a bitboard flood fill on grids of at
+        most 64 cells); adding an obstacle clears the cache.
+        """
+        start = tuple(start)
+        if start not in self.reachable_cache and self.width * self.height <= MAX_CELLS and self.is_valid_location(start):
+            board = Bitboard(self.width, self.height)
+            walls = board.mask(thing.location for thing in self.things if isinstance(thing, Wall))
+            reached = board.flood_fill(board.bit(start), board.full & ~walls)
+            self.reachable_cache[start] = frozenset(board.cells(reached))
+        if start not in self.reachable_cache:
+            walls = {tuple(thing.location) for thing in self.things if isinstance(thing, Wall)}
+            seen = {start}
+            frontier = deque([start])
+            while frontier:
+                x, y = frontier.popleft()
+                for cell in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+                    if cell not in seen and cell not in walls and self.is_valid_location(cell):
+                        seen.add(cell)
+                        frontier.append(cell)
+            self.reachable_cache[start] = frozenset(seen)
+        return self.reachable_cache[start]
+
+    def update_reachability(self):
+        """Recompute the reachable component of the agents' current locations and split the dirt accordingly."""
+        self.reachable = frozenset().union(*(self.reachable_cells(agent.location) for agent in self.agents))
+        self.reachable_dirt = self.dirt_locations & self.reachable
+        self.unreachable_dirt = self.dirt_locations - self.reachable
+
+    def is_reachable_clean(self):
+        """
+        True once all dirt the agents can reach has been cleaned.
+        """
+        return len(self.reachable_dirt) == 0
+
+    def dirt_metrics(self):
+        """
+        Report dirt for the current run, split by reachability:
+          - reachable_dirt: dirt the agents could reach at the start of the run.
+          - unreachable_dirt: dirt sealed off from the agents.
+          - reachable_remaining: reachable dirt not yet cleaned.
+          - cleaned: dirt cleaned so far (all of it reachable).
+        """
+        remaining = len(self.reachable_dirt)
+        return {
+            'reachable_dirt': remaining + self.cleaned,
+            'unreachable_dirt': len(self.unreachable_dirt),
+            'reachable_remaining': remaining,
+            'cleaned': self.cleaned,
+        }
+
+    def execute_macro(self, agent, macro, budget=None):
+        """
+        Execute a MacroAction for agent in a tight loop, using at most budget
+        primitive steps. Returns the number of primitive steps consumed (at least 1,
+        so an empty macro costs one step like a NoOp).
+        """
+        execute_action = self.execute_action
+        dirt = self.dirt_locations
+        finished = self.finished
+        limit = len(macro.actions) if budget is None else min(len(macro.actions), budget)
+        macro.executed = 0
+        macro.bumped = False
+        for action in macro.actions[:limit]:
+            execute_action(agent, action)
+            macro.executed += 1
+            if agent.bump and macro.stop_on_bump:
+                macro.bumped = True
+                break
+            if (macro.stop_on_dirty and agent.location in dirt) or finished():
+                break
+        return max(macro.executed, 1)
+
+    def step(self, budget=None):
+        """
+        Run the environment for one decision of every agent. Agents returning a
+        MacroAction have it executed by execute_macro within budget primitive steps.
+        Agents whose program is a PolicyTable are decided by PolicyTable.decide.
+        Returns the number of primitive steps consumed.
+        """
+        if self.is_done():
+            return 1
+        actions = []
+        for agent in self.agents:
+            if not agent.alive:
+                actions.append("")
+                continue
+            program = agent.program
+            if program.__class__ is PolicyTable:
+                # Declarative policy: the table lookup itself (same draws as calling it).
+                actions.append(program.decide(self.percept(agent)))
+            else:
+                actions.append(program(self.percept(agent)))
+        consumed = 1
+        for agent, action in zip(self.agents, actions):
+            if isinstance(action, MacroAction):
+                consumed = max(consumed, self.execute_macro(agent, action, budget))
+            else:
+                self.execute_action(agent, action)
+        self.exogenous_change()
+        return consumed
+
+    def run(self, steps=1000, until='clean', detect_cycles=False):
         """
         Run the simulation for a number of steps or until the environment is clean.
+        With until='reachable' the run ends as soon as all dirt reachable from the
+        agents' starting cells is cleaned, instead of spending the remaining steps
+        looking for dirt that can never be reached.
+        With detect_cycles=True (single agent exposing a state_key() method) a
+        repeated state is fast-forwarded instead of simulated; see run_detecting_cycles.
+        Steps are counted in primitive actions, so a MacroAction uses one step per action.
+        """
+        if until not in ('clean', 'reachable'):
+            raise ValueError("until must be either 'clean' or 'reachable'.")
+        self.update_reachability()
+        self.finished = self.is_clean if until == 'clean' else self.is_reachable_clean
+        if detect_cycles and len(self.agents) == 1 and callable(getattr(self.agents[0], 'state_key', None)):
+            self.run_detecting_cycles(steps, self.finished)
+            return
+        step = 0
+        while step < steps:
+            if self.finished():
+                break
+            consumed = self.step(steps - step)
+            self.steps_taken += consumed
+            step += consumed
+
+    def run_detecting_cycles(self, steps, finished):
+        """
+        Step the single agent while hashing its full state before every step:
+        location, amount of dirt left (dirt is only ever removed during a run, so
+        equal counts mean equal dirt sets), the agent's state_key() and the state of
+        the global random generator. If a state repeats, nothing random happened in
+        between and the run is periodic from there: the remaining whole cycles are
+        skipped by adding their reward analytically, and only the leftover partial
+        cycle is simulated, so the final score and state match a full simulation.
         """
-        for _ in range(steps):
-            if self.is_clean():
+        agent = self.agents[0]
+        seen = {}
+        self.cycle = None
+        step = 0
+        while step < steps:
+            if finished():
                 break
-            self.step()
+            if self.cycle is None:
+                key = (agent.location, len(self.dirt_locations), agent.state_key(), hash(random.getstate()))
+                if key in seen:
+                    first_step, first_performance = seen[key]
+                    length = step - first_step
+                    reward = agent.performance - first_performance
+                    repeats = (steps - step) // length
+                    agent.performance += repeats * reward
+                    step += repeats * length
+                    self.steps_taken += repeats * length
+                    self.cycle = (first_step, length, reward)
+                    seen.clear()
+                    continue
+                seen[key] = (step, agent.performance)
+            consumed = self.step(steps - step)
+            self.steps_taken += consumed
+            step += consumed
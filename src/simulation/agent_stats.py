@@ -0,0 +1,129 @@
+# agent_stats.py
+"""
+Statistical comparison of agent performance scores.
+
+compare_agents reports only mean and standard deviation, which cannot tell
+whether two agents actually differ. This module adds:
+  - Bootstrap confidence intervals for a statistic (mean or median) of each
+    agent's scores.
+  - Paired permutation (sign-flip) tests for every pair of agents, for scores
+    collected on the same environment layouts (see simulation.collect_scores).
+
+All resampling is vectorized in NumPy: the resamples are drawn as one index,
+count or sign matrix and reduced along an axis, processed in chunks so that
+memory stays bounded for large trial counts.
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+STATISTICS = {'mean': np.mean, 'median': np.median}
+
+# Upper bound on the number of matrix elements materialised per chunk.
+CHUNK_ELEMENTS = 4_000_000
+
+
+def _chunks(n_resamples, n):
+    """Yield resample counts so that each chunk has at most CHUNK_ELEMENTS elements."""
+    size = max(1, CHUNK_ELEMENTS // max(n, 1))
+    for start in range(0, n_resamples, size):
+        yield min(size, n_resamples - start)
+
+
+def bootstrap_distribution(samples, statistic='mean', n_resamples=10000, rng=None):
+    """
+    Return n_resamples bootstrap replicates of statistic ('mean' or 'median') of samples.
+    Agent scores usually take few distinct values; in that case each resample is
+    drawn as a multinomial count vector over the distinct values, which has the
+    same distribution as resampling indices but needs far less work.
+    """
+    samples = np.asarray(samples, dtype=float)
+    rng = np.random.default_rng(rng)
+    n = len(samples)
+    values, frequency = np.unique(samples, return_counts=True)
+    if len(values) * 4 > n:
+        reduce = STATISTICS[statistic]
+        parts = [reduce(samples[rng.integers(0, n, size=(size, n))], axis=1)
+                 for size in _chunks(n_resamples, n)]
+        return np.concatenate(parts)
+    parts = []
+    for size in _chunks(n_resamples, len(values)):
+        counts = rng.multinomial(n, frequency / n, size=size)
+        if statistic == 'mean':
+            parts.append(counts @ values / n)
+        else:
+            cdf = np.cumsum(counts, axis=1)
+            low = values[(cdf < (n + 1) // 2).sum(axis=1)]
+            high = values[(cdf < n // 2 + 1).sum(axis=1)]
+            parts.append((low + high) / 2)
+    return np.concatenate(parts)
+
+
+def bootstrap_ci(samples, statistic='mean', n_resamples=10000, confidence=0.95, rng=None):
+    """
+    Percentile bootstrap confidence interval.
+    Returns (estimate, low, high) for statistic ('mean' or 'median') of samples.
+    """
+    samples = np.asarray(samples, dtype=float)
+    estimate = STATISTICS[statistic](samples)
+    if len(samples) < 2:
+        return estimate, estimate, estimate
+    replicates = bootstrap_distribution(samples, statistic, n_resamples, rng)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(replicates, [alpha, 1 - alpha])
+    return estimate, low, high
+
+
+def paired_permutation_test(a, b, n_resamples=10000, rng=None):
+    """
+    Two-sided paired permutation test of the mean difference between a and b.
+    Under the null hypothesis the sign of each paired difference is exchangeable,
+    so the null distribution is built by random sign flips.
+    Returns (mean difference, p-value).
+    """
+    diff = np.asarray(a, dtype=float) - np.asarray(b, dtype=float)
+    observed = diff.mean()
+    if len(diff) == 0 or not diff.any():
+        return observed, 1.0
+    rng = np.random.default_rng(rng)
+    n = len(diff)
+    # Small tolerance so that ties with the observed statistic count as extreme.
+    threshold = abs(observed) - 1e-12 * max(1.0, abs(observed))
+    total = diff.sum()
+    extreme = 0
+    for size in _chunks(n_resamples, n):
+        # One random bit per pair: a set bit flips the sign of that difference,
+        # so the flipped sum is total - 2 * (bits @ diff).
+        bits = np.unpackbits(rng.integers(0, 256, size=(size, (n + 7) // 8), dtype=np.uint8), axis=1)[:, :n]
+        extreme += np.count_nonzero(np.abs(total - 2 * (bits @ diff)) / n >= threshold)
+    return observed, (extreme + 1) / (n_resamples + 1)
+
+
+def pairwise_permutation_tests(scores, n_resamples=10000, rng=None):
+    """
+    Run paired_permutation_test for every pair of agents.
+    scores maps agent name to an array of paired scores (same trials, same order).
+    Returns {(name_a, name_b): (mean difference a - b, p-value)}.
+    """
+    rng = np.random.default_rng(rng)
+    return {(a, b): paired_permutation_test(scores[a], scores[b], n_resamples, rng)
+            for a, b in combinations(scores, 2)}
+
+
+def summarize_agents(scores, statistic='mean', n_resamples=10000, confidence=0.95, rng=None):
+    """
+    Bootstrap confidence intervals for every agent plus pairwise permutation tests.
+    Returns a dict:
+      - 'ci': {name: (estimate, low, high)}
+      - 'pairs': {(name_a, name_b): (mean difference, p-value)}
+      - 'confidence', 'statistic': the settings used.
+    """
+    rng = np.random.default_rng(rng)
+    return {
+        'ci': {name: bootstrap_ci(values, statistic, n_resamples, confidence, rng)
+               for name, values in scores.items()},
+        'pairs': pairwise_permutation_tests(scores, n_resamples, rng),
+        'confidence': confidence,
+        'statistic': statistic,
+    }
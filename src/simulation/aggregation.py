@@ -0,0 +1,165 @@
+# aggregation.py
+"""
+Streaming, mergeable reductions for aggregating many simulation trials.
+
+Each accumulator keeps a fixed amount of memory no matter how many trials are
+added, and two accumulators built in different worker processes can be merged,
+so trials can be split into chunks, reduced in parallel and combined:
+  - VisitAccumulator: summed per-cell visit counts (for heatmaps).
+  - TimeSeriesAccumulator: per-step count, sum, sum of squares and a fixed-bin
+    histogram of cumulative performance, from which the per-step mean and
+    percentiles (e.g. 5/50/95) are computed without storing any trajectory.
+"""
+
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class VisitAccumulator:
+    """Sum of per-trial visit-count grids."""
+
+    def __init__(self):
+        self.total = None
+        self.trials = 0
+
+    def add(self, visits):
+        """Add the visit counts of one trial."""
+        if self.total is None:
+            self.total = np.zeros(np.shape(visits))
+        self.total += visits
+        self.trials += 1
+
+    def merge(self, other):
+        """Fold another accumulator into this one and return self."""
+        if other.total is not None:
+            if self.total is None:
+                self.total = np.zeros_like(other.total)
+            self.total += other.total
+        self.trials += other.trials
+        return self
+
+    def mean(self):
+        """Average number of visits per cell per trial."""
+        return self.total / max(self.trials, 1)
+
+    def normalized(self):
+        """Fraction of all recorded visits that fell on each cell (sums to 1)."""
+        visits = self.total.sum()
+        return self.total / visits if visits else self.total.copy()
+
+
+class TimeSeriesAccumulator:
+    """
+    Per-step statistics of a time series (e.g. cumulative performance) over trials.
+
+    Values are binned into a histogram with `bins` bins spanning [low, high];
+    when the span is at most `bins` integers each bin holds a single integer and
+    the percentiles are exact, otherwise they are accurate to one bin width.
+    Trials that end early are padded with their last value, since cumulative
+    performance stays constant once the run has stopped.
+    """
+
+    def __init__(self, steps, low, high, bins=1024):
+        self.steps = steps
+        self.low = low
+        self.width = max(1, math.ceil((high - low + 1) / bins))
+        self.bins = math.ceil((high - low + 1) / self.width)
+        self.counts = np.zeros((steps, self.bins), dtype=np.int32)
+        self.sum = np.zeros(steps)
+        self.sum_sq = np.zeros(steps)
+        self.trials = 0
+
+    def add(self, series):
+        """Add one trial's series (length <= steps)."""
+        series = np.asarray(series[:self.steps], dtype=float)
+        if len(series) == 0:
+            return
+        values = np.empty(self.steps)
+        values[:len(series)] = series
+        values[len(series):] = series[-1]
+        index = np.clip((values - self.low) // self.width, 0, self.bins - 1).astype(np.intp)
+        self.counts[np.arange(self.steps), index] += 1
+        self.sum += values
+        self.sum_sq += values * values
+        self.trials += 1
+
+    def merge(self, other):
+        """Fold another accumulator with the same binning into this one and return self."""
+        self.counts += other.counts
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.trials += other.trials
+        return self
+
+    def mean(self):
+        return self.sum / max(self.trials, 1)
+
+    def std(self):
+        mean = self.mean()
+        return np.sqrt(np.maximum(self.sum_sq / max(self.trials, 1) - mean * mean, 0))
+
+    def percentile(self, q):
+        """Per-step q-th percentile (0-100), by nearest rank on the histogram."""
+        cdf = np.cumsum(self.counts, axis=1)
+        rank = max(1, math.ceil(q / 100 * self.trials))
+        index = (cdf < rank).sum(axis=1)
+        return self.low + index * self.width + (self.width - 1) / 2
+
+    def bands(self, percentiles=(5, 50, 95)):
+        """Return a dict with the per-step mean and the requested percentiles."""
+        result = {'mean': self.mean()}
+        for q in percentiles:
+            result[q] = self.percentile(q)
+        return result
+
+
+def run_visit_trial(env, agent_class, steps, visits):
+    """
+    Run one heatmap trial: place an agent_class agent at (1, 1) in env and step
+    until env is clean or after steps steps, adding one to visits[x, y] for the
+    agent's location after every step. Returns the agent.
+    """
+    agent = agent_class()
+    env.add_thing(agent, (1, 1))
+    for _ in range(steps):
+        env.step()
+        x, y = agent.location
+        visits[x, y] += 1
+        if env.is_clean():
+            break
+    return agent
+
+
+def split_trials(trials, chunks):
+    """Split a number of trials into at most `chunks` near-equal positive parts."""
+    chunks = max(1, min(chunks, trials))
+    return [trials // chunks + (1 if i < trials % chunks else 0) for i in range(chunks)]
+
+
+def parallel_reduce(task, trials, workers=1, args=()):
+    """
+    Run task(n_trials, seed, *args) over chunks of trials and merge the returned
+    accumulators. Each chunk gets its own seed drawn from the caller's `random`
+    state, so results are reproducible under random.seed() and worker processes
+    do not repeat each other's trials. With workers <= 1 everything runs
+    in-process, and the caller's `random` state is restored afterwards (tasks
+    reseed the global generator), so only the seed draws advance it.
+    """
+    sizes = split_trials(trials, workers)
+    seeds = [random.randrange(2 ** 32) for _ in sizes]
+    if workers <= 1:
+        state = random.getstate()
+        try:
+            parts = [task(n, seed, *args) for n, seed in zip(sizes, seeds)]
+        finally:
+            random.setstate(state)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(task, sizes, seeds, *[[arg] * len(sizes) for arg in args]))
+    result = parts[0]
+    for part in parts[1:]:
+        result.merge(part)
+    return result
@@ -0,0 +1,48 @@
+# batch_runner.py
+"""
+Lockstep driver for many ModifiedVacuumEnvironment instances.
+
+run_batch places one agent in each environment and advances all of them
+together: every step gathers the percepts of the environments still running
+into one array, asks the agents' batch program (see agents/batch_policy.py)
+for all actions at once and executes them. Termination (until='clean' or
+'reachable'), scoring and step counting follow ModifiedVacuumEnvironment.run;
+agents without a batch program are adapted row by row, so a deterministic
+scalar agent scores exactly as in separate runs.
+"""
+
+import numpy as np
+
+from src.agents.batch_policy import ACTIONS, batch_program_for
+
+
+def run_batch(agent_class, envs, start=(1, 1), steps=100, until='clean'):
+    """
+    Run one agent_class agent in each environment of envs for at most steps
+    steps. Returns the array of final performances.
+    """
+    if until not in ('clean', 'reachable'):
+        raise ValueError("until must be either 'clean' or 'reachable'.")
+    agents = [agent_class() for _ in envs]
+    for env, agent in zip(envs, agents):
+        env.add_thing(agent, start)
+        env.update_reachability()
+        env.finished = env.is_clean if until == 'clean' else env.is_reachable_clean
+    batch_program = batch_program_for(agents)
+    percepts = np.zeros((len(envs), 3), dtype=np.int64)
+    active = np.ones(len(envs), dtype=bool)
+    for _ in range(steps):
+        for i, env in enumerate(envs):
+            if active[i] and env.finished():
+                active[i] = False
+        if not active.any():
+            break
+        for i in np.flatnonzero(active):
+            (x, y), status = envs[i].percept(agents[i])
+            percepts[i] = (x, y, status == 'Dirty')
+        codes = batch_program(percepts, active)
+        for i in np.flatnonzero(active):
+            envs[i].execute_action(agents[i], ACTIONS[codes[i]])
+            envs[i].exogenous_change()
+            envs[i].steps_taken += 1
+    return np.array([agent.performance for agent in agents])
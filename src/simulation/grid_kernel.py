@@ -0,0 +1,182 @@
+# grid_kernel.py
+"""
+Compiled episode kernel for grid vacuum worlds.
+
+ModifiedVacuumEnvironment interprets every step (percept, program call, move,
+bump check, suck, score). For agents whose program is a status-coded
+PolicyTable (the reflex and random grid agents), a whole episode is a small
+loop over arrays, which this module runs as a Numba njit kernel; a batch of
+episodes runs in parallel with prange. Numba is optional: without it the same
+functions run as plain Python (slowly, but with identical results).
+
+The kernel follows ModifiedVacuumEnvironment.run exactly: moves and bumps
+cost 1, sucking dirt earns 100, the episode stops when the (reachable) dirt is
+cleaned or after `steps` steps. Only the random source differs: instead of
+`random`, choices are drawn from a Park-Miller generator
+(state = state * 48271 mod 2^31 - 1, choice = state * k // (2^31 - 1)), whose
+arithmetic stays exact in 64-bit integers, so the compiled and interpreted
+kernels produce bit-for-bit the same episodes. A draw is made only when a
+status maps to more than one action.
+Grids are indexed [y, x]; cells outside a layout are padded as walls, which
+behave exactly like the grid boundary (the move bumps).
+"""
+
+import random
+
+import numpy as np
+
+from src.berkeley_ai.agents import Wall, PolicyTable, status_code
+from src.agents.batch_policy import ACTION_CODES
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # Pure-Python fallback with the same interface.
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+MODULUS = 2147483647  # 2^31 - 1
+MULTIPLIER = 48271
+NOOP, SUCK, LEFT, RIGHT, UP, DOWN = (ACTION_CODES[a] for a in ('NoOp', 'Suck', 'Left', 'Right', 'Up', 'Down'))
+
+
+@njit(cache=True)
+def run_episode(walls, dirt, counted, x, y, steps, choices, counts, seed):
+    """
+    Run one episode in place (dirt is modified). walls, dirt and counted are
+    (height, width) boolean grids, counted marking the dirt that must be cleaned
+    for the episode to end. choices[status] holds counts[status] action codes for
+    status 0 (clean) and 1 (dirty).
+    Returns (performance, steps taken, x, y, dirt cleaned, final generator state).
+    """
+    height, width = walls.shape
+    remaining = 0
+    for i in range(height):
+        for j in range(width):
+            if dirt[i, j] and counted[i, j]:
+                remaining += 1
+    performance = 0
+    cleaned = 0
+    state = seed
+    taken = 0
+    while taken < steps and remaining > 0:
+        status = 1 if dirt[y, x] else 0
+        k = counts[status]
+        if k == 1:
+            action = choices[status, 0]
+        else:
+            state = (state * MULTIPLIER) % MODULUS
+            action = choices[status, (state * k) // MODULUS]
+        taken += 1
+        if action == SUCK:
+            if dirt[y, x]:
+                dirt[y, x] = False
+                performance += 100
+                cleaned += 1
+                if counted[y, x]:
+                    remaining -= 1
+        elif action != NOOP:
+            nx, ny = x, y
+            if action == LEFT:
+                nx -= 1
+            elif action == RIGHT:
+                nx += 1
+            elif action == UP:
+                ny -= 1
+            elif action == DOWN:
+                ny += 1
+            if 0 <= nx < width and 0 <= ny < height and not walls[ny, nx]:
+                x, y = nx, ny
+            performance -= 1
+    return performance, taken, x, y, cleaned, state
+
+
+@njit(parallel=True, cache=True)
+def run_episodes(walls, dirt, counted, starts, steps, choices, counts, seeds):
+    """run_episode for every layer of (n, height, width) grids, in parallel. Returns an (n, 6) int64 array."""
+    n = walls.shape[0]
+    results = np.zeros((n, 6), dtype=np.int64)
+    for i in prange(n):
+        performance, taken, x, y, cleaned, state = run_episode(
+            walls[i], dirt[i], counted[i], starts[i, 0], starts[i, 1], steps, choices, counts, seeds[i])
+        results[i, 0] = performance
+        results[i, 1] = taken
+        results[i, 2] = x
+        results[i, 3] = y
+        results[i, 4] = cleaned
+        results[i, 5] = state
+    return results
+
+
+def policy_arrays(policy):
+    """(choices, counts) arrays of a PolicyTable keyed by status_code."""
+    if policy.code is not status_code or not {'Clean', 'Dirty'} <= set(policy.table):
+        raise ValueError("The kernel only runs PolicyTables with status_code and both statuses.")
+    options = [policy.table[status] for status in ('Clean', 'Dirty')]
+    options = [list(choice) if isinstance(choice, tuple) else [choice] for choice in options]
+    choices = np.zeros((2, max(map(len, options))), dtype=np.int64)
+    for status, actions in enumerate(options):
+        choices[status, :len(actions)] = [ACTION_CODES[action] for action in actions]
+    return choices, np.array([len(actions) for actions in options], dtype=np.int64)
+
+
+def grids_of(env, start, until='clean', shape=None):
+    """(walls, dirt, counted) boolean grids of env, padded with walls to shape (height, width)."""
+    if until not in ('clean', 'reachable'):
+        raise ValueError("until must be either 'clean' or 'reachable'.")
+    height, width = shape or (env.height, env.width)
+    walls = np.ones((height, width), dtype=bool)
+    walls[:env.height, :env.width] = False
+    for thing in env.things:
+        if isinstance(thing, Wall) and env.is_valid_location(thing.location):
+            walls[thing.location[1], thing.location[0]] = True
+    dirt = np.zeros((height, width), dtype=bool)
+    for x, y in env.dirt_locations:
+        dirt[y, x] = True
+    if until == 'clean':
+        counted = np.ones((height, width), dtype=bool)
+    else:
+        counted = np.zeros((height, width), dtype=bool)
+        for x, y in env.reachable_cells(start):
+            counted[y, x] = True
+    return walls, dirt, counted
+
+
+def run_kernel(envs, agent_class, start=(1, 1), steps=100, until='clean', seeds=None, python=False):
+    """
+    Run one episode per environment of envs (left unchanged) with the policy of
+    agent_class (an agent factory with a status-coded policy_table, or the
+    PolicyTable itself), all starting at start. seeds are the generator seeds
+    (in 1..2^31 - 2; drawn from `random` by default). With python=True the
+    interpreted kernel is used even if Numba is installed.
+    Returns a dict of arrays: 'performance', 'steps', 'location' (n x 2),
+    'cleaned' and 'state' (final generator states).
+    """
+    policy = agent_class if isinstance(agent_class, PolicyTable) else getattr(agent_class(), 'policy_table', None)
+    if policy is None:
+        raise ValueError("The agent type has no policy_table.")
+    choices, counts = policy_arrays(policy)
+    n = len(envs)
+    shape = (max(env.height for env in envs), max(env.width for env in envs)) if n else (0, 0)
+    walls = np.zeros((n,) + shape, dtype=bool)
+    dirt = np.zeros((n,) + shape, dtype=bool)
+    counted = np.zeros((n,) + shape, dtype=bool)
+    for i, env in enumerate(envs):
+        walls[i], dirt[i], counted[i] = grids_of(env, start, until, shape)
+    if seeds is None:
+        seeds = [random.randrange(1, MODULUS) for _ in range(n)]
+    seeds = np.asarray(seeds, dtype=np.int64)
+    starts = np.tile(np.array(start, dtype=np.int64), (n, 1))
+    if HAVE_NUMBA and not python:
+        results = run_episodes(walls, dirt, counted, starts, steps, choices, counts, seeds)
+    else:
+        episode = getattr(run_episode, 'py_func', run_episode)
+        results = np.array([episode(walls[i], dirt[i], counted[i], int(start[0]), int(start[1]), steps,
+                                    choices, counts, int(seeds[i])) for i in range(n)], dtype=np.int64).reshape(n, 6)
+    return {'performance': results[:, 0], 'steps': results[:, 1], 'location': results[:, 2:4],
+            'cleaned': results[:, 4], 'state': results[:, 5]}
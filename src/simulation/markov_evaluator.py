@@ -0,0 +1,218 @@
+# markov_evaluator.py
+"""
+Exact expected performance of memoryless stochastic agents via Markov chains.
+
+The reflex, randomized and model-based grid agents choose their action from
+the current percept alone (sucking when the cell is dirty, otherwise a uniform
+random move), so on a fixed environment instance a run is a Markov chain over
+(position, remaining-dirt subset) states. Instead of averaging thousands of
+Monte Carlo trials, this module builds that chain and computes exact values:
+  - The transitions are stored sparsely as (source, target, probability)
+    index arrays; multiplying by the transition matrix is a np.bincount.
+  - Expected score, expected run length E[min(tau, T)] and the probability of
+    finishing within T steps follow from T backward iterations
+    V_t = r + P V_{t-1} (one sparse product each).
+  - For an unbounded horizon (steps=None) the absorbing-chain equations
+    (I - Q) x = r are solved with np.linalg.solve, or by iteration to
+    convergence for chains too large for a dense solve.
+States are numbered mask * positions + position, where bit i of mask is set
+while the i-th reachable dirty cell is still dirty. TrivialVacuumEnvironment
+(two cells, random initial dirt and start) is covered by evaluate_trivial.
+"""
+
+import numpy as np
+
+from src.berkeley_ai.agents import Wall, loc_A, loc_B
+from src.agents.occupancy_grid import MOVES
+
+# Action distributions (given the percept) of the memoryless grid agents.
+GRID_POLICIES = {
+    "Reflex": lambda location, status: [('Suck', 1.0)] if status == 'Dirty' else
+    [(action, 0.25) for action in ('Left', 'Right', 'Up', 'Down')],
+    "Random": lambda location, status: [('Suck', 1.0)] if status == 'Dirty' else
+    [(action, 0.2) for action in ('Left', 'Right', 'Up', 'Down', 'NoOp')],
+    "Model-Based": lambda location, status: [('Suck', 1.0)] if status == 'Dirty' else
+    [(action, 0.25) for action in ('Left', 'Right', 'Up', 'Down')],
+}
+
+# Action distributions of the stateless agents of TrivialVacuumEnvironment.
+TRIVIAL_POLICIES = {
+    "Reflex": lambda location, status: [('Suck', 1.0)] if status == 'Dirty' else
+    [('Right', 1.0)] if location == loc_A else [('Left', 1.0)],
+    "Random": lambda location, status: [(action, 0.25) for action in ('Right', 'Left', 'Suck', 'NoOp')],
+}
+
+# States above which the unbounded-horizon system is solved iteratively instead of densely.
+DENSE_LIMIT = 3000
+
+
+class MarkovChain:
+    """
+    A sparse Markov chain with expected one-step rewards.
+    Terminal states have no outgoing transitions, so every value is 0 there.
+    """
+
+    def __init__(self, size, source, target, probability, reward, terminal):
+        self.size = size
+        self.source = np.asarray(source, dtype=np.intp)
+        self.target = np.asarray(target, dtype=np.intp)
+        self.probability = np.asarray(probability, dtype=float)
+        self.reward = np.asarray(reward, dtype=float)
+        self.terminal = np.asarray(terminal, dtype=bool)
+
+    def propagate(self, values):
+        """(P values)[s] = sum over transitions s -> t of p * values[t]."""
+        return np.bincount(self.source, weights=self.probability * values[self.target], minlength=self.size)
+
+    def horizon_values(self, steps):
+        """
+        Expected total reward, expected number of steps before termination and
+        probability of terminating, each over at most `steps` steps, for every start state.
+        """
+        score = np.zeros(self.size)
+        time = np.zeros(self.size)
+        done = self.terminal.astype(float)
+        running = (~self.terminal).astype(float)
+        for _ in range(steps):
+            score = self.reward + self.propagate(score)
+            time = running + self.propagate(time)
+            done = np.where(self.terminal, 1.0, self.propagate(done))
+        return score, time, done
+
+    def absorbing_values(self, tolerance=1e-10, max_iterations=1000000):
+        """
+        Expected total reward and expected time to absorption over an unbounded
+        horizon, solving (I - Q) x = r on the transient states.
+        """
+        transient = ~self.terminal
+        if not self.terminal.any():
+            raise ValueError("The chain is not absorbing: some runs never terminate.")
+        if self.size <= DENSE_LIMIT:
+            matrix = np.zeros((self.size, self.size))
+            np.add.at(matrix, (self.source, self.target), -self.probability)
+            matrix[np.diag_indices(self.size)] += 1.0
+            keep = np.flatnonzero(transient)
+            system = matrix[np.ix_(keep, keep)]
+            score = np.zeros(self.size)
+            time = np.zeros(self.size)
+            score[keep] = np.linalg.solve(system, self.reward[keep])
+            time[keep] = np.linalg.solve(system, np.ones(len(keep)))
+            return score, time
+        score = np.zeros(self.size)
+        time = np.zeros(self.size)
+        running = transient.astype(float)
+        for _ in range(max_iterations):
+            new_score = self.reward + self.propagate(score)
+            new_time = running + self.propagate(time)
+            change = max(np.abs(new_score - score).max(), np.abs(new_time - time).max())
+            score, time = new_score, new_time
+            if change < tolerance:
+                return score, time
+        raise ValueError("The chain is not absorbing: some runs never terminate.")
+
+
+def grid_chain(env, policy, start=(1, 1), until='clean'):
+    """
+    Build the Markov chain of a memoryless policy on a ModifiedVacuumEnvironment
+    instance (moves and bumps cost 1, sucking dirt earns 100, NoOp is free).
+    Returns (chain, initial state index).
+    """
+    start = tuple(start)
+    cells = sorted(env.reachable_cells(start))
+    position = {cell: i for i, cell in enumerate(cells)}
+    dirt = [cell for cell in cells if cell in env.dirt_locations]
+    bit = {cell: i for i, cell in enumerate(dirt)}
+    blocked = {tuple(thing.location) for thing in env.things if isinstance(thing, Wall)}
+    unreachable_dirt = any(cell not in position for cell in env.dirt_locations)
+    n, masks = len(cells), np.arange(1 << len(dirt))
+    size = n << len(dirt)
+    reward = np.zeros(size)
+    terminal = np.zeros(size, dtype=bool)
+    if not (until == 'clean' and unreachable_dirt):
+        terminal[0:n] = True  # mask 0: all reachable dirt is cleaned
+    source, target, probability = [], [], []
+    for cell, p in position.items():
+        if cell in bit:
+            dirty = ((masks >> bit[cell]) & 1).astype(bool)
+        else:
+            dirty = np.zeros(len(masks), dtype=bool)
+        for status, selected in (('Dirty', masks[dirty]), ('Clean', masks[~dirty])):
+            states = selected * n + p
+            live = ~terminal[states]
+            selected, states = selected[live], states[live]
+            if len(states) == 0:
+                continue
+            for action, prob in policy(cell, status):
+                if action == 'Suck':
+                    next_masks = selected & ~(1 << bit[cell]) if status == 'Dirty' else selected
+                    next_cells = p
+                    reward[states] += prob * (100 if status == 'Dirty' else 0)
+                elif action == 'NoOp':
+                    next_masks, next_cells = selected, p
+                else:
+                    dx, dy = MOVES[action]
+                    moved = (cell[0] + dx, cell[1] + dy)
+                    if env.is_valid_location(moved) and moved not in blocked:
+                        next_cells = position[moved]
+                    else:
+                        next_cells = p
+                    next_masks = selected
+                    reward[states] -= prob
+                source.append(states)
+                target.append(next_masks * n + next_cells)
+                probability.append(np.full(len(states), prob))
+    chain = MarkovChain(size, np.concatenate(source), np.concatenate(target),
+                        np.concatenate(probability), reward, terminal)
+    return chain, (len(masks) - 1) * n + position[start]
+
+
+def evaluate(env, agent_name, start=(1, 1), steps=100, until='clean'):
+    """
+    Exact expected outcome of the memoryless agent agent_name (a key of
+    GRID_POLICIES) started at start in env, run for at most steps steps
+    (None for an unbounded horizon) as env.run(steps, until) would.
+    Returns a dict with the expected 'score', the expected number of steps
+    'time' = E[min(tau, steps)], the probability 'finished' of reaching the
+    termination condition within the horizon, and the number of 'states'.
+    """
+    chain, initial = grid_chain(env, GRID_POLICIES[agent_name], start, until)
+    if steps is None:
+        score, time = chain.absorbing_values()
+        return {'score': score[initial], 'time': time[initial], 'finished': 1.0, 'states': chain.size}
+    score, time, done = chain.horizon_values(steps)
+    return {'score': score[initial], 'time': time[initial], 'finished': done[initial], 'states': chain.size}
+
+
+def evaluate_trivial(agent_name, steps=1000):
+    """
+    Exact expected score of a stateless agent (a key of TRIVIAL_POLICIES) in
+    TrivialVacuumEnvironment over `steps` steps, averaged over the uniformly
+    random initial dirt and start location (+10 per dirt cleaned, -1 per move).
+    States are (location, dirt on A, dirt on B); the run never terminates early.
+    """
+    policy = TRIVIAL_POLICIES[agent_name]
+    locations = [loc_A, loc_B]
+    index = lambda location, mask: mask * 2 + locations.index(location)
+    source, target, probability, reward = [], [], [], np.zeros(8)
+    for mask in range(4):
+        for location in locations:
+            state = index(location, mask)
+            bit = 1 << locations.index(location)
+            status = 'Dirty' if mask & bit else 'Clean'
+            for action, prob in policy(location, status):
+                next_location, next_mask = location, mask
+                if action == 'Right':
+                    next_location = loc_B
+                    reward[state] -= prob
+                elif action == 'Left':
+                    next_location = loc_A
+                    reward[state] -= prob
+                elif action == 'Suck':
+                    next_mask = mask & ~bit
+                    reward[state] += prob * (10 if mask & bit else 0)
+                source.append(state)
+                target.append(index(next_location, next_mask))
+                probability.append(prob)
+    chain = MarkovChain(8, source, target, probability, reward, np.zeros(8, dtype=bool))
+    score, _, _ = chain.horizon_values(steps)
+    return score.mean()
@@ -0,0 +1,198 @@
+# optimal_solver.py
+"""
+Best achievable score of a ModifiedVacuumEnvironment instance.
+
+With the environment's scoring (every move costs 1, bumps included; sucking a
+dirty cell earns 100 and a NoOp or sucking a clean cell earns 0; the run stops
+once the dirt is cleaned), an optimal agent only ever moves along shortest
+paths between dirty cells. The optimum over a horizon of `steps` actions is
+therefore
+
+    max over dirt subsets S and orders:  100 * |S| - moves,
+    subject to moves + |S| <= steps (each Suck also takes a step).
+
+solve() computes it exactly with Held-Karp dynamic programming over
+(remaining-dirt bitmask, current dirt cell) states: states are the rows of one
+(2^m x (m+1)) integer table indexed by the bitmask, filled one popcount layer
+at a time with vectorized NumPy minimums. Shortest-path lengths come from BFS
+rows of the start and the dirty cells. Above EXACT_LIMIT dirty cells the exact
+table is too large, and solve() returns a bounded approximation instead: the score of a
+nearest-neighbour + 2-opt tour (achievable, so a lower bound) and an upper bound
+that charges every collected dirt at least the distance to its nearest other
+dirt cell or start.
+For small instances (grids of at most 64 cells with at most EXHAUSTIVE_LIMIT
+reachable dirty cells), exhaustive_score() computes the same exact optimum by a
+step-by-step search over bitboard (position, dirt mask) states, independently
+of the BFS distances. Its state space grows with 2^dirt, so it is only a
+cross-check for solve() on small instances.
+"""
+
+import numpy as np
+
+from src.environment.distance_oracle import bfs_rows, distance_dtype, layout_of
+from src.agents.coverage_agent import nearest_neighbour_tour, two_opt, passable_mask
+from src.environment.bitboard import BitboardWorld, MOVES, popcount
+
+DIRT_REWARD = 100
+EXACT_LIMIT = 16
+EXHAUSTIVE_LIMIT = 10  # the step-by-step layers take seconds at 8 dirty cells, minutes at 16
+INF = 10 ** 9
+BLOCK = 256  # BFS sources grown together per bfs_rows call
+
+
+def key_distances(env, start):
+    """
+    Shortest-path lengths between the start and the reachable dirty cells.
+    Returns (dirt locations, (m + 1) x (m + 1) int64 matrix with row/column 0 = start).
+    Only the m + 1 BFS rows needed are computed (see distance_oracle.bfs_rows,
+    in blocks of BLOCK sources), not an all-pairs table of the layout.
+    An agent placed on an obstacle may still step off it, so its distances go
+    through its open neighbours.
+    """
+    width, height, walls = layout_of(env)
+    passable = passable_mask(width, height, walls)
+    unreachable = np.iinfo(distance_dtype(width * height)).max
+
+    def rows(locations):
+        values = bfs_rows(passable, np.array([y * width + x for x, y in locations], dtype=np.intp)).astype(np.int64)
+        return np.where(values == unreachable, INF, values)
+
+    x, y = start
+    if passable[y, x]:
+        origins = [start]
+    else:
+        origins = [cell for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                   if env.is_valid_location(cell) and passable[cell[1], cell[0]]]
+    if not origins:
+        return [], np.zeros((1, 1), dtype=np.int64)
+    start_row = rows(origins).min(axis=0) + (0 if origins == [start] else 1)
+    dirt = [(dx, dy) for dx, dy in sorted(env.dirt_locations) if start_row[dy * width + dx] < INF]
+    index = np.array([dy * width + dx for dx, dy in dirt], dtype=np.intp)
+    distances = np.zeros((len(dirt) + 1, len(dirt) + 1), dtype=np.int64)
+    distances[0, 1:] = distances[1:, 0] = start_row[index]
+    for first in range(0, len(dirt), BLOCK):
+        block = dirt[first:first + BLOCK]
+        distances[1 + first:1 + first + len(block), 1:] = rows(block)[:, index]
+    return dirt, distances
+
+
+def held_karp(distances):
+    """
+    Minimum number of moves to clean exactly the dirt set `mask` and end on dirt
+    node j, for every (mask, j): returns a (2^m, m + 1) table (INF where invalid).
+    Dirt node j (1..m) is bit j - 1 of the mask; node 0 is the start.
+    """
+    m = len(distances) - 1
+    table = np.full((1 << m, m + 1), INF, dtype=np.int64)
+    table[0, 0] = 0
+    masks = np.arange(1 << m)
+    popcount = np.array([bin(mask).count('1') for mask in range(1 << m)])
+    for size in range(1, m + 1):
+        layer = masks[popcount == size]
+        for j in range(1, m + 1):
+            ending = layer[(layer >> (j - 1)) & 1 == 1]
+            previous = ending ^ (1 << (j - 1))
+            table[ending, j] = np.min(table[previous] + distances[:, j], axis=1)
+    return table, popcount
+
+
+def truncated_score(distances, order, steps):
+    """Best score of following order for at most `steps` actions, stopping after any dirt.
+    Returns (score, number of dirt nodes of order visited)."""
+    best, visited, moves, current = 0, 0, 0, 0
+    for count, node in enumerate(order, start=1):
+        moves += distances[current, node]
+        current = node
+        if moves + count > steps:
+            break
+        if DIRT_REWARD * count - moves > best:
+            best, visited = DIRT_REWARD * count - moves, count
+    return int(best), visited
+
+
+def upper_bound(distances, steps):
+    """
+    Relaxation bound: collecting dirt node i needs at least nn(i) moves, its
+    distance to the nearest other key cell. With the nn values sorted, the best
+    k-subset of the relaxation is the k smallest, so the bound is a prefix maximum.
+    """
+    masked = distances + np.diag(np.full(len(distances), INF))
+    nearest = np.sort(masked[1:].min(axis=1))
+    counts = np.arange(1, len(nearest) + 1)
+    moves = np.cumsum(nearest)
+    feasible = moves + counts <= steps
+    scores = np.where(feasible, DIRT_REWARD * counts - moves, 0)
+    return int(max(0, scores.max())) if len(scores) else 0
+
+
+def solve(env, start=(1, 1), steps=100, exact_limit=EXACT_LIMIT):
+    """
+    Best achievable score for an agent starting at start in env within steps actions.
+    Returns a dict:
+      - 'score': the optimum if 'exact', otherwise the best known achievable score;
+      - 'exact': whether the optimum was computed exactly;
+      - 'lower', 'upper': bounds on the optimum (equal to 'score' when exact);
+      - 'tour': dirt locations in the visiting order achieving 'score'.
+    """
+    dirt, distances = key_distances(env, start)
+    m = len(dirt)
+    if m <= exact_limit:
+        table, popcount = held_karp(distances)
+        scores = np.where(table + popcount[:, None] <= steps, DIRT_REWARD * popcount[:, None] - table, -INF)
+        scores[0, 0] = 0
+        mask, node = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        score = int(scores[mask, node])
+        return {'score': score, 'exact': True, 'lower': score, 'upper': score,
+                'tour': [dirt[j - 1] for j in backtrack(table, distances, int(mask), int(node))]}
+    order = two_opt(distances, nearest_neighbour_tour(distances))
+    lower, visited = truncated_score(distances, order, steps)
+    return {'score': lower, 'exact': False, 'lower': lower, 'upper': max(lower, upper_bound(distances, steps)),
+            'tour': [dirt[j - 1] for j in order[:visited]]}
+
+
+def backtrack(table, distances, mask, node):
+    """Dirt nodes in visiting order for the optimal (mask, node) state."""
+    order = []
+    while mask:
+        order.append(node)
+        previous = mask ^ (1 << (node - 1))
+        node = int(np.argmin(table[previous] + distances[:, node]))
+        mask = previous
+    return order[::-1]
+
+
+def score_fraction(score, solution):
+    """An agent's score as a fraction of the best achievable score (1.0 if that is 0)."""
+    return score / solution['score'] if solution['score'] else 1.0
+
+
+def exhaustive_score(env, start=(1, 1), steps=100, dirt_limit=EXHAUSTIVE_LIMIT):
+    """
+    Best achievable score of a small instance by dynamic programming over the
+    steps: layer t maps every (position, dirt mask) bitboard state reachable in
+    t steps to its best score. States without reachable dirt are final, and
+    bumps are never useful. Raises ValueError above dirt_limit reachable dirty
+    cells, where the layers grow too large (use solve() there).
+    """
+    world = BitboardWorld.from_env(env, start)
+    board, open_cells, reachable = world.board, world.open, world.reachable
+    if popcount(world.dirt & reachable) > dirt_limit:
+        raise ValueError("exhaustive_score handles at most {} reachable dirty cells.".format(dirt_limit))
+    layer = {world.key(): 0}
+    best = 0
+    for _ in range(steps):
+        successors = {}
+        for (position, dirt), score in layer.items():
+            if not dirt & reachable:
+                continue
+            moves = [(position, dirt & ~position, score + DIRT_REWARD)] if position & dirt else []
+            for action in MOVES:
+                target = board.shift(position, action)
+                if target & open_cells:
+                    moves.append((target, dirt, score - 1))
+            for target, remaining, value in moves:
+                if successors.get((target, remaining), -INF) < value:
+                    successors[(target, remaining)] = value
+                    best = max(best, value)
+        layer = successors
+    return best
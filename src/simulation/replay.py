@@ -0,0 +1,245 @@
+# replay.py
+"""
+Trace-driven replay of vacuum-world runs for any grid environment.
+
+Instead of stepping a live environment inside the animation callback (as
+visualize_two_location.py does), a run is first recorded into a StepTrace:
+the initial cell layout plus, for every step, the agent location, the cells
+whose state changed and the cumulative performance. The ReplayRenderer then
+plays the trace back:
+  - The grid is a single image artist; only cells that changed since the
+    previous frame are written into its backing array.
+  - The image, the agent marker and the status text are blitted, so the axes
+    are never cleared or rebuilt.
+  - Long traces are sub-sampled (several steps per frame) so they play in
+    real time at a fixed frame rate.
+  - Clips are exported offline to MP4 (ffmpeg) or GIF (Pillow), one at a time
+    or in batch with export_clips.
+"""
+
+import math
+import os
+
+import matplotlib.pyplot as plt
+import matplotlib.animation as animation
+import numpy as np
+from matplotlib.colors import ListedColormap, BoundaryNorm
+
+from src.berkeley_ai.agents import Agent, Dirt, Obstacle
+
+# Cell codes stored in a trace.
+CLEAN, DIRTY, OBSTACLE = 0, 1, 2
+CELL_COLORS = ['green', 'red', 'gray']
+
+
+def cell_states(env):
+    """
+    Return a {(x, y): code} dict for every cell that is not clean.
+    One pass over env.things, instead of calling list_things_at per cell.
+    Obstacles take precedence over dirt, as in visualize_environment_state.
+    """
+    cells = {}
+    for thing in env.things:
+        if isinstance(thing, Agent) or thing.location is None:
+            continue
+        location = tuple(thing.location)
+        if isinstance(thing, Obstacle):
+            cells[location] = OBSTACLE
+        elif isinstance(thing, Dirt) and cells.get(location) != OBSTACLE:
+            cells[location] = DIRTY
+    return cells
+
+
+class StepTrace:
+    """
+    A recorded run of a single agent in a grid environment.
+    Frame 0 is the initial state; frame i (i >= 1) is the state after step i.
+    For every frame the trace keeps the agent location, the cumulative
+    performance and the list of (x, y, code) cell changes relative to the
+    previous frame.
+    """
+
+    def __init__(self, width, height, initial_cells, start, performance=0):
+        self.width = width
+        self.height = height
+        self.initial = np.full((width, height), CLEAN, dtype=np.int8)
+        for (x, y), code in initial_cells.items():
+            if 0 <= x < width and 0 <= y < height:
+                self.initial[x, y] = code
+        self.locations = [tuple(start)]
+        self.performance = [performance]
+        self.changes = [[]]
+
+    def append(self, location, changes, performance):
+        """Record one step."""
+        self.locations.append(tuple(location))
+        self.changes.append(changes)
+        self.performance.append(performance)
+
+    def __len__(self):
+        """Number of frames (steps + 1)."""
+        return len(self.locations)
+
+    def final_cells(self):
+        """Return the cell-code array after the last recorded step."""
+        cells = self.initial.copy()
+        for changes in self.changes:
+            for x, y, code in changes:
+                cells[x, y] = code
+        return cells
+
+    def save(self, path):
+        """Save the trace as a compressed .npz file."""
+        frames = [i for i, changes in enumerate(self.changes) for _ in changes]
+        flat = [change for changes in self.changes for change in changes]
+        np.savez_compressed(
+            path,
+            initial=self.initial,
+            locations=np.array(self.locations, dtype=np.int32),
+            performance=np.array(self.performance, dtype=np.int64),
+            change_frames=np.array(frames, dtype=np.int32),
+            change_cells=np.array(flat, dtype=np.int32).reshape(-1, 3),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a trace written by save()."""
+        data = np.load(path)
+        initial = data['initial']
+        width, height = initial.shape
+        trace = cls(width, height, {}, tuple(data['locations'][0]))
+        trace.initial = initial.copy()
+        trace.locations = [tuple(int(v) for v in loc) for loc in data['locations']]
+        trace.performance = [int(p) for p in data['performance']]
+        trace.changes = [[] for _ in trace.locations]
+        for frame, (x, y, code) in zip(data['change_frames'], data['change_cells']):
+            trace.changes[frame].append((int(x), int(y), int(code)))
+        return trace
+
+
+def record_trace(env, agent=None, steps=1000):
+    """
+    Run env for up to steps steps and record a StepTrace for agent
+    (default: the first agent in env). The run stops early like the
+    environment's own run(): when it is clean (if it has is_clean) or done.
+    """
+    if agent is None:
+        agent = env.agents[0]
+    finished = env.is_clean if hasattr(env, 'is_clean') else env.is_done
+    previous = cell_states(env)
+    trace = StepTrace(env.width, env.height, previous, agent.location, agent.performance)
+    for _ in range(steps):
+        if finished():
+            break
+        env.step()
+        current = cell_states(env)
+        changes = [(x, y, code) for (x, y), code in current.items() if previous.get((x, y)) != code]
+        changes.extend((x, y, CLEAN) for (x, y) in previous if (x, y) not in current)
+        trace.append(agent.location, changes, agent.performance)
+        previous = current
+    return trace
+
+
+class ReplayRenderer:
+    """
+    Blitted playback of a StepTrace.
+
+    Parameters:
+      - fps: Fixed frame rate used for playback and export.
+      - steps_per_frame: Number of trace steps advanced per frame. If None it
+        is derived from max_duration so that long runs play in real time.
+      - max_duration: Target clip length in seconds when steps_per_frame is None.
+    """
+
+    def __init__(self, trace, title="Replay", fps=10, steps_per_frame=None, max_duration=20, ax=None):
+        self.trace = trace
+        self.title = title
+        self.fps = fps
+        if steps_per_frame is None:
+            steps_per_frame = max(1, math.ceil(len(trace) / (fps * max_duration)))
+        self.steps_per_frame = steps_per_frame
+        self.frames = list(range(0, len(trace), steps_per_frame))
+        if self.frames[-1] != len(trace) - 1:
+            self.frames.append(len(trace) - 1)
+
+        if ax is None:
+            size = min(8, max(3, trace.width / 2))
+            self.fig, self.ax = plt.subplots(figsize=(size, size * trace.height / trace.width))
+        else:
+            self.fig, self.ax = ax.figure, ax
+        self.cells = trace.initial.copy()
+        self.shown = 0
+        self.image = self.ax.imshow(
+            self.cells.T, origin='lower', extent=(0, trace.width, 0, trace.height),
+            cmap=ListedColormap(CELL_COLORS), norm=BoundaryNorm([-0.5, 0.5, 1.5, 2.5], 3),
+            interpolation='nearest', animated=True)
+        self.marker, = self.ax.plot([], [], 'ko', markersize=max(3, 120 / max(trace.width, trace.height)),
+                                    animated=True)
+        self.status = self.ax.text(0.01, 0.99, '', transform=self.ax.transAxes, va='top', ha='left',
+                                   fontsize=9, animated=True,
+                                   bbox=dict(facecolor='white', alpha=0.8, edgecolor='none'))
+        self.ax.set_title(title)
+        self.ax.set_aspect('equal')
+        self.ax.axis('off')
+
+    def _seek(self, frame):
+        """Bring the cell array to the given trace frame, touching only changed cells."""
+        if frame < self.shown:
+            self.cells[:] = self.trace.initial
+            self.shown = 0
+        for i in range(self.shown + 1, frame + 1):
+            for x, y, code in self.trace.changes[i]:
+                self.cells[x, y] = code
+        self.shown = frame
+
+    def _artists(self, frame):
+        self._seek(frame)
+        self.image.set_data(self.cells.T)
+        x, y = self.trace.locations[frame]
+        self.marker.set_data([x + 0.5], [y + 0.5])
+        self.status.set_text(f"Step {frame}/{len(self.trace) - 1}  Performance: {self.trace.performance[frame]}")
+        return self.image, self.marker, self.status
+
+    def _init(self):
+        return self._artists(0)
+
+    def animation(self):
+        """Return a blitted FuncAnimation over the trace."""
+        return animation.FuncAnimation(
+            self.fig, self._artists, frames=self.frames, init_func=self._init,
+            interval=1000 / self.fps, blit=True, repeat=False)
+
+    def show(self):
+        """Play the trace in the current matplotlib backend."""
+        ani = self.animation()
+        plt.show()
+        return ani
+
+    def save(self, path, fps=None, dpi=100):
+        """
+        Export the replay offline. The writer is chosen from the extension:
+        '.gif' uses Pillow, anything else (e.g. '.mp4') uses ffmpeg.
+        """
+        fps = fps or self.fps
+        if path.lower().endswith('.gif'):
+            writer = animation.PillowWriter(fps=fps)
+        else:
+            writer = animation.FFMpegWriter(fps=fps)
+        self.animation().save(path, writer=writer, dpi=dpi)
+        return path
+
+
+def export_clips(traces, out_dir=os.path.join("visualizations", "animations"), fmt='gif', fps=10,
+                 max_duration=20, dpi=100):
+    """
+    Export several traces in batch. traces maps a clip name to a StepTrace.
+    Returns the list of written file paths.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, trace in traces.items():
+        renderer = ReplayRenderer(trace, title=name, fps=fps, max_duration=max_duration)
+        filename = f"replay_{name.replace(' ', '_')}.{fmt}"
+        paths.append(renderer.save(os.path.join(out_dir, filename), dpi=dpi))
+        plt.close(renderer.fig)
+    return paths
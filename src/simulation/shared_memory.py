@@ -0,0 +1,167 @@
+# shared_memory.py
+"""
+Shared-memory data plane for running trials in parallel worker processes.
+
+With parallel_reduce every worker builds its own environments and sends its
+accumulators back pickled. Here the parent instead:
+  - publishes the environment layouts once, as one (trials, height, width)
+    uint8 grid (FREE, DIRT or WALL per cell) plus a (trials, 2) array of sizes,
+    which workers attach read-only;
+  - preallocates the result buffers, visit counts (workers, width, height) and
+    a final-score histogram (workers, bins), in shared memory. Worker k only
+    writes row k, so no locking is needed and nothing is serialized back.
+Arrays travel between processes as SharedArray descriptors (segment name,
+shape and dtype). The parent owns every segment and releases (unlinks) it
+when done. Each trial runs aggregation.run_visit_trial, the loop of
+run_simulation_heatmap.
+"""
+
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from src.environment.environment import ModifiedVacuumEnvironment
+from src.berkeley_ai.agents import Wall
+from src.simulation.aggregation import VisitAccumulator, run_visit_trial, split_trials
+
+FREE, DIRT, WALL = 0, 1, 2
+DIRT_REWARD_BOUND = 100  # reward of one dirty cell, for sizing the score histogram
+
+# Segments created or attached by this process, kept open while their arrays are in use.
+_ATTACHED = {}
+
+
+class SharedArray:
+    """Picklable description of a NumPy array living in a shared memory segment."""
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+
+    @classmethod
+    def create(cls, shape, dtype):
+        """Allocate a zeroed segment. Returns (descriptor, segment, array); the caller owns the segment."""
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        segment = shared_memory.SharedMemory(create=True, size=size)
+        array = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        array[...] = 0
+        _ATTACHED[segment.name] = segment  # attach() in this process reuses it
+        return cls(segment.name, shape, dtype), segment, array
+
+    def attach(self, readonly=False):
+        """View of the array in this process (read-only views refuse writes)."""
+        segment = _ATTACHED.get(self.name)
+        if segment is None:
+            segment = shared_memory.SharedMemory(name=self.name)
+            # The creating process owns the segment; do not let this process's exit unlink it.
+            resource_tracker.unregister(segment._name, 'shared_memory')
+            _ATTACHED[self.name] = segment
+        array = np.ndarray(self.shape, dtype=self.dtype, buffer=segment.buf)
+        if readonly:
+            array.flags.writeable = False
+        return array
+
+    def release(self, unlink=False):
+        """Close this process's handle on the segment; the owner also unlinks it."""
+        segment = _ATTACHED.pop(self.name, None)
+        if segment is not None:
+            segment.close()
+            if unlink:
+                segment.unlink()
+
+
+def encode_layouts(envs):
+    """(grids, sizes) arrays of environments: grids[i, y, x] is FREE, DIRT or WALL."""
+    height = max((env.height for env in envs), default=0)
+    width = max((env.width for env in envs), default=0)
+    grids = np.full((len(envs), height, width), WALL, dtype=np.uint8)
+    sizes = np.zeros((len(envs), 2), dtype=np.int32)
+    for i, env in enumerate(envs):
+        sizes[i] = (env.width, env.height)
+        grids[i, :env.height, :env.width] = FREE
+        for thing in env.things:
+            if isinstance(thing, Wall) and env.is_valid_location(thing.location):
+                grids[i, thing.location[1], thing.location[0]] = WALL
+        for x, y in env.dirt_locations:
+            grids[i, y, x] = DIRT
+    return grids, sizes
+
+
+def decode_layout(grids, sizes, i):
+    """Rebuild environment i from published layout arrays."""
+    width, height = (int(v) for v in sizes[i])
+    env = ModifiedVacuumEnvironment(width, height)
+    grid = grids[i]
+    for y, x in zip(*np.nonzero(grid[:height, :width] == WALL)):
+        env.add_obstacle((int(x), int(y)))
+    for y, x in zip(*np.nonzero(grid[:height, :width] == DIRT)):
+        env.add_dirt((int(x), int(y)))
+    return env
+
+
+def _shared_task(worker, first, count, seed, layouts, results, agent_class, steps, low, width):
+    """Run trials first .. first + count - 1 and accumulate into row `worker` of the result buffers."""
+    random.seed(seed)
+    grids, sizes = (array.attach(readonly=True) for array in layouts)
+    visits, histogram = (array.attach() for array in results)
+    for i in range(first, first + count):
+        agent = run_visit_trial(decode_layout(grids, sizes, i), agent_class, steps, visits[worker])
+        bin_index = min(max((agent.performance - low) // width, 0), histogram.shape[1] - 1)
+        histogram[worker, bin_index] += 1
+
+
+def aggregate_shared(agent_class, envs, steps=100, workers=1, bins=1024, seeds=None):
+    """
+    Run agent_class once on each environment of envs (split into chunks over
+    worker processes if workers > 1) through shared memory. seeds are the
+    chunks' random seeds (drawn from `random` by default); in-process runs
+    restore the caller's random state afterwards.
+    Returns (visits, histogram, edges): a VisitAccumulator of the summed visit
+    counts, the final-score histogram counts and their len(counts) + 1 bin edges.
+    """
+    if not envs:
+        raise ValueError("aggregate_shared needs at least one environment.")
+    grids, sizes = encode_layouts(envs)
+    low = -steps
+    high = DIRT_REWARD_BOUND * int(np.count_nonzero(grids == DIRT, axis=(1, 2)).max())
+    width = max(1, math.ceil((high - low + 1) / bins))
+    bins = math.ceil((high - low + 1) / width)
+    chunks = split_trials(len(envs), max(1, workers))
+    if seeds is None:
+        seeds = [random.randrange(2 ** 32) for _ in chunks]
+    layouts, results, buffers = [], [], []
+    try:
+        for array in (grids, sizes):
+            descriptor, _, shared = SharedArray.create(array.shape, array.dtype)
+            layouts.append(descriptor)
+            shared[...] = array
+        for shape, dtype in (((len(chunks), grids.shape[2], grids.shape[1]), np.int64),
+                             ((len(chunks), bins), np.int64)):
+            descriptor, _, shared = SharedArray.create(shape, dtype)
+            results.append(descriptor)
+            buffers.append(shared)
+        firsts = np.cumsum([0] + chunks[:-1]).tolist()
+        tasks = [(worker, first, count, seed, layouts, results, agent_class, steps, low, width)
+                 for worker, (first, count, seed) in enumerate(zip(firsts, chunks, seeds))]
+        if workers <= 1:
+            state = random.getstate()
+            try:
+                for task in tasks:
+                    _shared_task(*task)
+            finally:
+                random.setstate(state)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_shared_task, *zip(*tasks)))
+        visits = VisitAccumulator()
+        visits.total = buffers[0].sum(axis=0).astype(float)
+        visits.trials = len(envs)
+        histogram = buffers[1].sum(axis=0)
+        return visits, histogram, low + width * np.arange(bins + 1)
+    finally:
+        for descriptor in layouts + results:
+            descriptor.release(unlink=True)
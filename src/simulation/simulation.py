@@ -14,13 +14,15 @@ It addresses:
       - Randomized Reflex Agent (from src.berkeley_ai.agents.py, adapted via random_grid_agent.py)
       - Model-Based Reflex Agent (from src.berkeley_ai.agents.py, adapted via model_based_grid_agent.py)
       - BFS-based Rational Agent (from my_rational_agent.py)
+      - Full-knowledge Coverage Agent (from coverage_agent.py), as a reference
 
 Visualizations produced for each of two environments (default and worst-case) include:
   - Initial Environment State (cells showing clean, dirty, or obstacles)
   - Bar Charts (Average Performance with Error Bars)
   - Box Plots (Performance Distribution)
   - Line Charts (Time-Series of Cumulative Performance for each agent)
-  - Heatmaps (Spatial Visit Frequencies for each agent)
+  - Percentile-Band Line Charts (mean and 5/50/95 percentiles over many trials)
+  - Heatmaps (Spatial Visit Frequencies for each agent, aggregated over many trials)
 
 All figures are saved with descriptive filenames.
 """
@@ -37,6 +39,24 @@ from src.agents.reflex_grid_agent import ReflexGridAgent as ReflexAgent
 from src.agents.random_grid_agent import RandomGridAgent as RandomAgent
 from src.agents.model_based_grid_agent import ModelBasedGridAgent as ModelAgent
 from src.agents.my_rational_agent import RationalVacuumAgent as RationalAgent
+from src.agents.coverage_agent import CoverageAgent
+from src.simulation.aggregation import (VisitAccumulator, TimeSeriesAccumulator, parallel_reduce, run_visit_trial,
+                                        split_trials)
+from src.simulation.agent_stats import bootstrap_ci, summarize_agents
+from src.simulation.optimal_solver import solve, score_fraction
+from src.simulation.batch_runner import run_batch
+from src.simulation.grid_kernel import run_kernel
+from src.simulation.shared_memory import aggregate_shared
+from src.berkeley_ai.utils import reset_caches, dump_caches
+
+# Agent types compared in every experiment.
+AGENT_TYPES = {
+    "Reflex": ReflexAgent,
+    "Random": RandomAgent,
+    "Model-Based": ModelAgent,
+    "Rational": RationalAgent,
+    "Coverage": CoverageAgent
+}
 
 # --------------------------------------------------
 # Environment Factory Functions
@@ -156,32 +176,75 @@ def visualize_environment_state(env, title="Environment State", save_filename=No
 # Simulation Functions (Parameterized by Environment Factory)
 # --------------------------------------------------
 
-def run_simulation(agent_class, env_factory, steps=100, **env_kwargs):
+def run_simulation(agent_class, env_factory, steps=100, until='clean', detect_cycles=False, **env_kwargs):
     """
     Run a single simulation trial with the specified agent type and environment settings.
+    With until='reachable' the trial ends once all dirt reachable from the start is cleaned;
+    with detect_cycles=True deterministic loops are fast-forwarded (useful for long horizons).
     Returns the final performance score of the agent.
     """
     env = env_factory(**env_kwargs)
     agent = agent_class()
     # Place the agent at a fixed starting position.
     env.add_thing(agent, (1, 1))
-    env.run(steps)
+    env.run(steps, until=until, detect_cycles=detect_cycles)
     return agent.performance
 
+def run_simulation_metrics(agent_class, env_factory, steps=100, until='reachable', **env_kwargs):
+    """
+    Run a single simulation trial and return a metrics dictionary: the performance,
+    the number of steps taken and the dirt counts from dirt_metrics() (reachable
+    and unreachable dirt reported separately).
+    """
+    env = env_factory(**env_kwargs)
+    agent = agent_class()
+    env.add_thing(agent, (1, 1))
+    env.run(steps, until=until)
+    metrics = {'performance': agent.performance, 'steps': env.steps_taken}
+    metrics.update(env.dirt_metrics())
+    return metrics
+
+def run_simulation_optimality(agent_class, env_factory, steps=100, until='clean', **env_kwargs):
+    """
+    Run a single simulation trial and compare the agent's score with the best
+    achievable score on the same environment (see optimal_solver.solve).
+    Returns a dictionary with the performance, the optimal score, the fraction
+    performance / optimum and whether the optimum is exact.
+    """
+    env = env_factory(**env_kwargs)
+    solution = solve(env, (1, 1), steps)
+    agent = agent_class()
+    env.add_thing(agent, (1, 1))
+    env.run(steps, until=until)
+    return {'performance': agent.performance, 'optimal': solution['score'],
+            'fraction': score_fraction(agent.performance, solution), 'exact': solution['exact']}
+
+def run_simulation_batch(agent_class, env_factory, trials=100, steps=100, until='clean', **env_kwargs):
+    """
+    Run trials independent trials in lockstep (see batch_runner.run_batch), so
+    agents with a batch program decide for every trial in one call per step.
+    Returns the array of final performance scores.
+    """
+    envs = [env_factory(**env_kwargs) for _ in range(trials)]
+    return run_batch(agent_class, envs, (1, 1), steps, until)
+
+def run_simulation_kernel(agent_class, env_factory, trials=100, steps=100, until='clean', **env_kwargs):
+    """
+    Run trials trials of a table-policy agent (Reflex or Random) in the compiled
+    episode kernel (see grid_kernel.run_kernel; plain Python without Numba).
+    Returns the array of final performance scores.
+    """
+    envs = [env_factory(**env_kwargs) for _ in range(trials)]
+    return run_kernel(envs, agent_class, (1, 1), steps, until)['performance']
+
 def compare_agents(env_factory, trials=10, steps=100, **env_kwargs):
     """
-    Compare the four agent types over multiple trials using the provided environment factory.
+    Compare the agent types (AGENT_TYPES) over multiple trials using the provided environment factory.
     Returns a dictionary mapping agent name to (average performance, std deviation).
     (Addresses Exercise 2.14 by comparing different agent models.)
     """
-    agent_types = {
-        "Reflex": ReflexAgent,
-        "Random": RandomAgent,
-        "Model-Based": ModelAgent,
-        "Rational": RationalAgent
-    }
     results = {}
-    for name, agent_class in agent_types.items():
+    for name, agent_class in AGENT_TYPES.items():
         scores = [run_simulation(agent_class, env_factory, steps, **env_kwargs) for _ in range(trials)]
         avg = statistics.mean(scores)
         std = statistics.stdev(scores) if len(scores) > 1 else 0
@@ -189,46 +252,106 @@ def compare_agents(env_factory, trials=10, steps=100, **env_kwargs):
         print(f"{name}: Avg Performance = {avg:.2f}, Std Dev = {std:.2f}")
     return results
 
+def collect_scores(env_factory, trials=10, steps=100, seed=None, cold_caches=False, **env_kwargs):
+    """
+    Run every agent type on the same sequence of environment layouts.
+    Trial i re-seeds `random` identically for each agent before building the
+    environment, so the scores are paired by layout (as required by
+    agent_stats.paired_permutation_test).
+    With cold_caches=True every registered cache (see utils.Cache) is emptied
+    and its counters zeroed before each trial.
+    The trial seeds come from random.Random(seed), or from `random` itself when
+    seed is None; the caller's `random` state is restored afterwards, so only
+    those draws advance it.
+    Returns a dictionary mapping agent name to an array of scores.
+    """
+    rng = random if seed is None else random.Random(seed)
+    seeds = [rng.randrange(2 ** 32) for _ in range(trials)]
+    scores = {}
+    state = random.getstate()
+    try:
+        for name, agent_class in AGENT_TYPES.items():
+            values = []
+            for trial_seed in seeds:
+                if cold_caches:
+                    reset_caches()
+                random.seed(trial_seed)
+                values.append(run_simulation(agent_class, env_factory, steps, **env_kwargs))
+            scores[name] = np.array(values)
+    finally:
+        random.setstate(state)
+    return scores
+
+def compare_agents_stats(env_factory, trials=100, steps=100, seed=None, n_resamples=10000, **env_kwargs):
+    """
+    Compare the agent types with bootstrap confidence intervals and paired
+    permutation tests (see agent_stats.summarize_agents).
+    Returns (scores, stats); stats can be passed to plot_bar_chart.
+    """
+    scores = collect_scores(env_factory, trials, steps, seed, **env_kwargs)
+    stats = summarize_agents(scores, n_resamples=n_resamples, rng=seed)
+    for name, (estimate, low, high) in stats['ci'].items():
+        print(f"{name}: Avg Performance = {estimate:.2f}, "
+              f"{stats['confidence']:.0%} CI = [{low:.2f}, {high:.2f}]")
+    for (a, b), (diff, p_value) in stats['pairs'].items():
+        print(f"{a} vs {b}: mean difference = {diff:.2f}, p = {p_value:.4f}")
+    return scores, stats
+
 # --------------------------------------------------
 # Visualization Functions for Overall Performance
 # --------------------------------------------------
 
-def plot_bar_chart(results, env_label="default"):
+def plot_bar_chart(results, env_label="default", stats=None, alpha=0.05):
     """
-    Plot a bar chart with error bars (average performance with standard deviation) for the four agent types.
+    Plot a bar chart with error bars (average performance with standard deviation) for the agent types.
+    If stats (from compare_agents_stats) is given, the error bars show the bootstrap
+    confidence interval instead, and agent pairs that differ significantly at level
+    alpha are listed under the chart.
     Saves the plot as "bar_chart_{env_label}.png".
     """
     names = list(results.keys())
     avg_scores = [results[name][0] for name in names]
-    std_devs = [results[name][1] for name in names]
+    if stats is None:
+        errors = [results[name][1] for name in names]
+    else:
+        # Clip at zero in case results and stats were computed from different trials.
+        errors = [[max(avg - stats['ci'][name][1], 0) for name, avg in zip(names, avg_scores)],
+                  [max(stats['ci'][name][2] - avg, 0) for name, avg in zip(names, avg_scores)]]
     plt.figure(figsize=(8, 5))
-    plt.bar(names, avg_scores, yerr=std_devs, capsize=5, color='skyblue')
+    plt.bar(names, avg_scores, yerr=errors, capsize=5, color='skyblue')
     plt.xlabel('Agent Type')
-    plt.ylabel('Average Performance')
+    if stats is None:
+        plt.ylabel('Average Performance')
+    else:
+        plt.ylabel(f"Average Performance ({stats['confidence']:.0%} bootstrap CI)")
+        significant = [f"{a} vs {b}: p = {p:.3g}" for (a, b), (_, p) in stats['pairs'].items() if p < alpha]
+        if significant:
+            plt.figtext(0.5, -0.02, "Significant differences: " + "; ".join(significant),
+                        ha='center', va='top', fontsize=8, wrap=True)
     plt.title(f'Agent Performance Comparison ({env_label.capitalize()} Environment)')
     # Save to 'visualizations/bar_charts/'
     outpath = os.path.join("visualizations", "bar_charts", f"bar_chart_{env_label}.png")
     plt.savefig(outpath, bbox_inches="tight")
     plt.show()
 
-def compare_agents_boxplot(env_factory, trials=10, steps=100, **env_kwargs):
+def compare_agents_boxplot(env_factory, trials=10, steps=100, show_ci=False, **env_kwargs):
     """
     Run simulations for each agent type and generate a box plot showing the performance distribution.
+    If show_ci is True, each box is notched at the bootstrap confidence interval of its median.
     Saves the plot as "boxplot_{env_label}.png".
     (This visualization is professional and complements the bar charts.)
     """
-    agent_types = {
-        "Reflex": ReflexAgent,
-        "Random": RandomAgent,
-        "Model-Based": ModelAgent,
-        "Rational": RationalAgent
-    }
     data = {}
-    for name, agent_class in agent_types.items():
+    for name, agent_class in AGENT_TYPES.items():
         scores = [run_simulation(agent_class, env_factory, steps, **env_kwargs) for _ in range(trials)]
         data[name] = scores
     plt.figure(figsize=(8, 5))
-    plt.boxplot([data[name] for name in data.keys()], tick_labels=list(data.keys()))
+    if show_ci:
+        intervals = [bootstrap_ci(data[name], statistic='median')[1:] for name in data.keys()]
+        plt.boxplot([data[name] for name in data.keys()], tick_labels=list(data.keys()),
+                    notch=True, conf_intervals=intervals)
+    else:
+        plt.boxplot([data[name] for name in data.keys()], tick_labels=list(data.keys()))
     plt.xlabel('Agent Type')
     plt.ylabel('Performance Score')
     title = f"Performance Distribution per Agent Type ({env_kwargs.get('env_label', 'default').capitalize()} Environment)"
@@ -266,13 +389,30 @@ def run_simulation_time_series(agent_class, env_factory, steps=100, **env_kwargs
             break
     return performance_over_time
 
-def plot_time_series(time_series, agent_name, env_label="default"):
+def decimate(series, max_points=1000):
+    """
+    Thin a long series to at most about max_points points for plotting.
+    Returns (x, y) arrays; every k-th point is kept, plus the last one.
+    """
+    y = np.asarray(series)
+    x = np.arange(len(y))
+    if len(y) <= max_points:
+        return x, y
+    stride = -(-len(y) // max_points)
+    keep = np.arange(0, len(y), stride)
+    if keep[-1] != len(y) - 1:
+        keep = np.append(keep, len(y) - 1)
+    return x[keep], y[keep]
+
+def plot_time_series(time_series, agent_name, env_label="default", max_points=1000):
     """
     Plot a line chart showing cumulative performance over simulation steps.
+    Series longer than max_points are decimated so plotting stays fast.
     Saves the plot as "linechart_{agent_name}_{env_label}.png".
     """
+    x, y = decimate(time_series, max_points)
     plt.figure(figsize=(8, 5))
-    plt.plot(time_series, marker='o')
+    plt.plot(x, y, marker='o' if len(x) == len(time_series) else None)
     plt.xlabel('Simulation Step')
     plt.ylabel('Cumulative Performance')
     plt.title(f'Performance Over Time - {agent_name} ({env_label.capitalize()} Environment)')
@@ -283,15 +423,60 @@ def plot_time_series(time_series, agent_name, env_label="default"):
     plt.savefig(outpath, bbox_inches="tight")
     plt.show()
 
+def _time_series_task(trials, seed, agent_class, env_factory, steps, low, high, env_kwargs):
+    """Worker for aggregate_time_series: reduce one chunk of trials."""
+    random.seed(seed)
+    accumulator = TimeSeriesAccumulator(steps, low, high)
+    for _ in range(trials):
+        accumulator.add(run_simulation_time_series(agent_class, env_factory, steps, **env_kwargs))
+    return accumulator
+
+def aggregate_time_series(agent_class, env_factory, trials=100, steps=100, workers=1, **env_kwargs):
+    """
+    Run many time-series trials (in parallel if workers > 1) and reduce them into a
+    TimeSeriesAccumulator holding the per-step mean and percentile histogram.
+    Memory stays fixed regardless of the number of trials.
+    """
+    probe = env_factory(**env_kwargs)
+    # Cumulative performance never drops below -steps and is at most +100 per cell.
+    low, high = -steps, 100 * probe.width * probe.height
+    return parallel_reduce(_time_series_task, trials, workers,
+                           (agent_class, env_factory, steps, low, high, env_kwargs))
+
+def plot_time_series_bands(accumulator, agent_name, env_label="default", max_points=1000):
+    """
+    Plot the per-step mean and 5/50/95 percentile band of an aggregated time series.
+    Saves the plot as "linechart_bands_{agent_name}_{env_label}.png".
+    """
+    bands = accumulator.bands((5, 50, 95))
+    x, mean = decimate(bands['mean'], max_points)
+    _, p5 = decimate(bands[5], max_points)
+    _, p50 = decimate(bands[50], max_points)
+    _, p95 = decimate(bands[95], max_points)
+    plt.figure(figsize=(8, 5))
+    plt.fill_between(x, p5, p95, color='skyblue', alpha=0.4, label='5th-95th percentile')
+    plt.plot(x, p50, color='steelblue', label='Median')
+    plt.plot(x, mean, color='black', linestyle='--', label='Mean')
+    plt.xlabel('Simulation Step')
+    plt.ylabel('Cumulative Performance')
+    plt.title(f'Performance Over Time - {agent_name} ({env_label.capitalize()} Environment, '
+              f'{accumulator.trials} trials)')
+    plt.legend(loc='best')
+    plt.grid(True)
+    filename = f"linechart_bands_{agent_name.replace(' ', '_')}_{env_label}.png"
+    # Save to 'visualizations/line_charts/'
+    outpath = os.path.join("visualizations", "line_charts", filename)
+    plt.savefig(outpath, bbox_inches="tight")
+    plt.show()
+
 # --------------------------------------------------
 # Visualization Functions for Heatmaps
 # --------------------------------------------------
 
-def run_simulation_heatmap(agent_class, env_factory, steps=100, **env_kwargs):
+def heatmap_env(env_factory, **env_kwargs):
     """
-    Run a simulation and record the number of visits to each cell.
-    Returns a 2D numpy array representing cell visitation frequencies.
-    (Supports spatial visualization of agent behavior via a heatmap.)
+    An environment from env_factory with the heatmap trials' extra dirt (30%)
+    and obstacles (10%) scattered over its interior cells.
     """
     env = env_factory(**env_kwargs)
     for x in range(1, env.width - 1):
@@ -300,18 +485,58 @@ def run_simulation_heatmap(agent_class, env_factory, steps=100, **env_kwargs):
                 env.add_dirt((x, y))
             if random.random() < 0.1:
                 env.add_obstacle((x, y))
-    agent = agent_class()
-    env.add_thing(agent, (1, 1))
+    return env
+
+def run_simulation_heatmap(agent_class, env_factory, steps=100, **env_kwargs):
+    """
+    Run a simulation and record the number of visits to each cell.
+    Returns a 2D numpy array representing cell visitation frequencies.
+    (Supports spatial visualization of agent behavior via a heatmap.)
+    """
+    env = heatmap_env(env_factory, **env_kwargs)
     visits = np.zeros((env.width, env.height))
-    for _ in range(steps):
-        env.step()
-        x, y = agent.location
-        visits[x, y] += 1
-        if env.is_clean():
-            break
+    run_visit_trial(env, agent_class, steps, visits)
+    return visits
+
+def _heatmap_task(trials, seed, agent_class, env_factory, steps, env_kwargs):
+    """Worker for aggregate_heatmap: reduce one chunk of trials."""
+    random.seed(seed)
+    accumulator = VisitAccumulator()
+    for _ in range(trials):
+        accumulator.add(run_simulation_heatmap(agent_class, env_factory, steps, **env_kwargs))
+    return accumulator
+
+def aggregate_heatmap(agent_class, env_factory, trials=100, steps=100, workers=1, **env_kwargs):
+    """
+    Run many heatmap trials (in parallel if workers > 1) and sum their visit counts.
+    Returns a VisitAccumulator; use .normalized() or .mean() for plotting.
+    """
+    return parallel_reduce(_heatmap_task, trials, workers, (agent_class, env_factory, steps, env_kwargs))
+
+def aggregate_heatmap_shared(agent_class, env_factory, trials=100, steps=100, workers=1, **env_kwargs):
+    """
+    Like aggregate_heatmap, but the layouts are built once in this process and
+    shared with the workers, which write visit counts straight into shared
+    memory (see shared_memory.aggregate_shared). Returns a VisitAccumulator.
+    Each chunk's layouts are drawn from the chunk seed aggregate_heatmap would
+    use, so under the same random state an agent that draws no random numbers
+    gets the same heatmap from both (randomized agents get the same distribution).
+    """
+    sizes = split_trials(trials, workers)
+    seeds = [random.randrange(2 ** 32) for _ in sizes]
+    state = random.getstate()
+    envs, agent_seeds = [], []
+    try:
+        for n, seed in zip(sizes, seeds):
+            random.seed(seed)
+            envs.extend(heatmap_env(env_factory, **env_kwargs) for _ in range(n))
+            agent_seeds.append(random.randrange(2 ** 32))  # continue the stream, not replay it
+    finally:
+        random.setstate(state)
+    visits, _, _ = aggregate_shared(agent_class, envs, steps, workers, seeds=agent_seeds)
     return visits
 
-def plot_heatmap(data, agent_name, env_label="default"):
+def plot_heatmap(data, agent_name, env_label="default", colorbar_label='Visit Count'):
     """
     Plot a heatmap of cell visitation frequencies.
     Saves the plot as "heatmap_{agent_name}_{env_label}.png".
@@ -321,7 +546,7 @@ def plot_heatmap(data, agent_name, env_label="default"):
     plt.title(f'Agent Visit Heatmap - {agent_name} ({env_label.capitalize()} Environment)')
     plt.xlabel('X Coordinate')
     plt.ylabel('Y Coordinate')
-    plt.colorbar(label='Visit Count')
+    plt.colorbar(label=colorbar_label)
     filename = f"heatmap_{agent_name.replace(' ', '_')}_{env_label}.png"
     # Save to 'visualizations/heatmaps/'
     outpath = os.path.join("visualizations", "heatmaps", filename)
@@ -350,29 +575,30 @@ if __name__ == "__main__":
     }
     
     # For each environment, generate:
-    # 1 bar chart, 1 box plot, 4 line charts, and 4 heatmaps.
+    # 1 bar chart, 1 box plot, 8 line charts (single trial and percentile bands), and 4 heatmaps.
     for label, settings in env_settings.items():
         print(f"\n--- Generating visualizations for {label.capitalize()} Environment ---")
         env_factory = settings["env_factory"]
         env_kwargs = settings["env_kwargs"]
         
         # Bar Chart & Box Plot
-        results = compare_agents(env_factory, trials=20, steps=100, **env_kwargs)
-        plot_bar_chart(results, env_label=label)
-        compare_agents_boxplot(env_factory, trials=20, steps=100, **env_kwargs)
-        
-        # Agent types for time-series and heatmaps.
-        agent_types = {
-            "Reflex": ReflexAgent,
-            "Random": RandomAgent,
-            "Model-Based": ModelAgent,
-            "Rational": RationalAgent
-        }
+        scores, stats = compare_agents_stats(env_factory, trials=200, steps=100, **env_kwargs)
+        results = {name: (statistics.mean(values), statistics.stdev(values)) for name, values in scores.items()}
+        plot_bar_chart(results, env_label=label, stats=stats)
+        compare_agents_boxplot(env_factory, trials=20, steps=100, show_ci=True, **env_kwargs)
+        dump_caches()
+        reset_caches()
         
-        # For each agent type, generate a line chart and a heatmap.
-        for name, agent_class in agent_types.items():
+        # For each agent type, generate line charts and a heatmap.
+        # Band charts and heatmaps are aggregated over many trials.
+        for name, agent_class in AGENT_TYPES.items():
             ts = run_simulation_time_series(agent_class, env_factory, steps=100, **env_kwargs)
             plot_time_series(ts, name, env_label=label)
-            
-            hm = run_simulation_heatmap(agent_class, env_factory, steps=100, **env_kwargs)
-            plot_heatmap(hm, name, env_label=label)
+
+            bands = aggregate_time_series(agent_class, env_factory, trials=200, steps=100,
+                                          workers=os.cpu_count() or 1, **env_kwargs)
+            plot_time_series_bands(bands, name, env_label=label)
+
+            hm = aggregate_heatmap(agent_class, env_factory, trials=200, steps=100,
+                                   workers=os.cpu_count() or 1, **env_kwargs)
+            plot_heatmap(hm.normalized(), name, env_label=label, colorbar_label='Share of Visits')
@@ -0,0 +1,320 @@
+# sweep.py
+"""
+Coordinator/worker mode for parameter sweeps over TCP.
+
+The coordinator holds the queue of work units, each a JSON object
+{"id", "config", "agent", "seed", "steps"} naming an environment setting of
+CONFIGS and an agent type of AGENT_TYPES, and leases batches of them to
+workers. A worker runs each unit with run_simulation after random.seed(seed),
+so a unit's result does not depend on which worker ran it.
+
+Protocol: one JSON object per line, in both directions.
+  worker -> {"type": "lease", "worker": name, "max": n}
+     <- {"type": "work", "lease": id, "units": [...]}   up to n units
+     <- {"type": "wait", "retry": seconds}            all units are leased out
+     <- {"type": "done"}                                every unit has a result
+  worker -> {"type": "result", "lease": id, "id": unit id, "performance": score}
+  worker -> {"type": "error", "lease": id, "id": unit id, "error": text}
+     (no reply; results stream back while the worker keeps computing)
+A lease expires lease_timeout seconds after it was granted, and its unfinished
+units go back to the queue, as they do at once when the worker's connection
+drops. A unit may then run twice; the first result received is kept. A unit
+whose run raises is reported as an error and requeued until it has failed
+max_failures times; it is then given up and listed in Coordinator.failed.
+Results for ids that are not units of the sweep are ignored.
+Workers on other machines connect with
+    python -m src.simulation.sweep worker HOST PORT
+"""
+
+import itertools
+import json
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import Process
+
+from src.simulation.simulation import (
+    AGENT_TYPES,
+    default_env_factory,
+    worst_case_env_factory,
+    run_simulation,
+)
+
+# Named environment settings: name -> (factory, keyword arguments).
+CONFIGS = {
+    "default": (default_env_factory, {"env_width": 5, "env_height": 5}),
+    "worst": (worst_case_env_factory, {}),
+}
+
+LEASE_TIMEOUT = 30.0
+BATCH_SIZE = 8
+RETRY = 0.05
+MAX_FAILURES = 2
+POLL = 0.5  # seconds between checks of the alive() condition of Coordinator.wait
+
+
+def sweep_units(configs, agents, seeds, steps=100):
+    """Work units for every (config, agent, seed) combination."""
+    return [{"id": i, "config": config, "agent": agent, "seed": seed, "steps": steps}
+            for i, (config, agent, seed) in enumerate(itertools.product(configs, agents, seeds))]
+
+
+def run_unit(unit):
+    """Score of one work unit."""
+    factory, env_kwargs = CONFIGS[unit["config"]]
+    random.seed(unit["seed"])
+    return run_simulation(AGENT_TYPES[unit["agent"]], factory, unit["steps"], **env_kwargs)
+
+
+class SweepServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class Coordinator:
+    """
+    Leases work units to TCP workers and collects their results.
+    Use start() to serve in a background thread, wait() for the results
+    (a dict unit id -> performance) and close() to stop. Units given up after
+    max_failures error reports are in failed (a dict unit id -> last error).
+    """
+
+    def __init__(self, units, host="127.0.0.1", port=0, lease_timeout=LEASE_TIMEOUT, max_failures=MAX_FAILURES):
+        self.units = {unit["id"]: unit for unit in units}
+        self.queue = deque(self.units)
+        self.queued = set(self.units)  # unit ids in queue, so none is queued twice
+        self.leases = {}     # lease id -> (set of unfinished unit ids, deadline)
+        self.results = {}    # unit id -> performance
+        self.errors = {}     # unit id -> error reports received so far
+        self.failed = {}     # unit id -> last error, for units given up
+        self.lease_timeout = lease_timeout
+        self.max_failures = max_failures
+        self.next_lease = 0
+        self.changed = threading.Condition()
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator.serve(self.rfile, self.wfile)
+
+        self.server = SweepServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def finished(self):
+        """Whether every unit has a result or has been given up."""
+        return len(self.results) + len(self.failed) == len(self.units)
+
+    def wait(self, timeout=None, alive=None):
+        """
+        Block until every unit has a result or has been given up (reclaiming
+        expired leases meanwhile); return the results. Raises TimeoutError after
+        timeout seconds, and RuntimeError once the optional alive() turns false
+        (e.g. no worker is left to run the remaining units).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.changed:
+            while not self.finished():
+                if alive is not None and not alive():
+                    raise RuntimeError("No workers left with {} of {} units finished.".format(
+                        len(self.results), len(self.units)))
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("{} of {} units finished.".format(len(self.results), len(self.units)))
+                delay = min(self.lease_timeout, POLL) if alive is not None else self.lease_timeout
+                self.changed.wait(delay if remaining is None else min(remaining, delay))
+                self.reclaim()
+        return dict(self.results)
+
+    def reclaim(self, leases=None):
+        """Requeue the unfinished units of expired leases (or of the given leases). Call with self.changed held."""
+        now = time.monotonic()
+        for lease in list(self.leases if leases is None else leases):
+            if lease in self.leases and (leases is not None or self.leases[lease][1] <= now):
+                pending, _ = self.leases.pop(lease)
+                self.requeue(sorted(pending))
+
+    def requeue(self, units):
+        """Put units back at the front of the queue, in order, skipping those already queued. Call with self.changed held."""
+        for unit in reversed(units):
+            if unit not in self.queued:
+                self.queued.add(unit)
+                self.queue.appendleft(unit)
+
+    def grant(self, count):
+        """Answer a lease request."""
+        with self.changed:
+            self.reclaim()
+            if self.finished():
+                return {"type": "done"}
+            units = []
+            while self.queue and len(units) < count:
+                unit = self.queue.popleft()
+                self.queued.discard(unit)
+                if unit not in self.results and unit not in self.failed:
+                    units.append(unit)
+            if not units:
+                return {"type": "wait", "retry": RETRY}
+            lease = self.next_lease
+            self.next_lease += 1
+            self.leases[lease] = (set(units), time.monotonic() + self.lease_timeout)
+            return {"type": "work", "lease": lease, "units": [self.units[unit] for unit in units]}
+
+    def settle(self, lease, unit):
+        """Remove unit from the unfinished units of lease. Call with self.changed held."""
+        if lease in self.leases:
+            self.leases[lease][0].discard(unit)
+            if not self.leases[lease][0]:
+                del self.leases[lease]
+
+    def record(self, message):
+        """Store a streamed result (the first one received for a unit wins; unknown ids are ignored)."""
+        with self.changed:
+            unit = message["id"]
+            if unit not in self.units:
+                return
+            self.results.setdefault(unit, message["performance"])
+            self.failed.pop(unit, None)
+            self.settle(message["lease"], unit)
+            self.changed.notify_all()
+
+    def fail(self, message):
+        """Note an error report: requeue the unit, or give it up after max_failures reports."""
+        with self.changed:
+            unit = message["id"]
+            if unit not in self.units:
+                return
+            self.settle(message["lease"], unit)
+            if unit not in self.results and unit not in self.failed:
+                errors = self.errors.setdefault(unit, [])
+                errors.append(message.get("error"))
+                if len(errors) >= self.max_failures:
+                    self.failed[unit] = errors[-1]
+                else:
+                    self.requeue([unit])
+            self.changed.notify_all()
+
+    def serve(self, rfile, wfile):
+        """Handle one worker connection; its open leases are requeued when it drops."""
+        granted = set()
+        try:
+            for line in rfile:
+                message = json.loads(line)
+                if message["type"] == "lease":
+                    reply = self.grant(max(1, int(message.get("max", BATCH_SIZE))))
+                    if reply["type"] == "work":
+                        granted.add(reply["lease"])
+                    wfile.write((json.dumps(reply) + "\n").encode())
+                    wfile.flush()
+                elif message["type"] == "result":
+                    self.record(message)
+                elif message["type"] == "error":
+                    self.fail(message)
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            with self.changed:
+                self.reclaim(granted)
+                self.changed.notify_all()
+
+
+def run_worker(host, port, name=None, batch_size=BATCH_SIZE):
+    """
+    Lease and run work units from the coordinator at (host, port) until it
+    reports done; a unit that raises is reported as an error. Returns the
+    number of units run successfully.
+    """
+    name = name or "{}:{}".format(socket.gethostname(), id(object()))
+    done = 0
+    with socket.create_connection((host, port)) as connection:
+        rfile = connection.makefile("rb")
+        wfile = connection.makefile("wb")
+
+        def send(message):
+            wfile.write((json.dumps(message) + "\n").encode())
+            wfile.flush()
+
+        while True:
+            send({"type": "lease", "worker": name, "max": batch_size})
+            line = rfile.readline()
+            if not line:
+                return done
+            reply = json.loads(line)
+            if reply["type"] == "done":
+                return done
+            if reply["type"] == "wait":
+                time.sleep(reply["retry"])
+                continue
+            for unit in reply["units"]:
+                try:
+                    performance = run_unit(unit)
+                except Exception as error:
+                    send({"type": "error", "lease": reply["lease"], "id": unit["id"],
+                          "error": "{}: {}".format(type(error).__name__, error)})
+                    continue
+                send({"type": "result", "lease": reply["lease"], "id": unit["id"], "performance": performance})
+                done += 1
+
+
+def run_sweep(units, workers=2, lease_timeout=LEASE_TIMEOUT, batch_size=BATCH_SIZE, timeout=None,
+              max_failures=MAX_FAILURES):
+    """
+    Run units on `workers` local worker processes through a localhost
+    coordinator; return id -> performance. Raises RuntimeError if a unit is
+    given up after max_failures errors or every worker process exits first.
+    """
+    coordinator = Coordinator(units, lease_timeout=lease_timeout, max_failures=max_failures).start()
+    host, port = coordinator.address
+    processes = [Process(target=run_worker, args=(host, port, "local-{}".format(i), batch_size), daemon=True)
+                 for i in range(workers)]
+    try:
+        for process in processes:
+            process.start()
+        results = coordinator.wait(timeout, alive=lambda: any(process.is_alive() for process in processes))
+        if coordinator.failed:
+            raise RuntimeError("{} of {} units failed: {}".format(len(coordinator.failed), len(units), coordinator.failed))
+        return results
+    finally:
+        for process in processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        coordinator.close()
+
+
+if __name__ == "__main__":
+    # python -m src.simulation.sweep worker HOST PORT
+    # python -m src.simulation.sweep coordinator PORT [SEEDS]
+    if len(sys.argv) >= 4 and sys.argv[1] == "worker":
+        print("Ran {} units.".format(run_worker(sys.argv[2], int(sys.argv[3]))))
+    elif len(sys.argv) >= 3 and sys.argv[1] == "coordinator":
+        seeds = range(int(sys.argv[3]) if len(sys.argv) > 3 else 100)
+        units = sweep_units(list(CONFIGS), list(AGENT_TYPES), seeds)
+        coordinator = Coordinator(units, host="0.0.0.0", port=int(sys.argv[2])).start()
+        print("Serving {} units on port {}.".format(len(units), coordinator.address[1]))
+        results = coordinator.wait()
+        coordinator.close()
+        for unit, error in sorted(coordinator.failed.items()):
+            print("Unit {} failed: {}".format(unit, error))
+        for (config, agent), group in itertools.groupby(units, key=lambda unit: (unit["config"], unit["agent"])):
+            scores = [results[unit["id"]] for unit in group if unit["id"] in results]
+            if scores:
+                print("{} / {}: Avg Performance = {:.2f}".format(config, agent, sum(scores) / len(scores)))
+    else:
+        print(__doc__)
@@ -12,15 +12,34 @@ This suite tests:
 These tests help verify that the project meets the requirements from Exercises 2.11 and 2.14.
 """
 
+import copy
+import io
+import json
+import math
+import os
+import random
+import socket
+import tempfile
 import unittest
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 
-from src.environment.environment import ModifiedVacuumEnvironment
-from src.berkeley_ai.agents import Dirt, Wall
+from src.environment.environment import ModifiedVacuumEnvironment, MacroAction
+from src.environment.distance_oracle import DistanceOracle, layout_of, oracle_for
+from src.berkeley_ai.agents import (Dirt, Wall, GraphicEnvironment, ReflexVacuumAgent, PerceptTable,
+                                   TableDrivenAgentProgram, TableDrivenVacuumAgent, TrivialVacuumEnvironment,
+                                   Agent, Rule, RuleIndex, rule_match, SimpleReflexAgentProgram, loc_A, loc_B)
+from src.berkeley_ai.utils import PriorityQueue, IndexedPriorityQueue, Cache, memoize, cache_stats, reset_caches
 from src.agents.reflex_grid_agent import ReflexGridAgent
 from src.agents.random_grid_agent import RandomGridAgent
 from src.agents.model_based_grid_agent import ModelBasedGridAgent
 from src.agents.my_rational_agent import RationalVacuumAgent
+from src.agents.occupancy_grid import OccupancyGrid, FREE, OBSTACLE, UNKNOWN, MOVES
+from src.agents.exploration import FrontierExplorer
+from src.agents.hierarchical_planner import HierarchicalPlanner
+from src.agents.wavefront_planner import WavefrontPlanner, distance_field
+from src.agents.coverage_agent import CoverageAgent, nearest_neighbour_tour, two_opt, tour_length
 
 from src.simulation.simulation import (
     default_env_factory,
@@ -28,8 +47,28 @@ from src.simulation.simulation import (
     run_simulation,
     compare_agents,
     run_simulation_time_series,
-    run_simulation_heatmap
+    run_simulation_heatmap,
+    aggregate_heatmap,
+    aggregate_heatmap_shared,
+    aggregate_time_series,
+    decimate,
+    collect_scores,
+    run_simulation_metrics,
+    run_simulation_optimality,
+    AGENT_TYPES
 )
+from src.simulation.optimal_solver import solve, exhaustive_score, EXHAUSTIVE_LIMIT
+from src.environment.bitboard import Bitboard, BitboardWorld, popcount
+from src.simulation.markov_evaluator import evaluate, evaluate_trivial
+from src.simulation.batch_runner import run_batch
+from src.simulation.grid_kernel import run_kernel, HAVE_NUMBA, MODULUS, MULTIPLIER
+from src.simulation import shared_memory
+from src.simulation.shared_memory import SharedArray, aggregate_shared, encode_layouts, decode_layout
+from src.simulation.sweep import CONFIGS, Coordinator, run_sweep, run_unit, run_worker, sweep_units
+from src.agents.batch_policy import ACTIONS, CLEAN as BATCH_CLEAN, DIRTY as BATCH_DIRTY, encode_percepts
+from src.simulation.agent_stats import bootstrap_ci, paired_permutation_test, summarize_agents
+from src.simulation.aggregation import TimeSeriesAccumulator
+from src.simulation.replay import record_trace, ReplayRenderer, StepTrace, export_clips, DIRTY as REPLAY_DIRTY
 
 class TestEnvironmentFunctions(unittest.TestCase):
     def test_default_env_factory(self):
@@ -84,6 +123,403 @@ class TestAgentPerformance(unittest.TestCase):
         self.assertTrue(env.is_clean() or agent.performance > 0,
                         "RationalVacuumAgent should clean the environment or achieve positive performance.")
 
+class TestReachability(unittest.TestCase):
+    def _sealed_env(self):
+        """Dirt at (1, 1) is reachable; dirt at (4, 4) is sealed off by walls."""
+        env = ModifiedVacuumEnvironment(5, 5)
+        env.add_dirt((1, 1))
+        env.add_dirt((4, 4))
+        env.add_obstacle((3, 4))
+        env.add_obstacle((4, 3))
+        return env
+
+    def test_reachable_cells(self):
+        """The reachable component excludes walls and sealed cells but includes the start."""
+        env = self._sealed_env()
+        cells = env.reachable_cells((0, 0))
+        self.assertNotIn((4, 4), cells)
+        self.assertNotIn((3, 4), cells)
+        self.assertEqual(len(cells), 22)
+        self.assertIn((3, 4), env.reachable_cells((3, 4)))
+
+    def test_reachable_termination_and_metrics(self):
+        """until='reachable' stops after the reachable dirt is cleaned and reports dirt separately."""
+        env = self._sealed_env()
+        agent = ReflexGridAgent()
+        env.add_thing(agent, (1, 1))
+        env.run(steps=1000, until='reachable')
+        self.assertEqual(env.steps_taken, 1)
+        self.assertEqual(env.dirt_metrics(), {'reachable_dirt': 1, 'unreachable_dirt': 1,
+                                              'reachable_remaining': 0, 'cleaned': 1})
+
+    def test_run_simulation_metrics(self):
+        """The metrics of a trial account for every piece of dirt."""
+        metrics = run_simulation_metrics(RationalVacuumAgent, default_env_factory, steps=100, env_width=5, env_height=5)
+        self.assertLessEqual(metrics['steps'], 100)
+        self.assertLessEqual(metrics['cleaned'], metrics['reachable_dirt'])
+
+
+class TestDistanceOracle(unittest.TestCase):
+    def test_all_pairs_and_landmark_tables_agree(self):
+        """Both table kinds give the same shortest paths, and a second build loads from the cache."""
+        env = worst_case_env_factory()
+        env.add_obstacle((2, 0))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            exact = DistanceOracle(*layout_of(env), cache_dir=cache_dir)
+            alt = DistanceOracle(*layout_of(env), cache_dir=cache_dir, all_pairs_limit=0, landmarks=3)
+            self.assertEqual(exact.distance((0, 0), (4, 0)), 12)
+            self.assertEqual(exact.distance((0, 0), (1, 1)), math.inf)
+            for a in [(0, 0), (2, 2), (4, 4)]:
+                for b in [(4, 0), (0, 4), (2, 4)]:
+                    self.assertEqual(exact.distance(a, b), alt.distance(a, b))
+                    path = alt.path(a, b)
+                    self.assertEqual((path[0], path[-1], len(path) - 1), (a, b, exact.distance(a, b)))
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+            reloaded = DistanceOracle(*layout_of(env), cache_dir=cache_dir)
+            self.assertIsInstance(reloaded.table, np.memmap)
+
+    def test_registry_is_keyed_by_table_settings(self):
+        """oracle_for reuses an oracle only for the same layout and table settings."""
+        env = worst_case_env_factory()
+        exact = oracle_for(env)
+        self.assertIs(oracle_for(env), exact)
+        alt = oracle_for(env, all_pairs_limit=0, landmarks=2)
+        self.assertIsNot(alt, exact)
+        self.assertIsNone(alt.table)
+        self.assertEqual(len(alt.landmarks), 2)
+
+    def test_tables_stay_in_memory_without_cache_dir(self):
+        """Without a cache_dir the tables are plain arrays, and the landmark bound never overestimates."""
+        random.seed(2)
+        env = default_env_factory(env_width=9, env_height=7)
+        exact = DistanceOracle(*layout_of(env))
+        alt = DistanceOracle(*layout_of(env), all_pairs_limit=0, landmarks=3)
+        self.assertNotIsInstance(exact.table, np.memmap)
+        self.assertNotIsInstance(alt.landmark_table, np.memmap)
+        target = exact.index((7, 5))
+        h = alt.heuristic(target)
+        for cell in range(len(exact.passable)):
+            d = exact.table[cell, target]
+            if exact.passable[cell] and d != exact.unreachable:
+                self.assertLessEqual(h(cell), d)
+                self.assertEqual(alt.distance(exact.location(cell), (7, 5)), d)
+
+
+class TestCoverageAgent(unittest.TestCase):
+    def test_two_opt_improves_nearest_neighbour(self):
+        """2-opt never lengthens the greedy tour and removes its crossing."""
+        points = np.array([(0, 0), (1, 0), (3, 0), (2, 5), (0, 6), (4, 6)])
+        distances = np.abs(points[:, None] - points[None]).sum(axis=2)
+        greedy = nearest_neighbour_tour(distances)
+        improved = two_opt(distances, greedy)
+        self.assertEqual(sorted(improved), list(range(1, 6)))
+        self.assertLessEqual(tour_length(distances, improved), tour_length(distances, greedy))
+
+    def test_coverage_agent_cleans_reachable_dirt_and_caches_plan(self):
+        """The agent cleans all reachable dirt in the worst-case layout with the shortest tour,
+        and a second trial reuses the cached plan file."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                env = worst_case_env_factory()
+                agent = CoverageAgent(cache_dir=cache_dir)
+                env.add_thing(agent, (1, 1))
+                env.run(100, until='reachable')
+                self.assertTrue(env.is_reachable_clean())
+                self.assertEqual(agent.performance, 400 - 16)
+            self.assertEqual(len(os.listdir(os.path.join(cache_dir, "routes"))), 1)
+
+
+class TestOptimalSolver(unittest.TestCase):
+    def test_worst_case_optimum(self):
+        """From the obstacle at (1, 1) the best plan steps off it and sweeps the four corners."""
+        solution = solve(worst_case_env_factory(), (1, 1), steps=100)
+        self.assertTrue(solution['exact'])
+        self.assertEqual(solution['score'], 400 - 14)
+        self.assertEqual(solution['tour'][0], (0, 0))
+
+    def test_step_limit_and_bounds(self):
+        """A short horizon only allows part of the dirt; the approximation brackets the exact optimum."""
+        env = ModifiedVacuumEnvironment(6, 1)
+        for x in (1, 2, 5):
+            env.add_dirt((x, 0))
+        self.assertEqual(solve(env, (0, 0), steps=4)['score'], 200 - 2)
+        self.assertEqual(solve(env, (0, 0), steps=100)['score'], 300 - 5)
+        approx = solve(env, (0, 0), steps=100, exact_limit=0)
+        self.assertFalse(approx['exact'])
+        self.assertLessEqual(approx['lower'], 300 - 5)
+        self.assertGreaterEqual(approx['upper'], 300 - 5)
+
+    def test_agents_never_beat_the_optimum(self):
+        """Neither the rational nor the coverage agent scores above the computed optimum."""
+        random.seed(4)
+        for name in ["Rational", "Coverage"]:
+            result = run_simulation_optimality(AGENT_TYPES[name], default_env_factory, steps=100, env_width=5, env_height=5)
+            self.assertLessEqual(result['performance'], result['optimal'])
+
+
+class TestMarkovEvaluator(unittest.TestCase):
+    def test_trivial_reflex_agent(self):
+        """The reflex agent cleans each dirty cell once (+10) and moves on every other step (-1);
+        each cell starts dirty with probability 1/2, so the expected score is 11 * 1 - steps."""
+        self.assertAlmostEqual(evaluate_trivial("Reflex", steps=20), 11 - 20)
+
+    def test_corridor_random_walk(self):
+        """In a 2x1 corridor only one of the reflex agent's four random moves reaches
+        the dirt next to it, so that takes 4 moves on average, plus one Suck."""
+        env = ModifiedVacuumEnvironment(2, 1)
+        env.add_dirt((1, 0))
+        result = evaluate(env, "Reflex", start=(0, 0), steps=None)
+        self.assertAlmostEqual(result['time'], 5)
+        self.assertAlmostEqual(result['score'], 96)
+        self.assertAlmostEqual(evaluate(env, "Reflex", start=(0, 0), steps=200)['score'], 96)
+
+    def test_matches_monte_carlo(self):
+        """The exact expectation lies within the Monte Carlo confidence interval."""
+        random.seed(2)
+        base = default_env_factory(env_width=4, env_height=4)
+        exact = evaluate(base, "Random", steps=60, until='reachable')
+        scores = []
+        for _ in range(1000):
+            env = copy.deepcopy(base)
+            agent = RandomGridAgent()
+            env.add_thing(agent, (1, 1))
+            env.run(60, until='reachable')
+            scores.append(agent.performance)
+        self.assertLess(abs(np.mean(scores) - exact['score']), 5 * np.std(scores) / np.sqrt(len(scores)))
+
+
+class TestCycleDetection(unittest.TestCase):
+    def _bouncing_env(self):
+        """ReflexVacuumAgent shuttles between (0, 0) and (1, 0) and never reaches the dirt at (2, 0)."""
+        env = ModifiedVacuumEnvironment(3, 1)
+        env.add_dirt((2, 0))
+        agent = ReflexVacuumAgent()
+        env.add_thing(agent, (0, 0))
+        return env, agent
+
+    def test_fast_forward_matches_full_simulation(self):
+        """Fast-forwarding a deterministic cycle gives the same score, location and step count."""
+        for steps in (1000, 1001):
+            env, agent = self._bouncing_env()
+            env.run(steps)
+            fast_env, fast_agent = self._bouncing_env()
+            fast_env.run(steps, detect_cycles=True)
+            self.assertEqual(fast_agent.performance, agent.performance)
+            self.assertEqual(fast_agent.location, agent.location)
+            self.assertEqual(fast_env.steps_taken, env.steps_taken)
+            self.assertEqual(fast_env.cycle, (0, 2, -2))
+
+    def test_long_horizon_and_random_agents(self):
+        """A 100k-step deterministic run finishes immediately; random agents are never fast-forwarded."""
+        env, agent = self._bouncing_env()
+        env.run(100000, detect_cycles=True)
+        self.assertEqual(agent.performance, -100000)
+
+        random.seed(7)
+        env = ModifiedVacuumEnvironment(5, 5)
+        env.add_dirt((4, 4))
+        env.add_thing(RandomGridAgent(), (1, 1))
+        env.run(200, detect_cycles=True)
+        self.assertIsNone(env.cycle)
+
+
+class TestMacroActions(unittest.TestCase):
+    def _env(self):
+        env = ModifiedVacuumEnvironment(5, 5)
+        env.add_obstacle((3, 1))
+        env.add_dirt((1, 3))
+        return env
+
+    def test_macro_scores_like_single_steps(self):
+        """A macro is scored exactly like the same actions taken one step at a time, and stops on a bump."""
+        actions = ['Down', 'Right', 'Up', 'Right', 'Right', 'Left']
+        env = self._env()
+        single = RandomGridAgent()
+        env.add_thing(single, (1, 1))
+        for action in actions[:4]:
+            env.execute_action(single, action)
+
+        env = self._env()
+        agent = RandomGridAgent()
+        env.add_thing(agent, (1, 1))
+        macro = MacroAction(actions, stop_on_dirty=False)
+        consumed = env.execute_macro(agent, macro)
+        self.assertTrue(macro.bumped)
+        self.assertEqual(consumed, 4)
+        self.assertEqual((agent.performance, agent.location), (single.performance, single.location))
+
+    def test_macro_respects_dirt_and_budget(self):
+        """A macro stops on a dirty cell and never exceeds the remaining step budget."""
+        env = self._env()
+        agent = RandomGridAgent()
+        env.add_thing(agent, (1, 1))
+        macro = MacroAction(['Down', 'Down', 'Down'])
+        self.assertEqual(env.execute_macro(agent, macro), 2)
+        self.assertEqual(agent.location, (1, 3))
+        self.assertEqual(env.execute_macro(agent, MacroAction(['Up'] * 5, stop_on_dirty=False), budget=3), 3)
+
+    def test_rational_agent_with_macros(self):
+        """The macro-executing rational agent cleans the worst-case layout within the step budget."""
+        env = worst_case_env_factory()
+        agent = RationalVacuumAgent(macro=True)
+        env.add_thing(agent, (0, 2))
+        env.run(steps=100)
+        self.assertTrue(env.is_clean())
+        self.assertLessEqual(env.steps_taken, 100)
+
+
+class TestOccupancyGrid(unittest.TestCase):
+    def test_grid_grows_to_negative_coordinates(self):
+        """Cells far outside the initial grid, including negative ones, keep their states after growth."""
+        grid = OccupancyGrid(center=(0, 0), size=4)
+        grid.set_state((0, 0), FREE)
+        grid.set_state((-20, 3), OBSTACLE)
+        grid.set_state((15, -9), FREE)
+        self.assertEqual(grid.state((0, 0)), FREE)
+        self.assertEqual(grid.state((-20, 3)), OBSTACLE)
+        self.assertEqual(grid.state((15, -9)), FREE)
+        self.assertEqual(grid.state((100, 100)), UNKNOWN)
+
+    def test_bfs_to_unknown(self):
+        """BFS walks the known free cells around an obstacle and ends by stepping into the unknown."""
+        grid = OccupancyGrid(center=(0, 0))
+        for x in range(-1, 2):
+            for y in range(-1, 2):
+                grid.set_state((x, y), FREE)
+        for x in range(-2, 3):
+            for y in (-2, 2):
+                grid.set_state((x, y), OBSTACLE)
+        for y in range(-1, 2):
+            grid.set_state((-2, y), OBSTACLE)
+            grid.set_state((2, y), OBSTACLE)
+        self.assertIsNone(grid.bfs_to_unknown((0, 0)))
+        grid.set_state((2, 1), FREE)
+        self.assertEqual(grid.bfs_to_unknown((0, 0)), ['Right', 'Down', 'Right', 'Right'])
+
+
+class TestFrontierExplorer(unittest.TestCase):
+    def test_frontier_is_maintained_incrementally(self):
+        """Free cells bordering unknown cells are frontier cells; surrounding a cell removes it."""
+        grid = OccupancyGrid(center=(0, 0))
+        explorer = FrontierExplorer(grid)
+        for cell in [(0, 0), (1, 0)]:
+            grid.set_state(cell, FREE)
+            explorer.cell_changed(cell)
+        self.assertEqual(explorer.frontier, {(0, 0), (1, 0)})
+        for cell in [(-1, 0), (0, 1), (0, -1)]:
+            grid.set_state(cell, OBSTACLE)
+            explorer.cell_changed(cell)
+        self.assertEqual(explorer.frontier, {(1, 0)})
+
+    def test_cached_plan_is_reused(self):
+        """The plan is computed once and followed without replanning while it stays valid."""
+        grid = OccupancyGrid(center=(0, 0))
+        explorer = FrontierExplorer(grid)
+        for x in range(4):
+            grid.set_state((x, 0), FREE)
+            explorer.cell_changed((x, 0))
+        for x in range(4):
+            for y in (-1, 1):
+                grid.set_state((x, y), OBSTACLE)
+                explorer.cell_changed((x, y))
+        grid.set_state((-1, 0), OBSTACLE)
+        explorer.cell_changed((-1, 0))
+        location = (0, 0)
+        for _ in range(3):
+            plan = explorer.plan(location)
+            self.assertEqual(plan[0], 'Right')
+            explorer.advance(location, 'Right')
+            location = (location[0] + 1, 0)
+        self.assertEqual(explorer.replans, 1)
+
+    def test_planner_agents_clean_environment(self):
+        """The rational agent cleans an environment with obstacles with each exploration planner."""
+        for planner in ('incremental', 'hierarchical', 'wavefront'):
+            with self.subTest(planner=planner):
+                random.seed(3)
+                env = default_env_factory(env_width=8, env_height=8)
+                agent = RationalVacuumAgent(planner=planner)
+                env.add_thing(agent, (1, 1))
+                env.run(2000, until='reachable')
+                self.assertTrue(env.is_reachable_clean())
+
+    def test_hierarchical_search_crosses_clusters(self):
+        """The abstract-graph plan leads through a doorway in another cluster into unknown space."""
+        grid = OccupancyGrid(center=(0, 0))
+        planner = HierarchicalPlanner(grid, cluster_size=4)
+        for x in range(-1, 13):
+            for y in range(-1, 5):
+                inside = 0 <= x < 12 and 0 <= y < 4 and not (x == 6 and y != 2)
+                grid.set_state((x, y), FREE if inside else OBSTACLE)
+        grid.set_state((12, 1), UNKNOWN)
+        for x in range(-1, 13):
+            for y in range(-1, 5):
+                planner.cell_changed((x, y))
+        plan, target = planner.search((0, 0))
+        location = (0, 0)
+        for action in plan[:-1]:
+            dx, dy = MOVES[action]
+            location = (location[0] + dx, location[1] + dy)
+            self.assertEqual(grid.state(location), FREE)
+        self.assertEqual(location, (11, 1))
+        self.assertEqual(target, location)
+        self.assertEqual(plan[-1], 'Right')
+
+    def test_distance_field_matches_bfs(self):
+        """The vectorized wavefront gives BFS distances around obstacles and -1 where unreachable."""
+        free = np.zeros((5, 6), dtype=bool)
+        free[1:4, 1:5] = True
+        free[1:3, 2] = False
+        free[2, 4] = False
+        free[1, 4] = False
+        distance = distance_field(free, (1, 1))
+        self.assertEqual(distance[1, 3], 6)
+        self.assertEqual(distance[3, 4], 5)
+        self.assertEqual(distance[0, 0], -1)
+
+    def test_wavefront_search_matches_bfs_length(self):
+        """Wavefront plans are as short as the agent's BFS plans."""
+        random.seed(5)
+        grid = OccupancyGrid(center=(0, 0))
+        for x in range(10):
+            for y in range(10):
+                grid.set_state((x, y), OBSTACLE if random.random() < 0.2 else FREE)
+        grid.set_state((0, 0), FREE)
+        for planner in (WavefrontPlanner(grid), WavefrontPlanner(grid, gain_weight=0.5)):
+            plan, target = planner.search((0, 0))
+            location = (0, 0)
+            for action in plan[:-1]:
+                dx, dy = MOVES[action]
+                location = (location[0] + dx, location[1] + dy)
+                self.assertEqual(grid.state(location), FREE)
+            self.assertEqual(target, location)
+            self.assertEqual(grid.state((location[0] + MOVES[plan[-1]][0], location[1] + MOVES[plan[-1]][1])), UNKNOWN)
+        self.assertEqual(len(WavefrontPlanner(grid).search((0, 0))[0]), len(grid.bfs_to_unknown((0, 0))))
+
+    def test_wavefront_plan_to_known_dirt_is_kept(self):
+        """A plan to a known-dirty cell ends on it, survives each step and is found with no frontier left."""
+        grid = OccupancyGrid(center=(0, 0))
+        planner = WavefrontPlanner(grid)
+        for x in range(-1, 6):
+            for y in range(-1, 2):
+                grid.set_state((x, y), FREE if 0 <= x < 5 and y == 0 else OBSTACLE)
+                planner.cell_changed((x, y))
+        self.assertFalse(planner.frontier)
+        self.assertIsNone(planner.plan((0, 0)))
+        grid.set_status((3, 0), 'Dirty')
+        location = (0, 0)
+        self.assertEqual(len(planner.plan(location)), 3)
+        self.assertEqual(planner.target, (3, 0))
+        while planner.plan(location):
+            action = planner.plan(location)[0]
+            planner.advance(location, action)
+            location = (location[0] + MOVES[action][0], location[1] + MOVES[action][1])
+        self.assertEqual((location, planner.replans), ((3, 0), 1))
+
+    def test_unknown_planner_raises(self):
+        with self.assertRaises(ValueError):
+            RationalVacuumAgent(planner='dfs')
+
 class TestSimulationFunctions(unittest.TestCase):
     def test_run_simulation_time_series(self):
         """Test that the time-series function returns a non-empty list of numerical performance values."""
@@ -101,8 +537,592 @@ class TestSimulationFunctions(unittest.TestCase):
         """Test that compare_agents returns a dictionary with expected agent keys."""
         results = compare_agents(default_env_factory, trials=5, steps=50, env_width=5, env_height=5, env_label="default")
         self.assertIsInstance(results, dict)
-        for key in ["Reflex", "Random", "Model-Based", "Rational"]:
+        for key in ["Reflex", "Random", "Model-Based", "Rational", "Coverage"]:
             self.assertIn(key, results)
 
+class TestAggregation(unittest.TestCase):
+    def test_time_series_percentiles_are_exact_for_integer_bins(self):
+        """Histogram percentiles match numpy when every bin holds one integer value, and short series are padded."""
+        series = [[-1, -2, 97], [-1, 98], [-1, -2, -3]]
+        accumulator = TimeSeriesAccumulator(steps=3, low=-3, high=200)
+        for ts in series:
+            accumulator.add(ts)
+        padded = np.array([[-1, -2, 97], [-1, 98, 98], [-1, -2, -3]])
+        self.assertTrue(np.allclose(accumulator.mean(), padded.mean(axis=0)))
+        self.assertTrue(np.allclose(accumulator.percentile(50), np.percentile(padded, 50, axis=0, method='inverted_cdf')))
+
+    def test_parallel_aggregation_merges_all_trials(self):
+        """Aggregated heatmaps and time series count every trial across worker processes."""
+        hm = aggregate_heatmap(RandomGridAgent, default_env_factory, trials=6, steps=20, workers=2,
+                               env_width=5, env_height=5)
+        self.assertEqual(hm.trials, 6)
+        self.assertAlmostEqual(hm.normalized().sum(), 1.0)
+        ts = aggregate_time_series(RandomGridAgent, default_env_factory, trials=5, steps=20, workers=1,
+                                   env_width=5, env_height=5)
+        self.assertEqual(ts.trials, 5)
+        self.assertEqual(len(ts.bands()[95]), 20)
+
+    def test_in_process_aggregation_keeps_caller_random_state(self):
+        """Running the chunks in-process does not reseed the caller's random stream."""
+        random.seed(11)
+        random.randrange(2 ** 32)  # the one chunk seed parallel_reduce draws
+        expected = random.random()
+        random.seed(11)
+        aggregate_heatmap(RandomGridAgent, default_env_factory, trials=3, steps=10, workers=1,
+                          env_width=5, env_height=5)
+        self.assertEqual(random.random(), expected)
+
+    def test_decimate_long_series(self):
+        """Long series are thinned for plotting but keep their endpoints."""
+        x, y = decimate(list(range(5000)), max_points=500)
+        self.assertLessEqual(len(x), 501)
+        self.assertEqual((x[0], x[-1], y[-1]), (0, 4999, 4999))
+
+
+class TestAgentStats(unittest.TestCase):
+    def test_bootstrap_ci_brackets_the_mean(self):
+        """The bootstrap interval contains the sample mean and narrows with more data."""
+        rng = np.random.default_rng(0)
+        small = rng.normal(10, 5, size=20)
+        large = rng.normal(10, 5, size=2000)
+        est, low, high = bootstrap_ci(small, n_resamples=2000, rng=1)
+        self.assertTrue(low <= est <= high)
+        _, low_l, high_l = bootstrap_ci(large, n_resamples=2000, rng=1)
+        self.assertLess(high_l - low_l, high - low)
+
+    def test_paired_permutation_test(self):
+        """A consistent paired shift is significant; identical samples are not."""
+        rng = np.random.default_rng(0)
+        a = rng.normal(0, 1, size=50)
+        _, p_shift = paired_permutation_test(a + 1, a, n_resamples=5000, rng=2)
+        self.assertLess(p_shift, 0.001)
+        self.assertEqual(paired_permutation_test(a, a)[1], 1.0)
+
+    def test_summarize_paired_scores(self):
+        """collect_scores pairs layouts across agents and summarize_agents covers every pair."""
+        scores = collect_scores(default_env_factory, trials=4, steps=20, seed=3, env_width=5, env_height=5)
+        again = collect_scores(default_env_factory, trials=4, steps=20, seed=3, env_width=5, env_height=5)
+        self.assertTrue(all(np.array_equal(scores[name], again[name]) for name in scores))
+        random.seed(8)
+        unseeded = collect_scores(default_env_factory, trials=2, steps=10, env_width=5, env_height=5)
+        after = random.random()
+        random.seed(8)
+        repeated = collect_scores(default_env_factory, trials=2, steps=10, env_width=5, env_height=5)
+        self.assertTrue(all(np.array_equal(unseeded[name], repeated[name]) for name in unseeded))
+        random.seed(8)
+        random.randrange(2 ** 32), random.randrange(2 ** 32)  # the two trial seeds
+        self.assertEqual(random.random(), after)
+        stats = summarize_agents(scores, n_resamples=500, rng=0)
+        self.assertEqual(len(stats['pairs']), len(scores) * (len(scores) - 1) // 2)
+        self.assertEqual(set(stats['ci']), set(scores))
+
+
+class TestReplay(unittest.TestCase):
+    def _trace(self):
+        env = ModifiedVacuumEnvironment(4, 3)
+        env.add_dirt((1, 1))
+        env.add_dirt((2, 1))
+        env.add_obstacle((3, 2))
+        agent = ReflexGridAgent()
+        env.add_thing(agent, (1, 1))
+        return env, record_trace(env, agent, steps=30)
+
+    def test_trace_replays_final_state(self):
+        """Applying the recorded cell changes reproduces the environment's final dirt layout."""
+        env, trace = self._trace()
+        cells = trace.final_cells()
+        dirty = {(x, y) for x in range(4) for y in range(3) if cells[x, y] == REPLAY_DIRTY}
+        self.assertEqual(dirty, env.dirt_locations)
+        self.assertEqual(trace.performance[-1], env.agents[0].performance)
+
+    def test_trace_save_load_and_gif_export(self):
+        """Traces survive a save/load round trip and export to GIF offline."""
+        _, trace = self._trace()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.npz")
+            trace.save(path)
+            loaded = StepTrace.load(path)
+            self.assertEqual(loaded.locations, trace.locations)
+            self.assertTrue(np.array_equal(loaded.final_cells(), trace.final_cells()))
+            paths = export_clips({"reflex": loaded}, out_dir=tmp, fmt="gif", fps=5, dpi=20)
+            self.assertTrue(os.path.getsize(paths[0]) > 0)
+
+    def test_long_trace_is_subsampled(self):
+        """Long traces advance several steps per frame to play in real time."""
+        _, trace = self._trace()
+        renderer = ReplayRenderer(trace, fps=2, max_duration=1)
+        self.assertGreater(renderer.steps_per_frame, 1)
+        self.assertEqual(renderer.frames[-1], len(trace) - 1)
+
+
+class TestGraphicEnvironment(unittest.TestCase):
+    def test_draw_world_repaints_changed_cells(self):
+        """Moving a thing repaints its old cell with the background and its new cell with its color."""
+        env = GraphicEnvironment(4, 4, color={'Dirt': (255, 0, 0)})
+        dirt = Dirt()
+        env.add_thing(dirt, (1, 1))
+        env.draw_world()
+        self.assertEqual(env.grid[1, 1].rgb, (255, 0, 0))
+        dirt.location = (2, 3)
+        env.draw_world()
+        self.assertEqual(env.grid[1, 1].rgb, env.background)
+        self.assertEqual(env.grid[3, 2].rgb, (255, 0, 0))
+        self.assertEqual(env.painted, {(2, 3): (255, 0, 0)})
+
+    def test_frame_skipping_run(self):
+        """With fps set, run() steps at full speed and renders far fewer frames than steps."""
+        class CountingEnvironment(GraphicEnvironment):
+            frames = 0
+
+            def reveal(self):
+                self.frames += 1
+
+        env = CountingEnvironment(3, 3, fps=1)
+        env.add_thing(RandomGridAgent(), (1, 1))
+        env.execute_action = lambda agent, action: None
+        env.percept = lambda agent: (agent.location, 'Clean')
+        env.run(steps=200)
+        self.assertLessEqual(env.frames, 3)
+
+
+class TestIndexedPriorityQueue(unittest.TestCase):
+    def test_pops_in_the_same_order_as_priority_queue(self):
+        """With distinct items both queues pop the same sequence, for min and max order."""
+        random.seed(5)
+        items = random.sample(range(1000), 200)
+        for order in ('min', 'max'):
+            plain, indexed = PriorityQueue(order, f=lambda x: x % 97), IndexedPriorityQueue(order, f=lambda x: x % 97)
+            plain.extend(items)
+            indexed.extend(items)
+            for item in items[::7]:
+                del plain[item]
+                del indexed[item]
+            self.assertEqual(len(plain), len(indexed))
+            popped = [indexed.pop() for _ in range(len(indexed))]
+            self.assertEqual([x % 97 for x in popped], [plain.pop() % 97 for _ in range(len(plain))])
+        with self.assertRaises(Exception):
+            indexed.pop()
+
+    def test_decrease_key_and_lookup(self):
+        """Re-appending an item moves it to its new priority; membership and lookup follow it."""
+        cost = {'a': 5, 'b': 3, 'c': 8}
+        queue = IndexedPriorityQueue(f=lambda item: cost[item])
+        queue.extend(['a', 'b', 'c'])
+        self.assertIn('c', queue)
+        self.assertEqual(queue['c'], 8)
+        cost['c'] = 1
+        queue.decrease_key('c')
+        self.assertEqual(queue['c'], 1)
+        self.assertEqual(len(queue), 3)
+        self.assertEqual([queue.pop() for _ in range(3)], ['c', 'b', 'a'])
+        self.assertNotIn('c', queue)
+        with self.assertRaises(KeyError):
+            queue['c']
+        with self.assertRaises(KeyError):
+            del queue['c']
+
+
+class TestCache(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        """The least recently used entry is evicted first and every lookup is counted."""
+        cache = Cache('test.lru', maxsize=2)
+        cache['a'], cache['b'] = 1, 2
+        self.assertEqual(cache['a'], 1)
+        cache['c'] = 3
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertIn('test.lru', cache_stats())
+        reset_caches()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+
+    def test_ttl_and_byte_bound(self):
+        """Entries expire after ttl seconds; the byte bound evicts until the total fits."""
+        now = [0.0]
+        cache = Cache('test.ttl', ttl=10, clock=lambda: now[0])
+        cache['a'] = 1
+        now[0] = 9.0
+        self.assertEqual(cache.get('a'), 1)
+        now[0] = 10.0
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.expirations, 1)
+        sized = Cache('test.bytes', maxsize=None, max_bytes=2500)
+        for key in range(3):
+            sized[key] = np.zeros(100)  # 800 bytes each
+        sized[3] = np.zeros(100)
+        self.assertEqual((len(sized), sized.bytes, sized.evictions), (3, 2400, 1))
+        self.assertNotIn(0, sized)
+
+    def test_memoize_is_backward_compatible(self):
+        """memoize keeps its slot and lru_cache-style behaviour, now with an inspectable cache."""
+        calls = []
+
+        def square(x):
+            calls.append(x)
+            return x * x
+
+        memoized = memoize(square, maxsize=1)
+        self.assertEqual([memoized(2), memoized(2), memoized(3), memoized(2)], [4, 4, 9, 4])
+        self.assertEqual(calls, [2, 3, 2])
+        self.assertEqual(memoized.cache_info().hits, 1)
+        self.assertEqual(memoized.cache.evictions, 2)
+        memoized.cache_clear()
+        self.assertEqual(memoized.cache_info().currsize, 0)
+
+        class Holder:
+            pass
+
+        holder = Holder()
+        slotted = memoize(lambda obj: len(calls), slot='value')
+        self.assertEqual(slotted(holder), 3)
+        calls.append(0)
+        self.assertEqual(slotted(holder), 3)
+
+
+class TestPerceptTable(unittest.TestCase):
+    def _table(self):
+        random.seed(11)
+        percepts = [((x, 0), status) for x in range(2) for status in ('Clean', 'Dirty')]
+        return {tuple(random.choice(percepts) for _ in range(random.randint(1, 6))): random.choice(['Left', 'Right', 'Suck'])
+                for _ in range(300)}, percepts
+
+    def test_cursor_program_matches_history_lookup(self):
+        """The trie-backed program returns exactly table.get(tuple(history)) at every step."""
+        table, percepts = self._table()
+        program = TableDrivenAgentProgram(table)
+        history = []
+        for _ in range(40):
+            history.append(random.choice(percepts[:2]))
+            self.assertEqual(program(history[-1]), table.get(tuple(history)))
+        agent = TableDrivenVacuumAgent()
+        env = TrivialVacuumEnvironment()
+        env.add_thing(agent)
+        env.run()
+        self.assertEqual(set(env.status.values()), {'Clean'})
+
+    def test_save_and_load_round_trip(self):
+        """A saved table loads back with the same lookups; non-literal percepts are rejected."""
+        table, percepts = self._table()
+        trie = PerceptTable(table)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.npz')
+            trie.save(path)
+            loaded = PerceptTable.load(path)
+        self.assertEqual(len(loaded), len(trie))
+        for sequence, action in table.items():
+            self.assertEqual(loaded.get(sequence), action)
+        self.assertIsNone(loaded.get((percepts[0],) * 7))
+        with self.assertRaises(ValueError):
+            PerceptTable({(object(),): 'NoOp'}).save(io.BytesIO())
+
+
+class TestRuleIndex(unittest.TestCase):
+    def test_index_agrees_with_linear_rule_match(self):
+        """Indexed, predicate and unindexable rules together give the first matching rule."""
+        random.seed(2)
+        fields = {'x': range(4), 'y': range(4), 'status': ('Clean', 'Dirty')}
+        rules = []
+        for i in range(300):
+            chosen = random.sample(sorted(fields), random.randint(1, 3))
+            conditions = {field: random.choice(fields[field]) for field in chosen}
+            if i % 50 == 7:
+                rules.append(Rule(i, predicate=lambda state: state['x'] == state['y'], **conditions))
+            else:
+                rules.append(Rule(i, **conditions))
+        rules.append(Rule('list', x=[1]))
+        index = RuleIndex(rules)
+        self.assertEqual(len(index.opaque), 7)
+        for _ in range(300):
+            state = {field: random.choice(values) for field, values in fields.items()}
+            if random.random() < 0.1:
+                del state['y']
+            self.assertIs(index.match(state), rule_match(state, rules))
+
+    def test_reflex_program_with_compiled_rules(self):
+        """A rule-based reflex vacuum agent built from Rule objects cleans the two-cell world."""
+        rules = [Rule('Suck', status='Dirty'), Rule('Right', location=loc_A), Rule('Left')]
+        program = SimpleReflexAgentProgram(rules, lambda percept: {'location': percept[0], 'status': percept[1]})
+        env = TrivialVacuumEnvironment()
+        env.add_thing(Agent(program))
+        env.run(10)
+        self.assertEqual(set(env.status.values()), {'Clean'})
+
+
+class TestBatchPolicy(unittest.TestCase):
+    def test_batch_programs_follow_the_scalar_policies(self):
+        """Dirty rows get Suck, clean rows one of the agent's moves; the model-based agent records every row."""
+        percepts = encode_percepts([((1, 1), 'Dirty'), ((2, 1), 'Clean'), ((3, 2), 'Clean')] * 50)
+        for agent_class, moves in ((ReflexGridAgent, {'Left', 'Right', 'Up', 'Down'}),
+                                   (RandomGridAgent, {'Left', 'Right', 'Up', 'Down', 'NoOp'}),
+                                   (ModelBasedGridAgent, {'Left', 'Right', 'Up', 'Down'})):
+            agent = agent_class()
+            actions = [ACTIONS[code] for code in agent.batch_program(percepts)]
+            self.assertTrue(all(a == 'Suck' for a in actions[::3]))
+            self.assertEqual({a for i, a in enumerate(actions) if i % 3}, moves)
+        status = agent.batch_model['status']
+        self.assertEqual(status.shape, (150, 3, 4))
+        self.assertEqual((status[0, 1, 1], status[1, 1, 2], status[2, 0, 0]), (BATCH_DIRTY, BATCH_CLEAN, -1))
+
+    def test_scalar_agents_are_adapted_row_by_row(self):
+        """A deterministic scalar agent scores the same in a batch as in separate runs."""
+        random.seed(4)
+        envs = [default_env_factory(env_width=6, env_height=6) for _ in range(5)]
+        copies = copy.deepcopy(envs)
+        self.assertFalse(hasattr(RationalVacuumAgent(), 'batch_program'))
+        scores = run_batch(RationalVacuumAgent, envs, steps=60)
+        for env, score in zip(copies, scores):
+            agent = RationalVacuumAgent()
+            env.add_thing(agent, (1, 1))
+            env.run(60)
+            self.assertEqual(agent.performance, score)
+        random.seed(4)
+        batch = run_batch(ReflexGridAgent, [default_env_factory(env_width=6, env_height=6) for _ in range(20)], steps=60)
+        self.assertEqual(len(batch), 20)
+
+
+class TestPolicyTable(unittest.TestCase):
+    def test_table_matches_the_callable_policy(self):
+        """Table-driven reflex agents draw exactly what the original closures drew."""
+        program = ReflexVacuumAgent().policy_table
+        self.assertEqual([program(((0, 0), 'Dirty')), program((loc_A, 'Clean')), program((loc_B, 'Clean')),
+                          program(((5, 5), 'Clean'))], ['Suck', 'Right', 'Left', None])
+        for agent_class, moves in ((ReflexGridAgent, ['Left', 'Right', 'Up', 'Down']),
+                                   (RandomGridAgent, ['Left', 'Right', 'Up', 'Down', 'NoOp'])):
+            table = agent_class().policy_table
+            random.seed(9)
+            drawn = [table(((1, 1), status)) for status in ('Clean', 'Dirty') * 50]
+            random.seed(9)
+            expected = [random.choice(moves) if status == 'Clean' else 'Suck' for status in ('Clean', 'Dirty') * 50]
+            self.assertEqual(drawn, expected)
+
+    def test_environment_applies_table_inline(self):
+        """The run loop uses the table without calling the program, with the same outcome."""
+        scores = []
+        for inline in (True, False):
+            random.seed(6)
+            env = default_env_factory(env_width=6, env_height=6)
+            agent = RandomGridAgent()
+            if not inline:
+                agent.program = lambda percept, table=agent.policy_table: table(percept)
+            env.add_thing(agent, (1, 1))
+            env.run(80)
+            scores.append((agent.performance, agent.location, random.random()))
+        self.assertEqual(scores[0], scores[1])
+
+
+class TestGridKernel(unittest.TestCase):
+    def _envs(self):
+        random.seed(1)
+        return [default_env_factory(env_width=random.randint(3, 8), env_height=random.randint(3, 8)) for _ in range(25)]
+
+    def test_kernel_matches_environment_run(self):
+        """With the same generator driving a scalar agent, the kernel reproduces env.run exactly."""
+        envs = self._envs()
+        for until in ('clean', 'reachable'):
+            result = run_kernel(envs, RandomGridAgent, steps=200, until=until, seeds=range(1, 26), python=True)
+            for i, env in enumerate(copy.deepcopy(envs)):
+                state = [i + 1]
+                moves = ['Left', 'Right', 'Up', 'Down', 'NoOp']
+
+                def program(percept):
+                    if percept[1] == 'Dirty':
+                        return 'Suck'
+                    state[0] = state[0] * MULTIPLIER % MODULUS
+                    return moves[state[0] * len(moves) // MODULUS]
+
+                agent = Agent(program)
+                env.add_thing(agent, (1, 1))
+                env.run(200, until=until)
+                self.assertEqual((agent.performance, env.steps_taken, tuple(agent.location), state[0]),
+                                 (result['performance'][i], result['steps'][i], tuple(result['location'][i]),
+                                  result['state'][i]))
+        with self.assertRaises(ValueError):
+            run_kernel(envs, ReflexVacuumAgent)
+
+    @unittest.skipUnless(HAVE_NUMBA, "Numba is not installed")
+    def test_compiled_kernel_is_bit_identical(self):
+        """The Numba kernel and the interpreted kernel give the same episodes."""
+        envs = self._envs()
+        compiled = run_kernel(envs, ReflexGridAgent, steps=500, seeds=range(1, 26))
+        interpreted = run_kernel(envs, ReflexGridAgent, steps=500, seeds=range(1, 26), python=True)
+        for key in compiled:
+            np.testing.assert_array_equal(compiled[key], interpreted[key])
+
+
+class TestBitboard(unittest.TestCase):
+    def test_shifts_flood_fill_and_reachability(self):
+        """Edge-masked shifts drop cells leaving the grid; the flood fill agrees with the environment's BFS."""
+        board = Bitboard(5, 4)
+        corner = board.bit((4, 0))
+        self.assertEqual(board.shift(corner, 'Right'), 0)
+        self.assertEqual(board.shift(corner, 'Up'), 0)
+        self.assertEqual(board.location(board.shift(corner, 'Left')), (3, 0))
+        self.assertEqual(popcount(board.neighbours(board.bit((2, 2)))), 4)
+        random.seed(8)
+        for _ in range(20):
+            env = default_env_factory(env_width=8, env_height=8)
+            walls = {tuple(thing.location) for thing in env.things if isinstance(thing, Wall)}
+            seen, frontier = {(1, 1)}, [(1, 1)]
+            while frontier:
+                x, y = frontier.pop()
+                for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if cell not in seen and cell not in walls and env.is_valid_location(cell):
+                        seen.add(cell)
+                        frontier.append(cell)
+            self.assertEqual(env.reachable_cells((1, 1)), frozenset(seen))
+
+    def test_world_and_search_match_environment(self):
+        """A bitboard episode scores like env.run, and the state search finds the Held-Karp optimum."""
+        for seed in range(10):
+            random.seed(seed)
+            env = default_env_factory(env_width=6, env_height=6)
+            world = BitboardWorld.from_env(env, (1, 1))
+            self.assertEqual(world.is_clean(), env.is_clean())
+            agent = RandomGridAgent()
+            env.add_thing(agent, (1, 1))
+            env.run(60, until='reachable')
+            random.seed(seed)
+            default_env_factory(env_width=6, env_height=6)  # replay the layout's random draws
+            world.run(RandomGridAgent().program, 60, until='reachable')
+            self.assertEqual((world.performance, world.location, world.steps_taken),
+                             (agent.performance, agent.location, env.steps_taken))
+            self.assertLessEqual(world.coverage(), len(env.reachable_cells((1, 1))))
+        random.seed(3)
+        env = default_env_factory(env_width=5, env_height=5)
+        self.assertEqual(exhaustive_score(env, (1, 1), 30), solve(env, (1, 1), 30)['score'])
+        random.seed(5)
+        with self.assertRaises(ValueError):
+            exhaustive_score(default_env_factory(env_width=8, env_height=8), (1, 1), 100)
+
+    def test_exhaustive_score_at_its_dirt_limit(self):
+        """EXHAUSTIVE_LIMIT dirty cells are still searched exactly; one more is refused."""
+        env = ModifiedVacuumEnvironment(7, 7)
+        for x in range(1, 6):
+            env.add_dirt((x, 1))
+            env.add_dirt((x, 5))
+        self.assertEqual(len(env.dirt_locations), EXHAUSTIVE_LIMIT)
+        self.assertEqual(exhaustive_score(env, (3, 3), 20), solve(env, (3, 3), 20)['score'])
+        env.add_dirt((3, 3))
+        with self.assertRaises(ValueError):
+            exhaustive_score(env, (3, 3), 20)
+
+
+class TestSharedMemory(unittest.TestCase):
+    def test_layouts_round_trip_through_shared_memory(self):
+        """Published layouts rebuild identical environments from a read-only view."""
+        random.seed(12)
+        envs = [default_env_factory(env_width=5, env_height=5), default_env_factory(env_width=7, env_height=4)]
+        grids, sizes = encode_layouts(envs)
+        descriptor, _, shared = SharedArray.create(grids.shape, grids.dtype)
+        try:
+            shared[...] = grids
+            view = descriptor.attach(readonly=True)
+            with self.assertRaises(ValueError):
+                view[0, 0, 0] = 1
+            for i, env in enumerate(envs):
+                rebuilt = decode_layout(view, sizes, i)
+                self.assertEqual(layout_of(rebuilt), layout_of(env))
+                self.assertEqual(rebuilt.dirt_locations, env.dirt_locations)
+        finally:
+            descriptor.release(unlink=True)
+        self.assertNotIn(descriptor.name, shared_memory._ATTACHED)
+
+    def test_workers_accumulate_into_shared_buffers(self):
+        """Each trial adds one histogram entry and one visit per step taken, with or without workers."""
+        random.seed(13)
+        envs = [default_env_factory(env_width=5, env_height=5) for _ in range(12)]
+        for workers in (1, 2):
+            visits, histogram, edges = aggregate_shared(RationalVacuumAgent, envs, steps=40, workers=workers)
+            self.assertEqual(visits.trials, 12)
+            self.assertEqual(histogram.sum(), 12)
+            self.assertEqual(len(edges), len(histogram) + 1)
+            expected = [run_simulation_metrics(RationalVacuumAgent, lambda env=env: copy.deepcopy(env), 40,
+                                               until='clean')['steps'] for env in envs]
+            self.assertEqual(visits.total.sum(), sum(expected))
+
+    def test_shared_heatmap_matches_aggregate_heatmap(self):
+        """Under the same seed both heatmap aggregations build the same layouts, so a deterministic agent's visits agree."""
+        for workers in (1, 2):
+            random.seed(21)
+            expected = aggregate_heatmap(CoverageAgent, default_env_factory, trials=6, steps=30, workers=workers,
+                                         env_width=6, env_height=6)
+            after = random.random()
+            random.seed(21)
+            shared = aggregate_heatmap_shared(CoverageAgent, default_env_factory, trials=6, steps=30, workers=workers,
+                                              env_width=6, env_height=6)
+            self.assertEqual(shared.trials, expected.trials)
+            np.testing.assert_array_equal(shared.total, expected.total)
+            self.assertEqual(random.random(), after)
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.units = sweep_units(['default', 'worst'], ['Reflex', 'Rational'], range(3), steps=30)
+        self.direct = {unit['id']: run_unit(unit) for unit in self.units}
+
+    def test_local_workers_reproduce_direct_runs(self):
+        """Worker processes on localhost return the same score for every unit as running it directly."""
+        self.assertEqual(run_sweep(self.units, workers=2, batch_size=2, timeout=60), self.direct)
+
+    def test_dead_and_hung_workers_lose_their_leases(self):
+        """Units leased by a disconnected worker are requeued at once, those of a hung worker on timeout."""
+        coordinator = Coordinator(self.units, lease_timeout=0.3).start()
+        try:
+            with socket.create_connection(coordinator.address) as dead:
+                dead.sendall(b'{"type": "lease", "worker": "dead", "max": 3}\n')
+                dead.makefile('rb').readline()
+            hung = socket.create_connection(coordinator.address)
+            hung.sendall(b'{"type": "lease", "worker": "hung", "max": 3}\n')
+            self.assertEqual(json.loads(hung.makefile('rb').readline())['type'], 'work')
+            self.assertEqual(run_worker(*coordinator.address, batch_size=4), len(self.units))
+            self.assertEqual(coordinator.wait(5), self.direct)
+            hung.close()
+        finally:
+            coordinator.close()
+
+    def test_failing_units_are_reported_and_given_up(self):
+        """A unit that raises is retried up to max_failures times, then given up; stray result ids are ignored."""
+        bad = {"id": len(self.units), "config": "missing", "agent": "Reflex", "seed": 0, "steps": 30}
+        coordinator = Coordinator(self.units + [bad], max_failures=2).start()
+        try:
+            coordinator.record({"type": "result", "lease": 0, "id": 999, "performance": 0})
+            self.assertNotIn(999, coordinator.results)
+            self.assertEqual(run_worker(*coordinator.address, batch_size=4), len(self.units))
+            self.assertEqual(coordinator.wait(5), self.direct)
+            self.assertEqual(list(coordinator.failed), [bad["id"]])
+            self.assertIn("KeyError", coordinator.failed[bad["id"]])
+            self.assertEqual(len(coordinator.errors[bad["id"]]), 2)
+        finally:
+            coordinator.close()
+        with self.assertRaises(RuntimeError):
+            run_sweep([bad] + self.units[:3], workers=2, batch_size=2, timeout=60)
+
+    def test_reclaimed_unit_is_queued_once(self):
+        """An error report for a unit already requeued from its expired lease does not queue it twice."""
+        coordinator = Coordinator(self.units, lease_timeout=0)
+        try:
+            with coordinator.changed:
+                lease = coordinator.grant(1)
+                coordinator.reclaim()
+            unit = lease["units"][0]["id"]
+            coordinator.fail({"type": "error", "lease": lease["lease"], "id": unit, "error": "boom"})
+            reply = coordinator.grant(len(self.units))
+            self.assertEqual(sorted(unit["id"] for unit in reply["units"]), sorted(coordinator.units))
+        finally:
+            coordinator.server.server_close()
+
+    def test_sweep_stops_once_every_worker_has_exited(self):
+        """If the workers die instead of reporting, run_sweep gives up when the last one exits."""
+        CONFIGS["crash"] = (lambda **kwargs: os._exit(1), {})
+        try:
+            units = sweep_units(["crash"], ["Reflex"], range(4), steps=30)
+            with self.assertRaisesRegex(RuntimeError, "No workers left"):
+                run_sweep(units, workers=2, batch_size=2, timeout=60)
+        finally:
+            del CONFIGS["crash"]
+
+
 if __name__ == "__main__":
     unittest.main()